@@ -0,0 +1,127 @@
+"""Benchmark suite: seeds a catalog, times every route and the hot helpers,
+writes the results to JSON and compares them with a stored baseline.
+
+Run with ``python -m benchmarks`` and the usual application environment
+(SECRET_KEY, ALGORITHM, ...). By default the catalog lives in an in-memory
+SQLite database; ``--database-url`` must point to a scratch database, as
+its tables are created and dropped.
+"""
+
+import argparse
+import asyncio
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import StaticPool
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from benchmarks import endpoints, micro
+from benchmarks.report import compare, format_table, read_json, write_json
+from benchmarks.seed import seed
+from madr_api.models import table_registry
+
+BENCHMARKS_DIR = Path(__file__).parent
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=__doc__.splitlines()[0]
+    )
+    parser.add_argument('--authors', type=int, default=200)
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--accounts', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--micro-iterations', type=int, default=2000)
+    parser.add_argument('--hash-iterations', type=int, default=10)
+    parser.add_argument('--database-url')
+    parser.add_argument(
+        '--output', type=Path, default=BENCHMARKS_DIR / 'results.json'
+    )
+    parser.add_argument(
+        '--baseline', type=Path, default=BENCHMARKS_DIR / 'baseline.json'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help='allowed p50 slowdown against the baseline (0.2 = 20%%)',
+    )
+    parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help='store these results as the new baseline',
+    )
+    parser.add_argument(
+        '--skip-endpoints', action='store_true', help='only run micro'
+    )
+    return parser.parse_args(argv)
+
+
+async def run_endpoints(args) -> dict:
+    if args.database_url:
+        engine = create_async_engine(args.database_url)
+    else:
+        engine = create_async_engine(
+            'sqlite+aiosqlite:///:memory:',
+            connect_args={'check_same_thread': False},
+            poolclass=StaticPool,
+        )
+
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            data = await seed(
+                session,
+                authors=args.authors,
+                books=args.books,
+                accounts=args.accounts,
+                spare=args.iterations,
+            )
+        return await endpoints.run(engine, data, args.iterations)
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(table_registry.metadata.drop_all)
+        await engine.dispose()
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'authors': args.authors,
+            'books': args.books,
+            'accounts': args.accounts,
+            'iterations': args.iterations,
+        },
+        'micro': micro.run(args.micro_iterations, args.hash_iterations),
+    }
+    if not args.skip_endpoints:
+        results['endpoints'] = asyncio.run(run_endpoints(args))
+
+    print(format_table(results))
+    write_json(args.output, results)
+
+    if args.save_baseline:
+        write_json(args.baseline, results)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    baseline = read_json(args.baseline)
+    if baseline is None:
+        print(f'No baseline at {args.baseline}, nothing to compare')
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
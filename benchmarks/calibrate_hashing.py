@@ -0,0 +1,97 @@
+"""Time Argon2 hashing for candidate cost parameters on this machine.
+
+Run with ``python -m benchmarks.calibrate_hashing`` and pick the largest
+costs whose median stays under the latency budget of a login. The result
+goes into PASSWORD_HASH_TIME_COST, PASSWORD_HASH_MEMORY_COST and
+PASSWORD_HASH_PARALLELISM; existing hashes are upgraded as accounts log
+in, so changing them invalidates no password.
+"""
+
+import argparse
+from itertools import product
+from statistics import median
+from time import perf_counter
+
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+
+def time_hasher(hasher: Argon2Hasher, rounds: int) -> float:
+    """Median seconds of one hash with `hasher`."""
+    timings = []
+    for _ in range(rounds):
+        start = perf_counter()
+        hasher.hash('calibration password')
+        timings.append(perf_counter() - start)
+    return median(timings)
+
+
+def calibrate(
+    time_costs: list[int],
+    memory_costs: list[int],
+    parallelisms: list[int],
+    rounds: int,
+) -> list[dict]:
+    return [
+        {
+            'time_cost': time_cost,
+            'memory_cost': memory_cost,
+            'parallelism': parallelism,
+            'median_ms': time_hasher(
+                Argon2Hasher(
+                    time_cost=time_cost,
+                    memory_cost=memory_cost,
+                    parallelism=parallelism,
+                ),
+                rounds,
+            )
+            * 1e3,
+        }
+        for time_cost, memory_cost, parallelism in product(
+            time_costs, memory_costs, parallelisms
+        )
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.calibrate_hashing',
+        description=__doc__.splitlines()[0],
+    )
+    parser.add_argument('--time-cost', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument(
+        '--memory-cost',
+        type=int,
+        nargs='+',
+        default=[19456, 47104, 65536],
+        help='KiB',
+    )
+    parser.add_argument('--parallelism', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument(
+        '--budget-ms',
+        type=float,
+        default=250.0,
+        help='mark the candidates hashing faster than this',
+    )
+    args = parser.parse_args(argv)
+
+    results = calibrate(
+        args.time_cost, args.memory_cost, args.parallelism, args.rounds
+    )
+
+    print(f'{"time":>5} {"memory KiB":>11} {"lanes":>6} {"median ms":>10}')
+    for result in results:
+        within = '*' if result['median_ms'] <= args.budget_ms else ''
+        line = (
+            f'{result["time_cost"]:>5} {result["memory_cost"]:>11} '
+            f'{result["parallelism"]:>6} {result["median_ms"]:>10.1f} '
+            f'{within}'
+        )
+        print(line.rstrip())
+    print(f'* within the {args.budget_ms:g} ms budget')
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""Latency of every route, measured in-process through the ASGI app."""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from time import perf_counter
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from benchmarks.report import summarize
+from benchmarks.seed import Dataset
+from madr_api.app import app
+from madr_api.database import get_read_session, get_session, settings
+from madr_api.query_cache import MemoryBackend, query_cache
+from madr_api.suggest import suggestions
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Builds the URL and the httpx keyword arguments of iteration `i`.
+    request: Callable[[int], tuple[str, dict]]
+    expected_status: int = 200
+    # Scenarios run with the query cache off, so list routes are timed
+    # down to the database, unless they measure the cache itself.
+    cached: bool = False
+
+
+def scenarios(data: Dataset) -> list[Scenario]:
+    account = data.accounts[0]
+    auth = {'headers': {'Authorization': f'Bearer {account.token}'}}
+    author_id = data.author_ids[len(data.author_ids) // 2]
+    book_id = data.book_ids[len(data.book_ids) // 2]
+    spare_tokens = [spare.token for spare in data.spare_accounts]
+
+    def fixed(url: str, **kwargs) -> Callable[[int], tuple[str, dict]]:
+        return lambda i: (url, kwargs)
+
+    return [
+        Scenario('GET /', 'GET', fixed('/')),
+        Scenario(
+            'POST /auth/token',
+            'POST',
+            fixed(
+                '/auth/token',
+                data={'username': account.username, 'password': data.password},
+            ),
+        ),
+        Scenario(
+            'POST /auth/refresh_token',
+            'POST',
+            fixed('/auth/refresh_token', **auth),
+        ),
+        Scenario('GET /accounts/', 'GET', fixed('/accounts/')),
+        Scenario(
+            'POST /accounts/',
+            'POST',
+            lambda i: (
+                '/accounts/',
+                {
+                    'json': {
+                        'username': f'bench{i}',
+                        'email': f'bench{i}@example.com',
+                        'password': data.password,
+                    }
+                },
+            ),
+            expected_status=201,
+        ),
+        Scenario(
+            'PUT /accounts/{id}',
+            'PUT',
+            fixed(
+                f'/accounts/{account.id}',
+                json={
+                    'username': account.username,
+                    'email': account.email,
+                    'password': data.password,
+                },
+                **auth,
+            ),
+        ),
+        Scenario(
+            'DELETE /accounts/{id}',
+            'DELETE',
+            lambda i: (
+                f'/accounts/{data.spare_accounts[i].id}',
+                {'headers': {'Authorization': f'Bearer {spare_tokens[i]}'}},
+            ),
+        ),
+        Scenario('GET /books/', 'GET', fixed('/books/?limit=100')),
+        Scenario(
+            'GET /books/ (cached)',
+            'GET',
+            fixed('/books/?limit=100'),
+            cached=True,
+        ),
+        Scenario(
+            'GET /books/?expand=author',
+            'GET',
+            fixed('/books/?limit=100&expand=author'),
+        ),
+        Scenario(
+            'GET /books/?fields=id,title',
+            'GET',
+            fixed('/books/?limit=100&fields=id,title'),
+        ),
+        Scenario('GET /books/?year', 'GET', fixed('/books/?year=1950')),
+        Scenario(
+            'GET /books/?count=exact', 'GET', fixed('/books/?count=exact')
+        ),
+        Scenario('GET /books/{id}', 'GET', fixed(f'/books/{book_id}')),
+        Scenario(
+            'GET /books/{id}?expand=author',
+            'GET',
+            fixed(f'/books/{book_id}?expand=author'),
+        ),
+        Scenario('GET /books/export', 'GET', fixed('/books/export')),
+        Scenario(
+            'POST /books/',
+            'POST',
+            lambda i: (
+                '/books/',
+                {
+                    'json': {
+                        'title': f'bench title {i}',
+                        'year': 2000,
+                        'author_id': author_id,
+                    },
+                    **auth,
+                },
+            ),
+            expected_status=201,
+        ),
+        Scenario(
+            'POST /books/bulk',
+            'POST',
+            lambda i: (
+                '/books/bulk',
+                {
+                    'json': [
+                        {
+                            'title': f'bench bulk title {i}-{n}',
+                            'year': 2000,
+                            'author_id': author_id,
+                        }
+                        for n in range(100)
+                    ],
+                    **auth,
+                },
+            ),
+        ),
+        Scenario(
+            'PATCH /books/{id}',
+            'PATCH',
+            lambda i: (
+                f'/books/{book_id}',
+                {'json': {'year': 1900 + i % 125}, **auth},
+            ),
+        ),
+        Scenario(
+            'PATCH /books/',
+            'PATCH',
+            lambda i: (
+                '/books/',
+                {
+                    'json': [
+                        {'id': bulk_id, 'year': 1900 + i % 125}
+                        for bulk_id in data.book_ids[:100]
+                    ],
+                    **auth,
+                },
+            ),
+        ),
+        Scenario(
+            'DELETE /books/{id}',
+            'DELETE',
+            lambda i: (f'/books/{data.spare_book_ids[i]}', auth),
+        ),
+        Scenario('GET /authors/', 'GET', fixed('/authors/')),
+        Scenario(
+            'GET /authors/ (cached)', 'GET', fixed('/authors/'), cached=True
+        ),
+        Scenario(
+            'GET /authors/?expand=books',
+            'GET',
+            fixed('/authors/?expand=books'),
+        ),
+        Scenario('GET /authors/{id}', 'GET', fixed(f'/authors/{author_id}')),
+        Scenario(
+            'GET /authors/{id}?expand=books',
+            'GET',
+            fixed(f'/authors/{author_id}?expand=books'),
+        ),
+        Scenario('GET /authors/export', 'GET', fixed('/authors/export')),
+        Scenario(
+            'POST /authors/',
+            'POST',
+            lambda i: ('/authors/', {'json': {'name': f'bench {i}'}, **auth}),
+            expected_status=201,
+        ),
+        Scenario(
+            'PATCH /authors/{id}',
+            'PATCH',
+            lambda i: (
+                f'/authors/{author_id}',
+                {'json': {'name': f'bench renamed {i}'}, **auth},
+            ),
+        ),
+        Scenario(
+            'DELETE /authors/{id}',
+            'DELETE',
+            lambda i: (f'/authors/{data.spare_author_ids[i]}', auth),
+        ),
+        Scenario('GET /search/', 'GET', fixed('/search/?q=seeded')),
+        Scenario(
+            'GET /suggest/', 'GET', fixed('/suggest/?q=seeded%20title%201')
+        ),
+        Scenario('GET /metrics/pool', 'GET', fixed('/metrics/pool', **auth)),
+        Scenario('GET /metrics/cache', 'GET', fixed('/metrics/cache', **auth)),
+        Scenario(
+            'GET /metrics/hashing', 'GET', fixed('/metrics/hashing', **auth)
+        ),
+    ]
+
+
+async def run(engine: AsyncEngine, data: Dataset, iterations: int) -> dict:
+    """Time `iterations` sequential requests of every scenario."""
+
+    async def bench_session():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = bench_session
+    app.dependency_overrides[get_read_session] = bench_session
+    # Every iteration comes from the same client and account.
+    rate_limit_enabled = settings.RATE_LIMIT_ENABLED
+    settings.RATE_LIMIT_ENABLED = False
+    # The suggestion indexes are loaded below, from the benchmark database.
+    suggest_enabled = suggestions.enabled
+    suggestions.enabled = False
+    cache_backend = query_cache.backend
+    uncached = MemoryBackend(maxsize=0, ttl=60)
+
+    results = {}
+    try:
+        async with (
+            app.router.lifespan_context(app),
+            AsyncClient(
+                transport=ASGITransport(app=app), base_url='http://bench'
+            ) as client,
+        ):
+            await suggestions.load(engine)
+            for scenario in scenarios(data):
+                query_cache.backend = (
+                    MemoryBackend(maxsize=256, ttl=60)
+                    if scenario.cached
+                    else uncached
+                )
+                timings = []
+                for i in range(iterations):
+                    url, kwargs = scenario.request(i)
+                    start = perf_counter()
+                    response = await client.request(
+                        scenario.method, url, **kwargs
+                    )
+                    timings.append(perf_counter() - start)
+                    if response.status_code != scenario.expected_status:
+                        raise RuntimeError(
+                            f'{scenario.name} answered '
+                            f'{response.status_code}: {response.text}'
+                        )
+                results[scenario.name] = summarize(timings)
+    finally:
+        app.dependency_overrides.clear()
+        settings.RATE_LIMIT_ENABLED = rate_limit_enabled
+        suggestions.enabled = suggest_enabled
+        query_cache.backend = cache_backend
+        suggestions.clear()
+
+    return results
@@ -0,0 +1,52 @@
+"""Latency of the CPU-bound helpers behind the routes."""
+
+from collections.abc import Callable
+from time import perf_counter
+
+from jwt import decode
+
+from benchmarks.report import summarize
+from madr_api.security import (
+    create_access_token,
+    get_password_hash,
+    settings,
+    verify_password,
+)
+from madr_api.utils import sanitize_string
+
+
+def _time(function: Callable[[], object], iterations: int) -> dict:
+    timings = []
+    for _ in range(iterations):
+        start = perf_counter()
+        function()
+        timings.append(perf_counter() - start)
+    return summarize(timings)
+
+
+def run(iterations: int, hash_iterations: int) -> dict:
+    title = '  The   Hitchhiker  Guide  to the   GALAXY  ' * 5
+    token = create_access_token({'sub': 'bench@example.com', 'uid': 1})
+    password_hash = get_password_hash('benchmark')
+
+    return {
+        'sanitize_string': _time(lambda: sanitize_string(title), iterations),
+        'jwt encode': _time(
+            lambda: create_access_token({
+                'sub': 'bench@example.com',
+                'uid': 1,
+            }),
+            iterations,
+        ),
+        'jwt decode': _time(
+            lambda: decode(token, settings.SECRET_KEY, [settings.ALGORITHM]),
+            iterations,
+        ),
+        'argon2 hash': _time(
+            lambda: get_password_hash('benchmark'), hash_iterations
+        ),
+        'argon2 verify': _time(
+            lambda: verify_password('benchmark', password_hash),
+            hash_iterations,
+        ),
+    }
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+from statistics import fmean, quantiles
+
+
+def summarize(timings: list[float]) -> dict:
+    """Latency percentiles (milliseconds) and throughput of one scenario."""
+    cuts = quantiles(timings, n=100, method='inclusive')
+    total = sum(timings)
+    return {
+        'count': len(timings),
+        'mean': fmean(timings) * 1e3,
+        'p50': cuts[49] * 1e3,
+        'p95': cuts[94] * 1e3,
+        'p99': cuts[98] * 1e3,
+        'throughput': len(timings) / total if total else 0.0,
+    }
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float, metric: str = 'p50'
+) -> list[str]:
+    """Scenarios whose `metric` got more than `threshold` slower."""
+    regressions = []
+    for group in ('endpoints', 'micro'):
+        for name, stats in results.get(group, {}).items():
+            previous = baseline.get(group, {}).get(name)
+            if previous is None or not previous[metric]:
+                continue
+
+            change = stats[metric] / previous[metric] - 1
+            if change > threshold:
+                regressions.append(
+                    f'{name}: {metric} {previous[metric]:.3f} ms -> '
+                    f'{stats[metric]:.3f} ms (+{change:.0%})'
+                )
+
+    return regressions
+
+
+def write_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(data, indent=2, sort_keys=True) + '\n', encoding='utf-8'
+    )
+
+
+def read_json(path: Path) -> dict | None:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def format_table(results: dict) -> str:
+    lines = [f'{"scenario":<44} {"p50":>9} {"p95":>9} {"p99":>9} {"req/s":>9}']
+    for group in ('endpoints', 'micro'):
+        for name, stats in results.get(group, {}).items():
+            lines.append(
+                f'{name:<44} {stats["p50"]:9.3f} {stats["p95"]:9.3f} '
+                f'{stats["p99"]:9.3f} {stats["throughput"]:9.1f}'
+            )
+    return '\n'.join(lines)
@@ -0,0 +1,104 @@
+from dataclasses import dataclass, field
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr_api.models import Author, Book, UserAccount
+from madr_api.security import create_access_token, get_password_hash
+
+
+@dataclass
+class Account:
+    id: int
+    username: str
+    email: str
+
+    @property
+    def token(self) -> str:
+        return create_access_token({'sub': self.email, 'uid': self.id})
+
+
+@dataclass
+class Dataset:
+    """Ids of the seeded rows.
+
+    The first of the ``accounts`` is an admin, for the metrics routes.
+    The ``spare_*`` rows are not read by any scenario, so the delete
+    scenarios can consume them one per iteration.
+    """
+
+    password: str
+    author_ids: list[int]
+    book_ids: list[int]
+    accounts: list[Account]
+    spare_author_ids: list[int] = field(default_factory=list)
+    spare_book_ids: list[int] = field(default_factory=list)
+    spare_accounts: list[Account] = field(default_factory=list)
+
+
+async def _insert(session: AsyncSession, model, rows: list[dict]):
+    if not rows:
+        return []
+    # The ids are sliced by position, so they must come back in row order.
+    query = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(await session.scalars(query, rows))
+
+
+async def seed(  # noqa: PLR0913
+    session: AsyncSession,
+    *,
+    authors: int,
+    books: int,
+    accounts: int,
+    spare: int = 0,
+    password: str = 'benchmark',
+) -> Dataset:
+    """Insert a catalog of the requested size and return its ids."""
+    password_hash = get_password_hash(password)
+
+    author_ids = await _insert(
+        session,
+        Author,
+        [{'name': f'seeded author {n}'} for n in range(authors + spare)],
+    )
+    book_ids = await _insert(
+        session,
+        Book,
+        [
+            {
+                'title': f'seeded title {n}',
+                'year': 1900 + n % 125,
+                'author_id': author_ids[n % authors],
+            }
+            for n in range(books + spare)
+        ],
+    )
+    usernames = [f'seeded{n}' for n in range(accounts + spare)]
+    account_ids = await _insert(
+        session,
+        UserAccount,
+        [
+            {
+                'username': username,
+                'email': f'{username}@example.com',
+                'password': password_hash,
+                'is_admin': n == 0 and accounts > 0,
+            }
+            for n, username in enumerate(usernames)
+        ],
+    )
+    await session.commit()
+
+    seeded_accounts = [
+        Account(account_id, username, f'{username}@example.com')
+        for account_id, username in zip(account_ids, usernames)
+    ]
+    return Dataset(
+        password=password,
+        author_ids=author_ids[:authors],
+        book_ids=book_ids[:books],
+        accounts=seeded_accounts[:accounts],
+        spare_author_ids=author_ids[authors:],
+        spare_book_ids=book_ids[books:],
+        spare_accounts=seeded_accounts[accounts:],
+    )
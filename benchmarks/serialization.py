@@ -0,0 +1,76 @@
+"""Compare the standard and the orjson response paths of ``GET /books/``.
+
+Run with ``python -m benchmarks.serialization`` and the usual application
+environment (DATABASE_URL, SECRET_KEY, ...). The catalog lives in an
+in-memory SQLite database, so the numbers mostly reflect validation and
+encoding costs rather than the database.
+"""
+
+import argparse
+import asyncio
+from statistics import median
+from time import perf_counter
+
+from fastapi.testclient import TestClient
+from sqlalchemy import StaticPool
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from benchmarks.seed import seed
+from madr_api.app import app
+from madr_api.database import get_read_session, get_session, settings
+from madr_api.models import table_registry
+from madr_api.query_cache import MemoryBackend, query_cache
+
+
+async def _create_catalog(books: int) -> AsyncSession:
+    engine = create_async_engine(
+        'sqlite+aiosqlite:///:memory:',
+        connect_args={'check_same_thread': False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    session = AsyncSession(engine, expire_on_commit=False)
+    await seed(session, authors=1, books=books, accounts=0)
+
+    return session
+
+
+def _time_requests(client: TestClient, url: str, requests: int) -> float:
+    timings = []
+    for _ in range(requests):
+        start = perf_counter()
+        response = client.get(url)
+        timings.append(perf_counter() - start)
+        response.raise_for_status()
+
+    return median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    session = asyncio.run(_create_catalog(args.books))
+    app.dependency_overrides[get_session] = lambda: session
+    app.dependency_overrides[get_read_session] = lambda: session
+    url = f'/books/?limit={args.books}&expand=author'
+
+    print(f'GET {url}, median of {args.requests} requests')
+    with TestClient(app) as client:
+        for cache_size, cache_label in ((0, 'cache off'), (16, 'cache on')):
+            query_cache.backend = MemoryBackend(maxsize=cache_size, ttl=60)
+            for fast_json in (False, True):
+                settings.FAST_JSON_RESPONSES = fast_json
+                elapsed = _time_requests(client, url, args.requests)
+                label = 'orjson' if fast_json else 'standard'
+                print(f'{cache_label:>10} {label:>9}: {elapsed * 1e3:8.3f} ms')
+
+    app.dependency_overrides.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,89 @@
+from contextlib import asynccontextmanager
 from http import HTTPStatus
+from math import ceil
+from time import time
 
-from fastapi import FastAPI
+from anyio import to_thread
+from fastapi import FastAPI, Request
 
-from madr_api.routers import accounts, auth, authors, books
+from madr_api.database import (
+    PRIMARY_COOKIE,
+    engine,
+    read_replicas,
+    settings,
+    slow_query_log,
+)
+from madr_api.instrumentation import InstrumentedRoute, server_timing
+from madr_api.purge import author_purges
+from madr_api.routers import (
+    accounts,
+    auth,
+    authors,
+    books,
+    metrics,
+    search,
+    suggest,
+)
 from madr_api.schemas import Message
+from madr_api.security import password_hasher
+from madr_api.suggest import suggestions
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.THREADPOOL_SIZE is not None:
+        limiter = to_thread.current_default_thread_limiter()
+        limiter.total_tokens = settings.THREADPOOL_SIZE
+    suggestions.start(engine)
+
+    yield
+
+    await suggestions.shutdown()
+    await author_purges.shutdown()
+    await slow_query_log.shutdown()
+    password_hasher.shutdown()
+    await read_replicas.dispose()
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = InstrumentedRoute
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+@app.middleware('http')
+async def pin_writers_to_primary(request: Request, call_next):
+    """Send a client's reads to the primary for a short while after it
+    writes, so it does not see a replica that has not caught up yet."""
+    response = await call_next(request)
+
+    window = settings.READ_YOUR_WRITES_SECONDS
+    if (
+        window > 0
+        and request.method not in SAFE_METHODS
+        and response.status_code < HTTPStatus.BAD_REQUEST
+    ):
+        response.set_cookie(
+            PRIMARY_COOKIE,
+            str(time() + window),
+            max_age=ceil(window),
+            httponly=True,
+        )
+
+    return response
+
+
+# Registered last so it is the outermost middleware and times the others.
+app.middleware('http')(server_timing)
 
 app.include_router(auth.router)
 app.include_router(accounts.router)
 app.include_router(books.router)
 app.include_router(authors.router)
+app.include_router(search.router)
+app.include_router(suggest.router)
+app.include_router(metrics.router)
 
 
 @app.get('/', status_code=HTTPStatus.OK, response_model=Message)
@@ -0,0 +1,103 @@
+import hashlib
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+
+from fastapi import Request, Response
+from sqlalchemy import Select, Subquery, func, select, true
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def row_version(row) -> tuple:
+    return (row.__tablename__, row.id, row.updated_at)
+
+
+def version_of(id_column, updated_at_column, *criteria) -> Subquery:
+    """Aggregate that changes whenever a row is added, removed or updated.
+
+    The count and the id sum catch rows entering or leaving the set, the
+    latest ``updated_at`` catches updates to the rows that stayed.
+    """
+    return (
+        select(
+            func.count(id_column),
+            func.sum(id_column),
+            func.max(updated_at_column),
+        )
+        .where(*criteria)
+        .subquery()
+    )
+
+
+def select_versions(*versions: Subquery) -> Select:
+    """Single row with the columns of every one-row version aggregate."""
+    query = select(*versions).select_from(versions[0])
+    for version in versions[1:]:
+        query = query.join(version, true())
+    return query
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return format_datetime(value.astimezone(UTC), usegmt=True)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+
+    tags = (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+    return etag in tags
+
+
+def _modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=UTC)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=UTC)
+
+    # HTTP dates have a one second resolution.
+    return last_modified.replace(microsecond=0) > since
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: datetime | None = None,
+) -> Response | None:
+    """Set the validators on the response and answer conditional requests.
+
+    Returns a ``304 Not Modified`` response when the client copy is still
+    current, so the route can return it before loading or serializing the
+    body, and ``None`` otherwise. ``If-None-Match`` takes precedence over
+    ``If-Modified-Since``, as in RFC 9110.
+    """
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get('if-none-match')
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    elif if_modified_since is not None and last_modified is not None:
+        not_modified = not _modified_since(if_modified_since, last_modified)
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+    return None
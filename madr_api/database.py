@@ -1,11 +1,237 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from dataclasses import dataclass
+from time import monotonic, perf_counter, time
 
+from fastapi import Request
+from sqlalchemy import Engine, event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from madr_api.instrumentation import current_timings, record_query
 from madr_api.settings import Settings
+from madr_api.slow_queries import SlowQueryLog
+
+settings = Settings()
+
+FOREIGN_KEY_VIOLATION = '23503'
+
+slow_query_log = SlowQueryLog(
+    threshold=settings.SLOW_QUERY_THRESHOLD,
+    size=settings.SLOW_QUERY_LOG_SIZE,
+    explain_sample=settings.SLOW_QUERY_EXPLAIN_SAMPLE,
+)
+
+
+@dataclass
+class PoolWaitStats:
+    checkouts: int = 0
+    timeouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def record(self, wait: float):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.wait_stats.timeouts += 1
+            raise
+        self.wait_stats.record(perf_counter() - start)
+        return connection
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, *args):
+    conn.info.setdefault('query_started', []).append(perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_query_timer(  # noqa: PLR0913, PLR0917
+    conn, cursor, statement, parameters, context, executemany
+):
+    elapsed = perf_counter() - conn.info['query_started'].pop()
+    record_query(elapsed)
+
+    timings = current_timings()
+    slow_query_log.record(
+        conn,
+        statement,
+        parameters,
+        executemany,
+        elapsed,
+        timings.route if timings else None,
+    )
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(context):
+    if context.connection is not None:
+        started = context.connection.info.get('query_started')
+        if started:
+            record_query(perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys when asked to, per connection. The
+    # write routes rely on the database rejecting a missing author.
+    if 'sqlite' in type(dbapi_connection).__module__:
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+    )
+
+
+class ReplicaSet:
+    """Round-robin over read replicas, skipping the ones that recently
+    failed to connect until `retry_after` seconds have passed."""
+
+    def __init__(self, engines: list[AsyncEngine], retry_after: float):
+        self.engines = engines
+        self.retry_after = retry_after
+        self._next = 0
+        self._down_until: dict[AsyncEngine, float] = {}
+
+    def candidates(self) -> list[AsyncEngine]:
+        if not self.engines:
+            return []
+
+        start = self._next
+        self._next = (self._next + 1) % len(self.engines)
+        now = monotonic()
+        return [
+            replica
+            for replica in self.engines[start:] + self.engines[:start]
+            if self._down_until.get(replica, 0.0) <= now
+        ]
+
+    def mark_down(self, replica: AsyncEngine):
+        self._down_until[replica] = monotonic() + self.retry_after
+
+    async def dispose(self):
+        for replica in self.engines:
+            await replica.dispose()
+
+
+engine = _create_engine(settings.DATABASE_URL)
+
+read_replicas = ReplicaSet(
+    [_create_engine(url) for url in settings.DATABASE_READ_URLS],
+    retry_after=settings.DATABASE_REPLICA_RETRY_AFTER,
+)
+
+PRIMARY_COOKIE = 'madr_primary_until'
+
+
+def get_pool_status(pool: TimedQueuePool) -> dict:
+    wait_stats = pool.wait_stats
+    average_wait = (
+        wait_stats.total_wait / wait_stats.checkouts
+        if wait_stats.checkouts
+        else 0.0
+    )
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': settings.DATABASE_MAX_OVERFLOW,
+        'checkouts': wait_stats.checkouts,
+        'timeouts': wait_stats.timeouts,
+        'average_wait': average_wait,
+        'max_wait': wait_stats.max_wait,
+    }
+
+
+def dialect_insert(session: AsyncSession, model):
+    """INSERT construct for the session's database, with ON CONFLICT."""
+    if session.bind.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    """Whether `error` was raised because a referenced row is missing."""
+    sqlstate = getattr(error.orig, 'sqlstate', None)
+    if sqlstate is not None:
+        return sqlstate == FOREIGN_KEY_VIOLATION
+    return 'FOREIGN KEY constraint failed' in str(error.orig)
+
+
+async def get_session():
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+
+
+def read_from_replica(session: AsyncSession) -> bool:
+    return session.info.get('replica', False)
+
+
+def pinned_to_primary(request: Request) -> bool:
+    """Whether the client wrote recently enough to read its own writes."""
+    try:
+        pinned_until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        return False
+    return pinned_until > time()
+
+
+async def _begin_read_only(session: AsyncSession):
+    connection = await session.connection()
+    if connection.dialect.name == 'postgresql':
+        await connection.execute(text('SET TRANSACTION READ ONLY'))
+
+
+async def get_read_session(request: Request):
+    """Read-only session on a healthy replica, or on the primary when there
+    is none or the client is pinned to it by a recent write."""
+    replicas = [] if pinned_to_primary(request) else read_replicas.candidates()
 
-engine = create_engine(Settings().DATABASE_URL)
+    for replica in replicas:
+        session = AsyncSession(
+            replica, expire_on_commit=False, info={'replica': True}
+        )
+        try:
+            await _begin_read_only(session)
+        except (InterfaceError, OperationalError):
+            await session.close()
+            read_replicas.mark_down(replica)
+            continue
 
+        async with session:
+            yield session
+        return
 
-def get_session():
-    with Session(engine) as session:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        await _begin_read_only(session)
         yield session
@@ -0,0 +1,61 @@
+import csv
+import json
+from io import StringIO
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from madr_api.database import settings
+
+EXPORT_MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _render_ndjson(rows, fields: list[str]) -> str:
+    return ''.join(
+        json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n'
+        for row in rows
+    )
+
+
+def _render_csv(rows, fields: list[str]) -> str:
+    buffer = StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def stream_export(
+    bind: AsyncEngine, model, schema: type[BaseModel], export_format: str
+) -> StreamingResponse:
+    """Stream every row of `model` as NDJSON or CSV.
+
+    Only the columns in `schema` are selected, ordered by id, and fetched
+    through a server-side cursor in chunks of EXPORT_CHUNK_SIZE rows, so
+    memory use does not depend on the table size. The rows are read with
+    a session of their own because the response body is produced after
+    the request's session has been closed.
+    """
+    fields = list(schema.model_fields)
+    query = (
+        select(*(getattr(model, field) for field in fields))
+        .order_by(model.id)
+        .execution_options(yield_per=settings.EXPORT_CHUNK_SIZE)
+    )
+    render = _render_csv if export_format == 'csv' else _render_ndjson
+
+    async def content():
+        if export_format == 'csv':
+            yield _render_csv([fields], fields)
+
+        async with AsyncSession(bind) as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield render(rows, fields)
+
+    filename = f'{model.__tablename__}.{export_format}'
+    return StreamingResponse(
+        content(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
+    )
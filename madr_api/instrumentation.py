@@ -0,0 +1,146 @@
+import inspect
+import json
+import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from time import perf_counter
+
+from fastapi import Request
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger('madr_api.timing')
+
+
+@dataclass
+class RequestTimings:
+    """Where the time of one request went, in seconds."""
+
+    queries: int = 0
+    db: float = 0.0
+    hashing: float = 0.0
+    serialization: float = 0.0
+    route: str | None = None
+    started: float = field(default_factory=perf_counter)
+    endpoint_finished: float | None = None
+
+    def elapsed(self) -> float:
+        return perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        return ', '.join((
+            f'db;dur={self.db * 1e3:.2f};desc="{self.queries} queries"',
+            f'hash;dur={self.hashing * 1e3:.2f}',
+            f'serialize;dur={self.serialization * 1e3:.2f}',
+            f'total;dur={self.elapsed() * 1e3:.2f}',
+        ))
+
+
+_current_timings: ContextVar[RequestTimings | None] = ContextVar(
+    'request_timings', default=None
+)
+
+
+def current_timings() -> RequestTimings | None:
+    return _current_timings.get()
+
+
+@contextmanager
+def track_timings() -> Iterator[RequestTimings]:
+    """Collect the timings of everything run in this context."""
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def record_query(seconds: float):
+    if timings := current_timings():
+        timings.queries += 1
+        timings.db += seconds
+
+
+def record_hashing(seconds: float):
+    if timings := current_timings():
+        timings.hashing += seconds
+
+
+def _mark_endpoint_finished():
+    if timings := current_timings():
+        timings.endpoint_finished = perf_counter()
+
+
+def _timed_endpoint(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+
+        @wraps(endpoint)
+        async def timed(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_finished()
+
+    else:
+
+        @wraps(endpoint)
+        def timed(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_finished()
+
+    return timed
+
+
+class InstrumentedRoute(APIRoute):
+    """Route that attributes the time between the endpoint returning and
+    the response being ready (response_model validation and encoding) to
+    serialization."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request):
+            timings = current_timings()
+            if timings:
+                timings.route = self.name
+
+            response = await handler(request)
+            if timings and timings.endpoint_finished is not None:
+                timings.serialization += (
+                    perf_counter() - timings.endpoint_finished
+                )
+            return response
+
+        return timed_handler
+
+
+async def server_timing(request: Request, call_next):
+    """Report each request's timings in a Server-Timing header and a log
+    line. Work done while a streaming body is sent is not included."""
+    with track_timings() as timings:
+        response = await call_next(request)
+
+    response.headers['Server-Timing'] = timings.server_timing()
+    logger.info(
+        json.dumps({
+            'method': request.method,
+            'path': request.url.path,
+            'route': timings.route,
+            'status': response.status_code,
+            'duration_ms': round(timings.elapsed() * 1e3, 3),
+            'queries': timings.queries,
+            'db_ms': round(timings.db * 1e3, 3),
+            'hash_ms': round(timings.hashing * 1e3, 3),
+            'serialize_ms': round(timings.serialization * 1e3, 3),
+        })
+    )
+
+    return response
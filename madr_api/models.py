@@ -1,6 +1,7 @@
-from datetime import datetime
+from datetime import UTC, datetime
+from uuid import uuid4
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import DDL, ForeignKey, Index, event, false, func, text
 from sqlalchemy.orm import Mapped, mapped_column, registry, relationship
 
 table_registry = registry()
@@ -14,6 +15,10 @@ class UserAccount:
     username: Mapped[str] = mapped_column(unique=True)
     email: Mapped[str] = mapped_column(unique=True)
     password: Mapped[str]
+    # Grants the operator routes under /metrics. Only set in the database.
+    is_admin: Mapped[bool] = mapped_column(
+        init=False, default=False, server_default=false()
+    )
     created_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now()
     )
@@ -25,6 +30,25 @@ class UserAccount:
 @table_registry.mapped_as_dataclass
 class Author:
     __tablename__ = 'authors'
+    __table_args__ = (
+        Index(
+            'ix_authors_name_trgm',
+            'name',
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+        Index(
+            'ix_authors_name_fts',
+            text("to_tsvector('simple', name)"),
+            postgresql_using='gin',
+        ).ddl_if(dialect='postgresql'),
+        # LIKE 'prefix%' under any collation, for the /suggest fallback.
+        Index(
+            'ix_authors_name_prefix',
+            'name',
+            postgresql_ops={'name': 'text_pattern_ops'},
+        ).ddl_if(dialect='postgresql'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     name: Mapped[str] = mapped_column(unique=True)
@@ -36,13 +60,41 @@ class Author:
     )
 
     books: Mapped[list['Book']] = relationship(
-        init=False, back_populates='author', cascade='all,delete-orphan'
+        init=False,
+        repr=False,
+        back_populates='author',
+        cascade='all,delete-orphan',
+        # The foreign key cascades, the books need not be loaded.
+        passive_deletes=True,
     )
 
 
 @table_registry.mapped_as_dataclass
 class Book:
     __tablename__ = 'books'
+    __table_args__ = (
+        Index(
+            'ix_books_title_trgm',
+            'title',
+            postgresql_using='gin',
+            postgresql_ops={'title': 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+        Index(
+            'ix_books_title_fts',
+            text("to_tsvector('simple', title)"),
+            postgresql_using='gin',
+        ).ddl_if(dialect='postgresql'),
+        # LIKE 'prefix%' under any collation, for the /suggest fallback.
+        Index(
+            'ix_books_title_prefix',
+            'title',
+            postgresql_ops={'title': 'text_pattern_ops'},
+        ).ddl_if(dialect='postgresql'),
+        # Lead with the filtered column and end with the keyset column, so
+        # the same index serves the filter, the id order and cursor seeks.
+        Index('ix_books_author_id_id', 'author_id', 'id'),
+        Index('ix_books_year_id', 'year', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     title: Mapped[str] = mapped_column(unique=True)
@@ -55,5 +107,99 @@ class Book:
         init=False, default=func.now(), onupdate=func.now()
     )
 
-    author_id: Mapped[int] = mapped_column(ForeignKey('authors.id'))
-    author: Mapped[Author] = relationship(init=False, back_populates='books')
+    author_id: Mapped[int] = mapped_column(
+        ForeignKey('authors.id', ondelete='CASCADE')
+    )
+    author: Mapped[Author] = relationship(
+        init=False, repr=False, back_populates='books'
+    )
+
+
+def _utcnow() -> datetime:
+    return datetime.now(tz=UTC).replace(tzinfo=None)
+
+
+@table_registry.mapped_as_dataclass
+class PurgeJob:
+    """A background purge of an author, see madr_api.purge."""
+
+    __tablename__ = 'purge_jobs'
+    __table_args__ = (
+        # At most one running purge per author, whichever worker runs it.
+        Index(
+            'ix_purge_jobs_running_author',
+            'author_id',
+            unique=True,
+            sqlite_where=text("status = 'running'"),
+            postgresql_where=text("status = 'running'"),
+        ),
+    )
+
+    # No foreign key: the job outlives the author it deletes.
+    author_id: Mapped[int]
+    total_books: Mapped[int]
+    id: Mapped[str] = mapped_column(
+        primary_key=True, default_factory=lambda: uuid4().hex
+    )
+    deleted_books: Mapped[int] = mapped_column(default=0)
+    status: Mapped[str] = mapped_column(default='running')
+    created_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now()
+    )
+    # Set by Python, in UTC, to be compared with the clock of the worker
+    # that looks for stale jobs.
+    updated_at: Mapped[datetime] = mapped_column(
+        init=False, default=_utcnow, onupdate=_utcnow
+    )
+
+
+event.listen(
+    table_registry.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(
+        dialect='postgresql'
+    ),
+)
+
+
+def _add_sqlite_fts(model, column: str):
+    """Mirror a column into an FTS5 table, kept in sync by triggers.
+
+    Only used on SQLite, where search falls back to FTS5 instead of the
+    PostgreSQL tsvector indexes.
+    """
+    table = model.__tablename__
+    fts = f'{table}_fts'
+    delete_row = (
+        f'INSERT INTO {fts}({fts}, rowid, {column}) '
+        f"VALUES ('delete', old.id, old.{column});"
+    )
+    insert_row = (
+        f'INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column});'
+    )
+    create = (
+        f'CREATE VIRTUAL TABLE {fts} USING fts5('
+        f"{column}, content='{table}', content_rowid='id')",
+        f'CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} '
+        f'BEGIN {insert_row} END',
+        f'CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} '
+        f'BEGIN {delete_row} END',
+        f'CREATE TRIGGER {fts}_update AFTER UPDATE OF {column} ON {table} '
+        f'BEGIN {delete_row} {insert_row} END',
+    )
+
+    for statement in create:
+        event.listen(
+            model.__table__,
+            'after_create',
+            DDL(statement).execute_if(dialect='sqlite'),
+        )
+    event.listen(
+        model.__table__,
+        'before_drop',
+        DDL(f'DROP TABLE IF EXISTS {fts}').execute_if(dialect='sqlite'),
+    )
+
+
+_add_sqlite_fts(Book, 'title')
+_add_sqlite_fts(Author, 'name')
@@ -0,0 +1,177 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import Select, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from madr_api.cache import TTLCache
+from madr_api.database import settings
+from madr_api.schemas import FilterPage
+
+# Exact totals keyed by the compiled count statement and its parameters.
+count_cache = TTLCache(
+    maxsize=settings.COUNT_CACHE_SIZE, ttl=settings.COUNT_CACHE_TTL
+)
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    payload = json.dumps([sort, values], separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> list:
+    invalid_cursor = HTTPException(
+        status_code=HTTPStatus.BAD_REQUEST, detail='Invalid cursor'
+    )
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, values = json.loads(urlsafe_b64decode(padded))
+    except (Base64Error, UnicodeDecodeError, ValueError, TypeError):
+        raise invalid_cursor
+
+    if cursor_sort != sort or not isinstance(values, list):
+        raise invalid_cursor
+
+    return values
+
+
+def _is_unique(column) -> bool:
+    return column.primary_key or bool(column.unique)
+
+
+def paginate(query: Select, model, filter_page: FilterPage) -> Select:
+    """Order the query by the requested column and apply the page window.
+
+    With a cursor the page starts right after the last row of the previous
+    page (a keyset seek); otherwise it falls back to offset paging.
+    """
+    sort_column = getattr(model, filter_page.sort)
+    unique_sort = _is_unique(sort_column.property.columns[0])
+
+    if unique_sort:
+        query = query.order_by(sort_column)
+    else:
+        query = query.order_by(sort_column, model.id)
+
+    if filter_page.cursor:
+        values = decode_cursor(filter_page.cursor, filter_page.sort)
+        key = (sort_column,) if unique_sort else (sort_column, model.id)
+        # The values are compared with the key columns, so each must have
+        # the Python type of its column (bool passes for int otherwise).
+        if len(values) != len(key) or any(
+            type(value) is not column.type.python_type
+            for value, column in zip(values, key)
+        ):
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST, detail='Invalid cursor'
+            )
+        query = query.where(tuple_(*key) > tuple_(*values))
+    else:
+        query = query.offset(filter_page.offset)
+
+    return query.limit(filter_page.limit)
+
+
+def requested_fields(
+    filter_page: FilterPage, schema: type[BaseModel]
+) -> list[str] | None:
+    """The item fields asked for with `fields=`, checked against the
+    item schema of the list."""
+    if filter_page.fields is None:
+        return None
+
+    fields = list(
+        dict.fromkeys(name.strip() for name in filter_page.fields.split(','))
+    )
+    if not set(fields) <= schema.model_fields.keys():
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='Invalid fields'
+        )
+
+    return fields
+
+
+def load_fields(query: Select, model, fields: list[str], *required: str):
+    """Load only `fields` of `model`, plus the `required` attributes the
+    handler reads itself (the sort key, relationship keys)."""
+    names = dict.fromkeys([*fields, *required])
+    return query.options(load_only(*(getattr(model, name) for name in names)))
+
+
+def next_cursor(rows: list, model, filter_page: FilterPage) -> str | None:
+    if not rows or len(rows) < filter_page.limit:
+        return None
+
+    last_row = rows[-1]
+    sort_column = getattr(model, filter_page.sort)
+    values = [getattr(last_row, filter_page.sort)]
+    if not _is_unique(sort_column.property.columns[0]):
+        values.append(last_row.id)
+
+    return encode_cursor(filter_page.sort, values)
+
+
+async def _estimate_rows(session: AsyncSession, query: Select) -> int | None:
+    """Row estimate from the PostgreSQL planner statistics, if available."""
+    if session.bind.dialect.name != 'postgresql':
+        return None
+
+    if query.whereclause is None:
+        (table,) = query.get_final_froms()
+        estimate = await session.scalar(
+            text(
+                'SELECT reltuples FROM pg_class '
+                'WHERE oid = CAST(:table AS regclass)'
+            ),
+            {'table': table.name},
+        )
+    else:
+        compiled = query.compile(dialect=session.bind.dialect)
+        connection = await session.connection()
+        result = await connection.exec_driver_sql(
+            f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+        )
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = plan[0]['Plan']['Plan Rows']
+
+    # reltuples is -1 for tables that were never vacuumed or analyzed.
+    if estimate is None or estimate < 0:
+        return None
+    return int(estimate)
+
+
+async def count_rows(session: AsyncSession, query: Select, mode: str) -> int:
+    """Total rows matched by the filtered, not yet paginated, query.
+
+    In ``estimate`` mode, totals the planner puts above
+    COUNT_ESTIMATE_THRESHOLD are returned as estimates; smaller or unknown
+    ones are counted exactly. Exact counts are cached for COUNT_CACHE_TTL
+    seconds.
+    """
+    query = query.order_by(None)
+
+    if mode == 'estimate':
+        estimate = await _estimate_rows(session, query)
+        if (
+            estimate is not None
+            and estimate >= settings.COUNT_ESTIMATE_THRESHOLD
+        ):
+            return estimate
+
+    count_query = select(func.count()).select_from(query.subquery())
+    compiled = count_query.compile(dialect=session.bind.dialect)
+    key = (str(compiled), json.dumps(compiled.params, default=str))
+    total = count_cache.get(key)
+    if total is None:
+        total = await session.scalar(count_query)
+        count_cache.set(key, total)
+
+    return total
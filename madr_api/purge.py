@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from madr_api.database import dialect_insert, settings
+from madr_api.models import Author, Book, PurgeJob
+from madr_api.query_cache import query_cache
+from madr_api.suggest import suggestions
+
+logger = logging.getLogger('madr_api.purge')
+
+
+class AuthorPurges:
+    """Deletes authors in the background, `batch_size` books per
+    transaction, so no statement holds a connection or locks for long.
+
+    Jobs are rows of purge_jobs, so any worker can report their progress,
+    and a unique index on the running ones lets only one purge of an
+    author run at a time. A running job left untouched for `stale_after`
+    seconds is taken to have died with its worker and no longer blocks a
+    new purge. The `keep` most recent finished jobs are kept.
+    """
+
+    def __init__(self, batch_size: int, keep: int, stale_after: float):
+        self.batch_size = batch_size
+        self.keep = keep
+        self.stale_after = stale_after
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(
+        self, session: AsyncSession, author_id: int, total_books: int
+    ) -> PurgeJob | None:
+        """Record a running job and start it, unless the author is already
+        being purged."""
+        stale_before = datetime.now(tz=UTC).replace(tzinfo=None) - timedelta(
+            seconds=self.stale_after
+        )
+        await session.execute(
+            update(PurgeJob)
+            .where(
+                PurgeJob.author_id == author_id,
+                PurgeJob.status == 'running',
+                PurgeJob.updated_at < stale_before,
+            )
+            .values(status='failed')
+        )
+        job = await session.scalar(
+            dialect_insert(session, PurgeJob)
+            .values(
+                id=uuid4().hex, author_id=author_id, total_books=total_books
+            )
+            .on_conflict_do_nothing()
+            .returning(PurgeJob)
+        )
+        if job is None:
+            await session.rollback()
+            return None
+
+        await self._forget_finished(session)
+        await session.commit()
+
+        task = asyncio.create_task(self._run(session.bind, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return job
+
+    async def _forget_finished(self, session: AsyncSession):
+        kept = (
+            select(PurgeJob.id)
+            .where(PurgeJob.status != 'running')
+            .order_by(PurgeJob.updated_at.desc())
+            .limit(self.keep)
+        )
+        await session.execute(
+            delete(PurgeJob).where(
+                PurgeJob.status != 'running', PurgeJob.id.not_in(kept)
+            )
+        )
+
+    async def _run(self, bind: AsyncEngine, job: PurgeJob):
+        try:
+            await self._purge(bind, job)
+        except asyncio.CancelledError:
+            # Stopped by shutdown with the author half purged; purging it
+            # again picks up the remaining books.
+            await self._fail(bind, job)
+            raise
+        except Exception:
+            logger.exception('Purge of author %s failed', job.author_id)
+            await self._fail(bind, job)
+
+    @staticmethod
+    async def _fail(bind: AsyncEngine, job: PurgeJob):
+        try:
+            async with AsyncSession(bind) as session:
+                await session.execute(
+                    update(PurgeJob)
+                    .where(PurgeJob.id == job.id)
+                    .values(status='failed')
+                )
+                await session.commit()
+        except Exception:
+            # Left running, the job turns stale after PURGE_STALE_AFTER.
+            logger.exception('Could not record the failed purge %s', job.id)
+
+    async def _purge(self, bind: AsyncEngine, job: PurgeJob):
+        batch = (
+            select(Book.id)
+            .where(Book.author_id == job.author_id)
+            .order_by(Book.id)
+            .limit(self.batch_size)
+            .scalar_subquery()
+        )
+        progress = update(PurgeJob).where(PurgeJob.id == job.id)
+        deleted = self.batch_size
+        while deleted == self.batch_size:
+            async with AsyncSession(bind) as session:
+                result = await session.execute(
+                    delete(Book)
+                    .where(Book.id.in_(batch))
+                    .execution_options(synchronize_session=False)
+                )
+                deleted = result.rowcount
+                await session.execute(
+                    progress.values(
+                        deleted_books=PurgeJob.deleted_books + deleted
+                    )
+                )
+                await session.commit()
+            await query_cache.invalidate('books')
+
+        async with AsyncSession(bind) as session:
+            await session.execute(
+                delete(Author).where(Author.id == job.author_id)
+            )
+            await session.execute(progress.values(status='done'))
+            await session.commit()
+        await query_cache.invalidate('authors', 'books')
+        suggestions.discard_author(job.author_id)
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+author_purges = AuthorPurges(
+    batch_size=settings.PURGE_BATCH_SIZE,
+    keep=settings.PURGE_JOBS_KEPT,
+    stale_after=settings.PURGE_STALE_AFTER,
+)
@@ -0,0 +1,225 @@
+import json
+from collections import OrderedDict
+from itertools import count
+from math import ceil
+from time import monotonic, time
+from typing import Any, Protocol
+
+from madr_api.cache import TTLCache
+from madr_api.database import settings
+
+
+class QueryCacheBackend(Protocol):
+    maxsize: int | None
+
+    async def get(self, key: str) -> Any: ...
+
+    async def set(self, key: str, value: Any): ...
+
+    async def tag_versions(self, tags: tuple[str, ...]) -> list[int]: ...
+
+    async def bump(self, tags: tuple[str, ...]): ...
+
+    async def bumped_at(self, tags: tuple[str, ...]) -> float:
+        """When any of `tags` was last bumped, 0 if never."""
+
+    async def clear(self): ...
+
+    def size(self) -> int | None: ...
+
+
+class MemoryBackend:
+    """Per-process backend. Invalidations do not reach other workers, whose
+    copies are only refreshed when their entries expire.
+
+    A tag is forgotten `ttl` seconds after its last bump, once the entries
+    stored before that bump have expired, so the tags of ever more
+    accounts do not pile up. Versions come from a single counter, so a
+    forgotten tag bumped again never gets back an earlier version.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # tag -> (version, bumped at, forgotten at), in order of bumps.
+        self._tags: OrderedDict[str, tuple[int, float, float]] = OrderedDict()
+        self._versions = count(1)
+
+    def _tag(self, tag: str) -> tuple[int, float, float] | None:
+        entry = self._tags.get(tag)
+        if entry is None or entry[2] <= monotonic():
+            return None
+        return entry
+
+    async def get(self, key: str) -> Any:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: Any):
+        self._entries.set(key, value)
+
+    async def tag_versions(self, tags: tuple[str, ...]) -> list[int]:
+        return [entry[0] if (entry := self._tag(tag)) else 0 for tag in tags]
+
+    async def bump(self, tags: tuple[str, ...]):
+        now = monotonic()
+        for tag in tags:
+            self._tags[tag] = (next(self._versions), time(), now + self.ttl)
+            self._tags.move_to_end(tag)
+
+        while self._tags:
+            tag, (*_, forgotten_at) = next(iter(self._tags.items()))
+            if forgotten_at > now:
+                break
+            del self._tags[tag]
+
+    async def bumped_at(self, tags: tuple[str, ...]) -> float:
+        return max(
+            (entry[1] for tag in tags if (entry := self._tag(tag))),
+            default=0,
+        )
+
+    async def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Backend shared by every worker. Entries expire after `ttl` seconds;
+    size-bounded LRU eviction is left to the server's maxmemory policy.
+
+    Tags expire `ttl` seconds after their last bump, like the entries of
+    the memory backend, and take their versions from a shared counter.
+    """
+
+    maxsize = None
+
+    def __init__(self, url: str, ttl: float, prefix: str = 'madr:query:'):
+        try:
+            from redis.asyncio import Redis  # noqa: PLC0415
+        except ImportError as error:
+            raise RuntimeError(
+                'QUERY_CACHE_BACKEND=redis requires the redis package'
+            ) from error
+
+        self._redis = Redis.from_url(url)
+        self._ttl = ceil(ttl)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Any:
+        value = await self._redis.get(self._prefix + key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value: Any):
+        await self._redis.set(
+            self._prefix + key, json.dumps(value), ex=self._ttl
+        )
+
+    async def tag_versions(self, tags: tuple[str, ...]) -> list[int]:
+        versions = await self._redis.mget([
+            f'{self._prefix}tag:{tag}' for tag in tags
+        ])
+        return [int(version or 0) for version in versions]
+
+    async def bump(self, tags: tuple[str, ...]):
+        version = await self._redis.incr(f'{self._prefix}versions')
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.set(f'{self._prefix}tag:{tag}', version, ex=self._ttl)
+                pipe.set(f'{self._prefix}bumped:{tag}', time(), ex=self._ttl)
+            await pipe.execute()
+
+    async def bumped_at(self, tags: tuple[str, ...]) -> float:
+        times = await self._redis.mget([
+            f'{self._prefix}bumped:{tag}' for tag in tags
+        ])
+        return max((float(at or 0) for at in times), default=0)
+
+    async def clear(self):
+        keys = [key async for key in self._redis.scan_iter(self._prefix + '*')]
+        if keys:
+            await self._redis.delete(*keys)
+
+    @staticmethod
+    def size() -> None:
+        return None
+
+
+class QueryCache:
+    """Read-through cache for query results, invalidated by tag.
+
+    Every key embeds the current version of each of its tags, so bumping a
+    tag makes all entries stored under the previous version unreachable.
+    A result loaded while a write commits is stored under the old version
+    and never served afterwards.
+
+    A replica may still lag behind a write after the tag is bumped, so
+    results read from one are not stored for READ_YOUR_WRITES_SECONDS
+    after an invalidation of their tags.
+    """
+
+    def __init__(self, backend: QueryCacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def key(self, name: str, params: dict, tags: tuple[str, ...]):
+        versions = await self.backend.tag_versions(tags)
+        return json.dumps(
+            [name, dict(zip(tags, versions)), params],
+            sort_keys=True,
+            separators=(',', ':'),
+            default=str,
+        )
+
+    async def get(self, key: str) -> Any:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        tags: tuple[str, ...] = (),
+        from_replica: bool = False,
+    ):
+        window = settings.READ_YOUR_WRITES_SECONDS
+        if from_replica and window > 0:
+            if time() - await self.backend.bumped_at(tags) < window:
+                return
+        await self.backend.set(key, value)
+
+    async def invalidate(self, *tags: str):
+        await self.backend.bump(tags)
+
+    async def clear(self):
+        await self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'size': self.backend.size(),
+            'maxsize': self.backend.maxsize,
+        }
+
+
+def create_backend() -> QueryCacheBackend:
+    if settings.QUERY_CACHE_BACKEND == 'redis':
+        return RedisBackend(settings.QUERY_CACHE_URL, settings.QUERY_CACHE_TTL)
+
+    return MemoryBackend(settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL)
+
+
+query_cache = QueryCache(create_backend())
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from http import HTTPStatus
+from math import ceil
+from time import monotonic, time
+from typing import Protocol
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import OAuth2PasswordRequestForm
+
+from madr_api.database import settings
+from madr_api.models import UserAccount
+from madr_api.security import get_current_user_account
+
+
+class BucketStore(Protocol):
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        """Take one token; return 0 or the seconds until one is free."""
+
+
+def _refill(tokens: float, elapsed: float, capacity: float, rate: float):
+    tokens = min(capacity, tokens + elapsed * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBucketStore:
+    """Per-process buckets. The least recently used ones are dropped past
+    `max_keys`, which only ever lets their owners in sooner."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        now = monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens, retry_after = _refill(tokens, now - updated, capacity, rate)
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        return retry_after
+
+
+# Same arithmetic as _refill, run atomically next to the data.
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+class RedisBucketStore:
+    """Buckets shared by every worker."""
+
+    def __init__(self, url: str, prefix: str = 'madr:rate:'):
+        try:
+            from redis.asyncio import Redis  # noqa: PLC0415
+        except ImportError as error:
+            raise RuntimeError(
+                'RATE_LIMIT_BACKEND=redis requires the redis package'
+            ) from error
+
+        self._redis = Redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._prefix = prefix
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        retry_after = await self._take(
+            keys=[self._prefix + key], args=[capacity, rate, time()]
+        )
+        return float(retry_after)
+
+
+class RateLimiter:
+    def __init__(self, store: BucketStore):
+        self.store = store
+        self.rejected = 0
+
+    async def check(self, key: str, capacity: int, per_minute: int):
+        """Spend one token from `key`, or reject with 429 Retry-After."""
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+
+        retry_after = await self.store.take(key, capacity, per_minute / 60)
+        if retry_after:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS,
+                detail='Too many requests, try again later',
+                headers={'Retry-After': str(ceil(retry_after))},
+            )
+
+
+def create_store() -> BucketStore:
+    if settings.RATE_LIMIT_BACKEND == 'redis':
+        return RedisBucketStore(settings.RATE_LIMIT_URL)
+
+    return MemoryBucketStore(settings.RATE_LIMIT_MAX_KEYS)
+
+
+rate_limiter = RateLimiter(create_store())
+
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else 'unknown'
+
+
+async def limit_login(
+    request: Request, form_data: OAuth2PasswordRequestForm = Depends()
+):
+    await rate_limiter.check(
+        f'login-ip:{_client_ip(request)}',
+        settings.LOGIN_IP_BURST,
+        settings.LOGIN_IP_PER_MINUTE,
+    )
+    await rate_limiter.check(
+        f'login-user:{form_data.username}',
+        settings.LOGIN_USERNAME_BURST,
+        settings.LOGIN_USERNAME_PER_MINUTE,
+    )
+
+
+async def limit_signup(request: Request):
+    await rate_limiter.check(
+        f'signup-ip:{_client_ip(request)}',
+        settings.SIGNUP_IP_BURST,
+        settings.SIGNUP_IP_PER_MINUTE,
+    )
+
+
+async def get_writing_account(
+    current_account: UserAccount = Depends(get_current_user_account),
+) -> UserAccount:
+    """The authenticated account, after spending one of its write tokens."""
+    await rate_limiter.check(
+        f'write-account:{current_account.id}',
+        settings.WRITE_ACCOUNT_BURST,
+        settings.WRITE_ACCOUNT_PER_MINUTE,
+    )
+    return current_account
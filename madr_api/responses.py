@@ -0,0 +1,58 @@
+from functools import cache
+
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from madr_api.database import settings
+
+
+def page_response(page: dict, response: Response):
+    """Return a list page that was already validated and dumped.
+
+    The page is encoded straight away instead of going through the
+    route's response_model a second time; FAST_JSON_RESPONSES only swaps
+    the standard encoder for orjson. Both produce the same JSON document.
+    Pages that carry a total also expose it in the X-Total-Count header.
+    """
+    if page.get('total') is not None:
+        response.headers['X-Total-Count'] = str(page['total'])
+
+    response_class = (
+        ORJSONResponse if settings.FAST_JSON_RESPONSES else JSONResponse
+    )
+    return response_class(page, headers=dict(response.headers))
+
+
+@cache
+def _relationship_adapter(schema: type[BaseModel], name: str) -> TypeAdapter:
+    return TypeAdapter(schema.model_fields[name].annotation)
+
+
+def sparse_page(
+    key: str,
+    rows: list,
+    fields: list[str],
+    schema: type[BaseModel],
+    *,
+    expand: str | None = None,
+    **extra,
+) -> dict:
+    """Dump a list page with only `fields` of each row.
+
+    An expanded relationship is still rendered in full, through its type
+    in the item `schema`. `extra` entries that are None are left out, as
+    with exclude_none.
+    """
+    items = [{name: getattr(row, name) for name in fields} for row in rows]
+    if expand:
+        adapter = _relationship_adapter(schema, expand)
+        for item, row in zip(items, rows):
+            related = adapter.validate_python(
+                getattr(row, expand), from_attributes=True
+            )
+            item[expand] = adapter.dump_python(related, mode='json')
+
+    return {key: items} | {
+        name: value for name, value in extra.items() if value is not None
+    }
@@ -1,62 +1,131 @@
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import delete, or_, select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from madr_api.database import get_session
+from madr_api.database import dialect_insert, get_read_session, get_session
+from madr_api.instrumentation import InstrumentedRoute
 from madr_api.models import UserAccount
+from madr_api.pagination import (
+    count_rows,
+    load_fields,
+    next_cursor,
+    paginate,
+    requested_fields,
+)
+from madr_api.rate_limit import get_writing_account, limit_signup
+from madr_api.responses import page_response, sparse_page
 from madr_api.schemas import (
-    FilterPage,
+    AccountsFilterPage,
     Message,
     UserAccountList,
     UserAccountPublic,
     UserAccountSchema,
 )
-from madr_api.security import get_current_user_account, get_password_hash
+from madr_api.security import (
+    account_cache,
+    get_password_hash_async,
+)
 
-router = APIRouter(prefix='/accounts', tags=['accounts'])
+router = APIRouter(
+    prefix='/accounts', tags=['accounts'], route_class=InstrumentedRoute
+)
 
 
-@router.get('/', status_code=HTTPStatus.OK, response_model=UserAccountList)
-def read_users(
-    filter_page: FilterPage = Depends(),
-    session: Session = Depends(get_session),
+async def _ensure_available(
+    session: AsyncSession, account: UserAccountSchema, account_id=None
 ):
-    accounts = session.scalars(
-        select(UserAccount).offset(filter_page.offset).limit(filter_page.limit)
-    ).all()
-    return {'accounts': accounts}
+    # Checked before hashing so duplicate requests cost no Argon2 work;
+    # the unique constraints still catch a racing request.
+    query = select(UserAccount.id).where(
+        or_(
+            UserAccount.username == account.username,
+            UserAccount.email == account.email,
+        )
+    )
+    if account_id is not None:
+        query = query.where(UserAccount.id != account_id)
+
+    if await session.scalar(query.limit(1)) is not None:
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail='Username or email already exists',
+        )
+
+
+@router.get(
+    '/',
+    status_code=HTTPStatus.OK,
+    response_model=UserAccountList,
+    response_model_exclude_none=True,
+)
+async def read_users(
+    response: Response,
+    filter_page: AccountsFilterPage = Depends(),
+    session: AsyncSession = Depends(get_read_session),
+):
+    query = paginate(select(UserAccount), UserAccount, filter_page)
+    fields = requested_fields(filter_page, UserAccountPublic)
+    if fields:
+        query = load_fields(query, UserAccount, fields, filter_page.sort)
+    accounts = (await session.scalars(query)).all()
+
+    total = None
+    if filter_page.count:
+        total = await count_rows(
+            session, select(UserAccount), filter_page.count
+        )
+
+    cursor = next_cursor(accounts, UserAccount, filter_page)
+    if fields:
+        account_list = sparse_page(
+            'accounts',
+            accounts,
+            fields,
+            UserAccountPublic,
+            next_cursor=cursor,
+            total=total,
+        )
+    else:
+        account_list = UserAccountList.model_validate(
+            {'accounts': accounts, 'next_cursor': cursor, 'total': total},
+            from_attributes=True,
+        ).model_dump(mode='json', exclude_none=True)
+
+    return page_response(account_list, response)
 
 
 @router.post(
-    '/', status_code=HTTPStatus.CREATED, response_model=UserAccountPublic
+    '/',
+    status_code=HTTPStatus.CREATED,
+    response_model=UserAccountPublic,
+    dependencies=[Depends(limit_signup)],
 )
-def create_accout(
-    account: UserAccountSchema, session: Session = Depends(get_session)
+async def create_accout(
+    account: UserAccountSchema, session: AsyncSession = Depends(get_session)
 ):
-    db_account = session.scalar(
-        select(UserAccount).where(
-            (UserAccount.username == account.username)
-            | (UserAccount.email == account.email)
+    await _ensure_available(session, account)
+    insert_account = (
+        dialect_insert(session, UserAccount)
+        .values(
+            username=account.username,
+            email=account.email,
+            password=await get_password_hash_async(account.password),
         )
+        .on_conflict_do_nothing()
+        .returning(UserAccount)
     )
+    db_account = await session.scalar(insert_account)
 
-    if db_account:
+    if not db_account:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Username or email already exists',
         )
 
-    db_account = UserAccount(
-        username=account.username,
-        email=account.email,
-        password=get_password_hash(account.password),
-    )
-    session.add(db_account)
-    session.commit()
-    session.refresh(db_account)
+    await session.commit()
 
     return db_account
 
@@ -66,44 +135,56 @@ def create_accout(
     status_code=HTTPStatus.OK,
     response_model=UserAccountPublic,
 )
-def update_account(
+async def update_account(
     account_id: int,
     account: UserAccountSchema,
-    session: Session = Depends(get_session),
-    current_account: UserAccount = Depends(get_current_user_account),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
 ):
     if account_id != current_account.id:
         raise HTTPException(
             status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
         )
+    await _ensure_available(session, account, account_id)
     try:
-        current_account.username = account.username
-        current_account.email = account.email
-        current_account.password = get_password_hash(account.password)
-        session.commit()
-        session.refresh(current_account)
-
-        return current_account
+        db_account = await session.scalar(
+            update(UserAccount)
+            .where(UserAccount.id == account_id)
+            .values(
+                username=account.username,
+                email=account.email,
+                password=await get_password_hash_async(account.password),
+            )
+            .returning(UserAccount)
+        )
+        await session.commit()
     except IntegrityError:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Username or email already exists',
         )
 
+    await account_cache.invalidate(account_id)
+
+    return db_account
+
 
 @router.delete(
     '/{account_id}', status_code=HTTPStatus.OK, response_model=Message
 )
-def delete_account(
+async def delete_account(
     account_id: int,
-    session: Session = Depends(get_session),
-    current_account: UserAccount = Depends(get_current_user_account),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
 ):
     if current_account.id != account_id:
         raise HTTPException(
             status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
         )
-    session.delete(current_account)
-    session.commit()
+    await session.execute(
+        delete(UserAccount).where(UserAccount.id == account_id)
+    )
+    await session.commit()
+    await account_cache.invalidate(account_id)
 
     return {'message': 'Account deleted'}
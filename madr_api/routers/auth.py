@@ -3,46 +3,68 @@ from http import HTTPStatus
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from madr_api.database import get_session
+from madr_api.instrumentation import InstrumentedRoute
 from madr_api.models import UserAccount
+from madr_api.rate_limit import limit_login
 from madr_api.schemas import Token
 from madr_api.security import (
+    account_cache,
     create_access_token,
     get_current_user_account,
-    verify_password,
+    verify_and_update_password_async,
 )
 
-router = APIRouter(prefix='/auth', tags=['auth'])
+router = APIRouter(
+    prefix='/auth', tags=['auth'], route_class=InstrumentedRoute
+)
 
 
-@router.post('/token', status_code=HTTPStatus.OK, response_model=Token)
-def login_for_access_token(
+@router.post(
+    '/token',
+    status_code=HTTPStatus.OK,
+    response_model=Token,
+    dependencies=[Depends(limit_login)],
+)
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
 ):
-    account = session.scalar(
+    account = await session.scalar(
         select(UserAccount).where(UserAccount.username == form_data.username)
     )
-    if not (
-        (account is not None)
-        and verify_password(form_data.password, account.password)
-    ):
+    verified, updated_hash = False, None
+    if account is not None:
+        verified, updated_hash = await verify_and_update_password_async(
+            form_data.password, account.password
+        )
+    if not verified:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail='Incorrect email or password',
         )
 
-    access_token = create_access_token(data={'sub': account.email})
+    if updated_hash:
+        # Hashed with older Argon2 costs, store it with the current ones.
+        account.password = updated_hash
+        await session.commit()
+        await account_cache.invalidate(account.id)
+
+    access_token = create_access_token(
+        data={'sub': account.email, 'uid': account.id}
+    )
 
     return {'access_token': access_token, 'token_type': 'bearer'}
 
 
 @router.post('/refresh_token', status_code=HTTPStatus.OK, response_model=Token)
-def get_refresh_token(
-    session: Session = Depends(get_session),
+async def get_refresh_token(
+    session: AsyncSession = Depends(get_session),
     current_account: UserAccount = Depends(get_current_user_account),
 ):
-    access_token = create_access_token(data={'sub': current_account.email})
+    access_token = create_access_token(
+        data={'sub': current_account.email, 'uid': current_account.id}
+    )
     return {'access_token': access_token, 'token_type': 'bearer'}
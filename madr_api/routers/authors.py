@@ -1,117 +1,305 @@
+from collections import defaultdict
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
 
-from madr_api.database import get_session
-from madr_api.models import Author, UserAccount
+from madr_api.conditional import (
+    conditional_response,
+    make_etag,
+    row_version,
+    select_versions,
+    version_of,
+)
+from madr_api.database import (
+    dialect_insert,
+    get_read_session,
+    get_session,
+    pinned_to_primary,
+    read_from_replica,
+)
+from madr_api.export import stream_export
+from madr_api.instrumentation import InstrumentedRoute
+from madr_api.models import Author, Book, PurgeJob, UserAccount
+from madr_api.pagination import (
+    count_rows,
+    load_fields,
+    next_cursor,
+    paginate,
+    requested_fields,
+)
+from madr_api.purge import author_purges
+from madr_api.query_cache import query_cache
+from madr_api.rate_limit import get_writing_account
+from madr_api.responses import page_response, sparse_page
 from madr_api.schemas import (
+    AuthorExpand,
     AuthorList,
     AuthorPublic,
+    AuthorPurge,
     AuthorSchema,
     AuthorsFilterPage,
+    AuthorWithBooks,
+    ExportParams,
     Message,
 )
 from madr_api.security import get_current_user_account
+from madr_api.suggest import suggestions
 from madr_api.utils import sanitize_string
 
-router = APIRouter(prefix='/authors', tags=['authors'])
+router = APIRouter(
+    prefix='/authors', tags=['authors'], route_class=InstrumentedRoute
+)
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=AuthorPublic)
-def create_author(
+async def create_author(
     new_author: AuthorSchema,
-    session: Session = Depends(get_session),
-    current_account: UserAccount = Depends(get_current_user_account),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
 ):
     author_name = sanitize_string(new_author.name)
 
-    try:
-        db_author = Author(name=author_name)
-        session.add(db_author)
-        session.commit()
-        session.refresh(db_author)
-
-        return db_author
-    except IntegrityError:
+    db_author = await session.scalar(
+        dialect_insert(session, Author)
+        .values(name=author_name)
+        .on_conflict_do_nothing(index_elements=['name'])
+        .returning(Author)
+    )
+    if not db_author:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Author name already exists',
         )
 
+    await session.commit()
+    await query_cache.invalidate('authors')
+    suggestions.put_author(db_author.id, db_author.name)
+
+    return db_author
+
 
 @router.delete(
     '/{author_id}', status_code=HTTPStatus.OK, response_model=Message
 )
-def delete_author(
+async def delete_author(
     author_id: int,
-    session: Session = Depends(get_session),
-    current_account: UserAccount = Depends(get_current_user_account),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
 ):
-    db_author = session.scalar(select(Author).where(Author.id == author_id))
-
-    if not db_author:
+    # The books go with it through ON DELETE CASCADE.
+    deleted = await session.scalar(
+        delete(Author).where(Author.id == author_id).returning(Author.id)
+    )
+    if deleted is None:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Author not found'
         )
 
-    session.delete(db_author)
-    session.commit()
+    await session.commit()
+    # Deleting an author also deletes their books.
+    await query_cache.invalidate('authors', 'books')
+    suggestions.discard_author(author_id)
 
     return {'message': 'Author deleted'}
 
 
-@router.patch(
-    '/{author_id}', status_code=HTTPStatus.OK, response_model=AuthorPublic
+@router.post(
+    '/{author_id}/purge',
+    status_code=HTTPStatus.ACCEPTED,
+    response_model=AuthorPurge,
 )
-def update_author(
+async def purge_author(
     author_id: int,
-    new_author: AuthorSchema,
-    session: Session = Depends(get_session),
-    current_account: UserAccount = Depends(get_current_user_account),
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
 ):
-    author_name = sanitize_string(new_author.name)
+    """Delete an author and their books in the background, in batches.
 
-    db_author = session.scalar(select(Author).where(Author.id == author_id))
-    if not db_author:
+    Meant for prolific authors, whose books a single DELETE would hold a
+    connection and row locks for too long to remove."""
+    total_books = await session.scalar(
+        select(func.count(Book.id))
+        .select_from(Author)
+        .outerjoin(Book)
+        .where(Author.id == author_id)
+        .group_by(Author.id)
+    )
+    if total_books is None:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Author not found'
         )
 
-    try:
-        db_author.name = author_name
-        session.commit()
-        session.refresh(db_author)
+    job = await author_purges.start(session, author_id, total_books)
+    if job is None:
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail='Author purge already running',
+        )
+
+    response.headers['Location'] = f'/authors/purges/{job.id}'
+
+    return job
+
+
+@router.get(
+    '/purges/{job_id}', status_code=HTTPStatus.OK, response_model=AuthorPurge
+)
+async def read_author_purge(
+    job_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_current_user_account),
+):
+    # Updated by the purge task, in sessions of its own.
+    job = await session.get(PurgeJob, job_id, populate_existing=True)
+    if not job:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='Purge not found'
+        )
+
+    return job
 
-        return db_author
+
+@router.patch(
+    '/{author_id}', status_code=HTTPStatus.OK, response_model=AuthorPublic
+)
+async def update_author(
+    author_id: int,
+    new_author: AuthorSchema,
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
+):
+    author_name = sanitize_string(new_author.name)
+
+    try:
+        db_author = await session.scalar(
+            update(Author)
+            .where(Author.id == author_id)
+            .values(name=author_name)
+            .returning(Author)
+        )
     except IntegrityError:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Author name already exists',
         )
+    if not db_author:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='Author not found'
+        )
+
+    await session.commit()
+
+    await query_cache.invalidate('authors')
+    suggestions.put_author(db_author.id, db_author.name)
+
+    return db_author
+
+
+@router.get('/export', status_code=HTTPStatus.OK)
+async def export_authors(
+    params: ExportParams = Depends(),
+    session: AsyncSession = Depends(get_session),
+):
+    return stream_export(session.bind, Author, AuthorPublic, params.format)
+
+
+async def _load_books(
+    session: AsyncSession, authors: list[Author], offset: int, limit: int
+):
+    """Load one page of books for every author with a single query."""
+    if not authors:
+        return
+
+    position = (
+        func
+        .row_number()
+        .over(partition_by=Book.author_id, order_by=Book.id)
+        .label('position')
+    )
+    ranked = (
+        select(Book, position)
+        .where(Book.author_id.in_([author.id for author in authors]))
+        .subquery()
+    )
+    ranked_book = aliased(Book, ranked)
+    books = await session.scalars(
+        select(ranked_book)
+        .where(ranked.c.position > offset, ranked.c.position <= offset + limit)
+        .order_by(ranked_book.author_id, ranked_book.id)
+    )
+
+    books_by_author = defaultdict(list)
+    for book in books:
+        books_by_author[book.author_id].append(book)
+    for author in authors:
+        set_committed_value(author, 'books', books_by_author[author.id])
 
 
 @router.get(
-    '/{author_id}', status_code=HTTPStatus.OK, response_model=AuthorPublic
+    '/{author_id}',
+    status_code=HTTPStatus.OK,
+    response_model=AuthorWithBooks,
+    response_model_exclude_none=True,
 )
-def read_author_detail(
-    author_id: int, session: Session = Depends(get_session)
+async def read_author_detail(
+    author_id: int,
+    request: Request,
+    response: Response,
+    author_expand: AuthorExpand = Depends(),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    db_author = session.scalar(select(Author).where(Author.id == author_id))
+    db_author = await session.scalar(
+        select(Author).where(Author.id == author_id)
+    )
 
     if not db_author:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Author not found'
         )
 
+    if author_expand.expand == 'books':
+        await _load_books(
+            session,
+            [db_author],
+            author_expand.books_offset,
+            author_expand.books_limit,
+        )
+        # A book deleted from the page leaves no newer timestamp behind, so
+        # expanded authors are only validated by their ETag.
+        etag = make_etag(
+            author_expand.model_dump(),
+            row_version(db_author),
+            *map(row_version, db_author.books),
+        )
+        last_modified = None
+    else:
+        etag = make_etag(None, row_version(db_author))
+        last_modified = db_author.updated_at
+
+    if not_modified := conditional_response(
+        request, response, etag, last_modified
+    ):
+        return not_modified
+
     return db_author
 
 
-@router.get('/', status_code=HTTPStatus.OK, response_model=AuthorList)
-def read_authors(
-    session: Session = Depends(get_session),
+@router.get(
+    '/',
+    status_code=HTTPStatus.OK,
+    response_model=AuthorList,
+    response_model_exclude_none=True,
+)
+async def read_authors(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
     filter_page: AuthorsFilterPage = Depends(),
 ):
     query = select(Author)
@@ -119,8 +307,69 @@ def read_authors(
         name_filter = sanitize_string(filter_page.name)
         query = query.where(Author.name.contains(name_filter))
 
-    authors = session.scalars(
-        query.offset(filter_page.offset).limit(filter_page.limit)
-    ).all()
+    filtered = query
+    query = paginate(query, Author, filter_page)
+    fields = requested_fields(filter_page, AuthorPublic)
+
+    params = filter_page.model_dump()
+    tags = ('authors', 'books') if filter_page.expand else ('authors',)
+    cache_key = await query_cache.key('authors', params, tags)
+    # A client that just wrote skips pages cached before its write.
+    if not pinned_to_primary(request) and (
+        cached := await query_cache.get(cache_key)
+    ):
+        return conditional_response(
+            request, response, cached['etag']
+        ) or page_response(cached['page'], response)
+
+    total = None
+    if filter_page.count:
+        total = await count_rows(session, filtered, filter_page.count)
+
+    page = query.cte()
+    versions = [version_of(page.c.id, page.c.updated_at)]
+    if filter_page.expand == 'books':
+        versions.append(
+            version_of(
+                Book.id, Book.updated_at, Book.author_id.in_(select(page.c.id))
+            )
+        )
+    version = (await session.execute(select_versions(*versions))).one()
+    etag = make_etag(params, total, *version)
+    if not_modified := conditional_response(request, response, etag):
+        return not_modified
+
+    if fields:
+        query = load_fields(query, Author, fields, filter_page.sort)
+
+    authors = (await session.scalars(query)).all()
+
+    if filter_page.expand == 'books':
+        await _load_books(
+            session, authors, filter_page.books_offset, filter_page.books_limit
+        )
+
+    cursor = next_cursor(authors, Author, filter_page)
+    if fields:
+        author_list = sparse_page(
+            'authors',
+            authors,
+            fields,
+            AuthorWithBooks,
+            expand=filter_page.expand,
+            next_cursor=cursor,
+            total=total,
+        )
+    else:
+        author_list = AuthorList.model_validate(
+            {'authors': authors, 'next_cursor': cursor, 'total': total},
+            from_attributes=True,
+        ).model_dump(mode='json', exclude_none=True)
+    await query_cache.set(
+        cache_key,
+        {'etag': etag, 'page': author_list},
+        tags,
+        from_replica=read_from_replica(session),
+    )
 
-    return {'authors': authors}
+    return page_response(author_list, response)
@@ -1,72 +1,443 @@
+import json
 from http import HTTPStatus
+from operator import itemgetter
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from pydantic import ValidationError
+from sqlalchemy import delete, select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
-from madr_api.database import get_session
+from madr_api.conditional import (
+    conditional_response,
+    make_etag,
+    row_version,
+    select_versions,
+    version_of,
+)
+from madr_api.database import (
+    dialect_insert,
+    get_read_session,
+    get_session,
+    is_foreign_key_violation,
+    pinned_to_primary,
+    read_from_replica,
+    settings,
+)
+from madr_api.export import stream_export
+from madr_api.instrumentation import InstrumentedRoute
 from madr_api.models import Author, Book, UserAccount
+from madr_api.pagination import (
+    count_rows,
+    load_fields,
+    next_cursor,
+    paginate,
+    requested_fields,
+)
+from madr_api.query_cache import query_cache
+from madr_api.rate_limit import get_writing_account
+from madr_api.responses import page_response, sparse_page
 from madr_api.schemas import (
+    BookExpand,
     BookList,
     BookPublic,
     BookSchema,
     BooksFilterPage,
     BookUpdate,
+    BookWithAuthor,
+    BulkBookDeleteReport,
+    BulkBookReport,
+    BulkBookUpdate,
+    BulkBookUpdateReport,
+    ExportParams,
     Message,
 )
-from madr_api.security import get_current_user_account
+from madr_api.suggest import suggestions
 from madr_api.utils import sanitize_string
 
-router = APIRouter(prefix='/books', tags=['books'])
+router = APIRouter(
+    prefix='/books', tags=['books'], route_class=InstrumentedRoute
+)
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=BookPublic)
-def create_book(
+async def create_book(
     new_book: BookSchema,
-    session: Session = Depends(get_session),
-    current_account: UserAccount = Depends(get_current_user_account),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
 ):
-    db_author = session.scalar(
-        select(Author).where(Author.id == new_book.author_id)
+    new_title = sanitize_string(new_book.title)
+    insert_book = (
+        dialect_insert(session, Book)
+        .values(
+            title=new_title, year=new_book.year, author_id=new_book.author_id
+        )
+        .on_conflict_do_nothing(index_elements=['title'])
+        .returning(Book)
     )
-    if not db_author:
+
+    try:
+        db_book = await session.scalar(insert_book)
+    except IntegrityError:
+        # The title conflict is absorbed above, only the author can fail.
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST, detail='Author not found'
         )
+    if not db_book:
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail='Book title already exists',
+        )
 
-    new_title = sanitize_string(new_book.title)
-    db_book = Book(
-        title=new_title, year=new_book.year, author_id=new_book.author_id
+    await session.commit()
+    await query_cache.invalidate('books')
+    suggestions.put_books([(db_book.id, db_book.title, db_book.author_id)])
+
+    return db_book
+
+
+async def _ndjson_lines(request: Request):
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def _bulk_items(request: Request):
+    """Yield the raw items of a JSON array body or an NDJSON stream."""
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith(NDJSON_MEDIA_TYPE):
+        async for line in _ndjson_lines(request):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield line
+        return
+
+    try:
+        items = await request.json()
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail='Expected a JSON array or an NDJSON stream of books',
+        )
+    for item in items:
+        yield item
+
+
+def _with_known_author(
+    rows: dict, known_authors: set[int], results: list[dict]
+) -> dict:
+    """The rows whose author exists; the others are reported missing."""
+    known = {}
+    for title, (index, row) in rows.items():
+        if row['author_id'] in known_authors:
+            known[title] = (index, row)
+        else:
+            results.append({'index': index, 'status': 'missing_author'})
+    return known
+
+
+async def _insert_books(session: AsyncSession, rows: dict) -> dict[str, int]:
+    """Insert the rows, skipping taken titles; map new titles to ids."""
+    insert_books = (
+        dialect_insert(session, Book)
+        .on_conflict_do_nothing(index_elements=['title'])
+        .returning(Book.title, Book.id)
     )
+    inserted = await session.execute(
+        insert_books, [row for _, row in rows.values()]
+    )
+    return dict(inserted.tuples().all())
+
+
+async def _import_batch(
+    session: AsyncSession, batch: list, known_authors: set[int]
+) -> list[dict]:
+    results = []
+    rows = {}
+    for index, item in batch:
+        try:
+            book = BookSchema.model_validate(item)
+        except ValidationError as error:
+            results.append({
+                'index': index,
+                'status': 'invalid',
+                'detail': error.errors()[0]['msg'],
+            })
+            continue
+
+        title = sanitize_string(book.title)
+        if title in rows:
+            results.append({'index': index, 'status': 'duplicate_title'})
+            continue
+        rows[title] = (
+            index,
+            {'title': title, 'year': book.year, 'author_id': book.author_id},
+        )
+
+    unknown_authors = {row['author_id'] for _, row in rows.values()}
+    unknown_authors -= known_authors
+    if unknown_authors:
+        known_authors.update(
+            await session.scalars(
+                select(Author.id).where(Author.id.in_(unknown_authors))
+            )
+        )
+
+    to_insert = _with_known_author(rows, known_authors, results)
+    if not to_insert:
+        return results
 
     try:
-        session.add(db_book)
-        session.commit()
-        session.refresh(db_book)
+        created = await _insert_books(session, to_insert)
+    except IntegrityError as error:
+        if not is_foreign_key_violation(error):
+            raise
+        # An author was deleted after it was looked up: check the authors
+        # of this batch again and insert it without their books.
+        await session.rollback()
+        authors = {row['author_id'] for _, row in to_insert.values()}
+        known_authors -= authors
+        known_authors.update(
+            await session.scalars(
+                select(Author.id).where(Author.id.in_(authors))
+            )
+        )
+        to_insert = _with_known_author(to_insert, known_authors, results)
+        created = await _insert_books(session, to_insert) if to_insert else {}
 
-        return db_book
-    except IntegrityError:
-        raise HTTPException(
-            status_code=HTTPStatus.CONFLICT,
-            detail='Book title already exists',
+    await session.commit()
+    if created:
+        await query_cache.invalidate('books')
+    suggestions.put_books([
+        (created[title], title, row['author_id'])
+        for title, (_, row) in to_insert.items()
+        if title in created
+    ])
+
+    for title, (index, _) in to_insert.items():
+        if title in created:
+            results.append({
+                'index': index,
+                'status': 'created',
+                'id': created[title],
+            })
+        else:
+            results.append({'index': index, 'status': 'duplicate_title'})
+
+    return results
+
+
+@router.post(
+    '/bulk',
+    status_code=HTTPStatus.OK,
+    response_model=BulkBookReport,
+    response_model_exclude_none=True,
+)
+async def create_books_bulk(
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
+):
+    results = []
+    known_authors = set()
+    batch = []
+    index = 0
+
+    async for item in _bulk_items(request):
+        batch.append((index, item))
+        index += 1
+        if len(batch) >= settings.BULK_BATCH_SIZE:
+            results += await _import_batch(session, batch, known_authors)
+            batch = []
+    if batch:
+        results += await _import_batch(session, batch, known_authors)
+
+    results.sort(key=itemgetter('index'))
+    created = sum(1 for result in results if result['status'] == 'created')
+
+    return {'created': created, 'results': results}
+
+
+def _write_error(error: IntegrityError) -> HTTPException:
+    if is_foreign_key_violation(error):
+        return HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='Author not found'
+        )
+    return HTTPException(
+        status_code=HTTPStatus.CONFLICT, detail='Book title already exists'
+    )
+
+
+def _book_changes(book_data: BookUpdate, **options) -> dict:
+    """The fields set on `book_data`, with the title sanitized as on
+    create."""
+    changes = book_data.model_dump(exclude_unset=True, **options)
+    if changes.get('title') is not None:
+        changes['title'] = sanitize_string(changes['title'])
+    return changes
+
+
+@router.patch(
+    '/', status_code=HTTPStatus.OK, response_model=BulkBookUpdateReport
+)
+async def update_books_bulk(
+    books: list[BulkBookUpdate] = Body(max_length=settings.BULK_BATCH_SIZE),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
+):
+    changes = {}
+    for book in books:
+        if book.id not in changes:
+            changes[book.id] = _book_changes(
+                book, exclude={'id'}, exclude_none=True
+            )
+
+    titles = {
+        values['title'] for values in changes.values() if 'title' in values
+    }
+    current = {
+        book_id: (title, author_id)
+        for book_id, title, author_id in await session.execute(
+            select(Book.id, Book.title, Book.author_id).where(
+                Book.id.in_(changes) | Book.title.in_(titles)
+            )
+        )
+    }
+    title_owners = {title: book_id for book_id, (title, _) in current.items()}
+    existing = set(current)
+
+    author_ids = {
+        values['author_id']
+        for values in changes.values()
+        if 'author_id' in values
+    }
+    known_authors = set()
+    if author_ids:
+        known_authors.update(
+            await session.scalars(
+                select(Author.id).where(Author.id.in_(author_ids))
+            )
         )
 
+    statuses = {}
+    claimed_titles = set()
+    rows = []
+    for book_id, values in changes.items():
+        title = values.get('title')
+        author_id = values.get('author_id')
+        if book_id not in existing:
+            statuses[book_id] = 'not_found'
+        elif author_id is not None and author_id not in known_authors:
+            statuses[book_id] = 'missing_author'
+        # A title held by another book counts as taken, even when that
+        # book is renamed in the same batch.
+        elif title is not None and (
+            title in claimed_titles
+            or title_owners.get(title, book_id) != book_id
+        ):
+            statuses[book_id] = 'duplicate_title'
+        else:
+            statuses[book_id] = 'updated'
+            if title is not None:
+                claimed_titles.add(title)
+            if values:
+                rows.append({'id': book_id, **values})
+
+    if rows:
+        try:
+            # Bulk UPDATE by primary key: one executemany per set of
+            # changed columns, all in this transaction.
+            await session.execute(update(Book), rows)
+        except IntegrityError as error:
+            raise _write_error(error)
+        await session.commit()
+        await query_cache.invalidate('books')
+        suggestions.put_books([
+            (
+                row['id'],
+                row.get('title', current[row['id']][0]),
+                row.get('author_id', current[row['id']][1]),
+            )
+            for row in rows
+        ])
+
+    updated = sum(1 for status in statuses.values() if status == 'updated')
+    # Repeated ids are reported once with their status, then as duplicates.
+    results = [
+        {'id': book.id, 'status': statuses.pop(book.id, 'duplicate_id')}
+        for book in books
+    ]
+
+    return {'updated': updated, 'results': results}
+
+
+@router.delete(
+    '/', status_code=HTTPStatus.OK, response_model=BulkBookDeleteReport
+)
+async def delete_books_bulk(
+    ids: list[int] = Query(max_length=settings.BULK_BATCH_SIZE),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
+):
+    ids = list(dict.fromkeys(ids))
+    deleted = set(
+        await session.scalars(
+            delete(Book).where(Book.id.in_(ids)).returning(Book.id)
+        )
+    )
+    await session.commit()
+    if deleted:
+        await query_cache.invalidate('books')
+        suggestions.discard_books(list(deleted))
+
+    return {
+        'deleted': len(deleted),
+        'results': [
+            {'id': book_id, 'status': 'deleted'}
+            if book_id in deleted
+            else {'id': book_id, 'status': 'not_found'}
+            for book_id in ids
+        ],
+    }
+
 
 @router.delete('/{book_id}', status_code=HTTPStatus.OK, response_model=Message)
-def delete_book(
+async def delete_book(
     book_id: int,
-    session: Session = Depends(get_session),
-    current_account: UserAccount = Depends(get_current_user_account),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
 ):
-    db_book = session.scalar(select(Book).where(Book.id == book_id))
-    if not db_book:
+    deleted = await session.scalar(
+        delete(Book).where(Book.id == book_id).returning(Book.id)
+    )
+    if deleted is None:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Book not found'
         )
 
-    session.delete(db_book)
-    session.commit()
+    await session.commit()
+    await query_cache.invalidate('books')
+    suggestions.discard_books([book_id])
 
     return {'message': 'Book deleted'}
 
@@ -74,46 +445,50 @@ def delete_book(
 @router.patch(
     '/{book_id}', status_code=HTTPStatus.OK, response_model=BookPublic
 )
-def update_book(
+async def update_book(
     book_id: int,
     book_data: BookUpdate,
-    session: Session = Depends(get_session),
-    current_account: UserAccount = Depends(get_current_user_account),
+    session: AsyncSession = Depends(get_session),
+    current_account: UserAccount = Depends(get_writing_account),
 ):
-    db_book = session.scalar(select(Book).where(Book.id == book_id))
-    if not db_book:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND, detail='Book not found'
+    changes = _book_changes(book_data)
+    if changes:
+        query = (
+            update(Book)
+            .where(Book.id == book_id)
+            .values(**changes)
+            .returning(Book)
         )
+    else:
+        query = select(Book).where(Book.id == book_id)
 
     try:
-        for key, value in book_data.model_dump(exclude_unset=True).items():
-            if key == 'author_id':
-                db_author = session.scalar(
-                    select(Author).where(Author.id == value)
-                )
-                if not db_author:
-                    raise HTTPException(
-                        status_code=HTTPStatus.BAD_REQUEST,
-                        detail='Author not found',
-                    )
-            setattr(db_book, key, value)
-
-        session.add(db_book)
-        session.commit()
-        session.refresh(db_book)
-
-        return db_book
-    except IntegrityError:
+        db_book = await session.scalar(query)
+    except IntegrityError as error:
+        raise _write_error(error)
+    if not db_book:
         raise HTTPException(
-            status_code=HTTPStatus.CONFLICT, detail='Book title already exists'
+            status_code=HTTPStatus.NOT_FOUND, detail='Book not found'
         )
 
+    await session.commit()
+    await query_cache.invalidate('books')
+    suggestions.put_books([(db_book.id, db_book.title, db_book.author_id)])
+
+    return db_book
+
 
-@router.get('/', status_code=HTTPStatus.OK, response_model=BookList)
-def fetch_books(
+@router.get(
+    '/',
+    status_code=HTTPStatus.OK,
+    response_model=BookList,
+    response_model_exclude_none=True,
+)
+async def fetch_books(
+    request: Request,
+    response: Response,
     filter_page: BooksFilterPage = Depends(),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
 ):
     query = select(Book)
 
@@ -123,19 +498,116 @@ def fetch_books(
     if year := filter_page.year:
         query = query.where(Book.year == year)
 
-    query = query.offset(filter_page.offset).limit(filter_page.limit)
+    if filter_page.expand == 'author':
+        query = query.options(selectinload(Book.author))
 
-    books = session.scalars(query).all()
+    filtered = query
+    query = paginate(query, Book, filter_page)
+    fields = requested_fields(filter_page, BookPublic)
 
-    return {'books': books}
+    params = filter_page.model_dump()
+    tags = ('books', 'authors') if filter_page.expand else ('books',)
+    cache_key = await query_cache.key('books', params, tags)
+    # A client that just wrote skips pages cached before its write.
+    if not pinned_to_primary(request) and (
+        cached := await query_cache.get(cache_key)
+    ):
+        return conditional_response(
+            request, response, cached['etag']
+        ) or page_response(cached['page'], response)
 
+    total = None
+    if filter_page.count:
+        total = await count_rows(session, filtered, filter_page.count)
 
-@router.get('/{book_id}', status_code=HTTPStatus.OK, response_model=BookPublic)
-def read_book_details(book_id: int, session: Session = Depends(get_session)):
-    db_book = session.scalar(select(Book).where(Book.id == book_id))
+    page = query.cte()
+    versions = [version_of(page.c.id, page.c.updated_at)]
+    if filter_page.expand == 'author':
+        versions.append(
+            version_of(
+                Author.id,
+                Author.updated_at,
+                Author.id.in_(select(page.c.author_id)),
+            )
+        )
+    version = (await session.execute(select_versions(*versions))).one()
+    etag = make_etag(params, total, *version)
+    if not_modified := conditional_response(request, response, etag):
+        return not_modified
+
+    if fields:
+        # selectinload(Book.author) reads the foreign key of every row.
+        keys = ('author_id',) if filter_page.expand else ()
+        query = load_fields(query, Book, fields, filter_page.sort, *keys)
+
+    books = (await session.scalars(query)).all()
+    cursor = next_cursor(books, Book, filter_page)
+    if fields:
+        book_list = sparse_page(
+            'books',
+            books,
+            fields,
+            BookWithAuthor,
+            expand=filter_page.expand,
+            next_cursor=cursor,
+            total=total,
+        )
+    else:
+        book_list = BookList.model_validate(
+            {'books': books, 'next_cursor': cursor, 'total': total},
+            from_attributes=True,
+        ).model_dump(mode='json', exclude_none=True)
+    await query_cache.set(
+        cache_key,
+        {'etag': etag, 'page': book_list},
+        tags,
+        from_replica=read_from_replica(session),
+    )
+
+    return page_response(book_list, response)
+
+
+@router.get('/export', status_code=HTTPStatus.OK)
+async def export_books(
+    params: ExportParams = Depends(),
+    session: AsyncSession = Depends(get_session),
+):
+    return stream_export(session.bind, Book, BookPublic, params.format)
+
+
+@router.get(
+    '/{book_id}',
+    status_code=HTTPStatus.OK,
+    response_model=BookWithAuthor,
+    response_model_exclude_none=True,
+)
+async def read_book_details(
+    book_id: int,
+    request: Request,
+    response: Response,
+    book_expand: BookExpand = Depends(),
+    session: AsyncSession = Depends(get_read_session),
+):
+    query = select(Book).where(Book.id == book_id)
+    if book_expand.expand == 'author':
+        query = query.options(joinedload(Book.author))
+
+    db_book = await session.scalar(query)
     if not db_book:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Book not found'
         )
 
+    versions = [row_version(db_book)]
+    last_modified = db_book.updated_at
+    if book_expand.expand == 'author' and db_book.author:
+        versions.append(row_version(db_book.author))
+        last_modified = max(last_modified, db_book.author.updated_at)
+
+    etag = make_etag(book_expand.expand, *versions)
+    if not_modified := conditional_response(
+        request, response, etag, last_modified
+    ):
+        return not_modified
+
     return db_book
@@ -0,0 +1,73 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends
+
+from madr_api.database import engine, get_pool_status, slow_query_log
+from madr_api.instrumentation import InstrumentedRoute
+from madr_api.models import UserAccount
+from madr_api.query_cache import query_cache
+from madr_api.schemas import (
+    CacheStats,
+    HashingStats,
+    Message,
+    PoolStatus,
+    SlowQueryList,
+)
+from madr_api.security import (
+    account_cache,
+    get_admin_account,
+    password_hasher,
+)
+
+router = APIRouter(
+    prefix='/metrics', tags=['metrics'], route_class=InstrumentedRoute
+)
+
+
+@router.get('/pool', status_code=HTTPStatus.OK, response_model=PoolStatus)
+async def read_pool_status(
+    current_account: UserAccount = Depends(get_admin_account),
+):
+    return get_pool_status(engine.pool)
+
+
+@router.get(
+    '/cache', status_code=HTTPStatus.OK, response_model=dict[str, CacheStats]
+)
+async def read_cache_stats(
+    current_account: UserAccount = Depends(get_admin_account),
+):
+    return {
+        'accounts': account_cache.stats(),
+        'queries': query_cache.stats(),
+    }
+
+
+@router.get('/hashing', status_code=HTTPStatus.OK, response_model=HashingStats)
+async def read_hashing_stats(
+    current_account: UserAccount = Depends(get_admin_account),
+):
+    return password_hasher.stats()
+
+
+@router.get(
+    '/slow_queries', status_code=HTTPStatus.OK, response_model=SlowQueryList
+)
+async def read_slow_queries(
+    current_account: UserAccount = Depends(get_admin_account),
+):
+    return {
+        'threshold': slow_query_log.threshold,
+        'queries': list(reversed(slow_query_log.entries)),
+    }
+
+
+@router.delete(
+    '/slow_queries', status_code=HTTPStatus.OK, response_model=Message
+)
+async def clear_slow_queries(
+    current_account: UserAccount = Depends(get_admin_account),
+):
+    slow_query_log.clear()
+
+    return {'message': 'Slow query log cleared'}
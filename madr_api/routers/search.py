@@ -0,0 +1,87 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import (
+    Select,
+    desc,
+    func,
+    literal,
+    literal_column,
+    select,
+    table,
+)
+from sqlalchemy import column as sql_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr_api.database import get_read_session
+from madr_api.instrumentation import InstrumentedRoute
+from madr_api.models import Author, Book
+from madr_api.schemas import SearchPage, SearchResults
+from madr_api.utils import sanitize_string
+
+router = APIRouter(
+    prefix='/search', tags=['search'], route_class=InstrumentedRoute
+)
+
+
+def _postgres_search(terms: str) -> Select:
+    # The expressions must match the GIN indexes declared in models.py.
+    config = literal_column("'simple'")
+    tsquery = func.plainto_tsquery(config, terms)
+
+    def ranked(kind: str, column):
+        document = func.to_tsvector(config, column)
+        return select(
+            literal(kind).label('kind'),
+            column.table.c.id,
+            column.label('text'),
+            func.ts_rank(document, tsquery).label('rank'),
+        ).where(document.op('@@')(tsquery))
+
+    return ranked('book', Book.__table__.c.title).union_all(
+        ranked('author', Author.__table__.c.name)
+    )
+
+
+def _sqlite_search(terms: str) -> Select:
+    # Quote every word so user input is never parsed as FTS5 syntax.
+    words = (word.replace('"', '""') for word in terms.split())
+    match = ' '.join(f'"{word}"' for word in words)
+
+    def ranked(kind: str, column):
+        fts_name = f'{column.table.name}_fts'
+        fts = table(fts_name, sql_column('rowid'))
+        return (
+            select(
+                literal(kind).label('kind'),
+                column.table.c.id,
+                column.label('text'),
+                (-func.bm25(literal_column(fts_name))).label('rank'),
+            )
+            .join_from(column.table, fts, column.table.c.id == fts.c.rowid)
+            .where(literal_column(fts_name).op('MATCH')(match))
+        )
+
+    return ranked('book', Book.__table__.c.title).union_all(
+        ranked('author', Author.__table__.c.name)
+    )
+
+
+@router.get('/', status_code=HTTPStatus.OK, response_model=SearchResults)
+async def search(
+    search_page: SearchPage = Depends(),
+    session: AsyncSession = Depends(get_read_session),
+):
+    terms = sanitize_string(search_page.q)
+    if not terms:
+        return {'results': []}
+
+    if session.bind.dialect.name == 'postgresql':
+        query = _postgres_search(terms)
+    else:
+        query = _sqlite_search(terms)
+
+    query = query.order_by(desc('rank')).limit(search_page.limit)
+    results = await session.execute(query)
+
+    return {'results': results.mappings().all()}
@@ -0,0 +1,27 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends
+
+from madr_api.instrumentation import InstrumentedRoute
+from madr_api.schemas import SuggestionList, SuggestPage
+from madr_api.suggest import suggestions
+from madr_api.utils import sanitize_string
+
+router = APIRouter(
+    prefix='/suggest', tags=['suggest'], route_class=InstrumentedRoute
+)
+
+
+@router.get('/', status_code=HTTPStatus.OK, response_model=SuggestionList)
+async def suggest(suggest_page: SuggestPage = Depends()):
+    # Keys are stored sanitized, so the prefix is normalized the same way.
+    prefix = sanitize_string(suggest_page.q)
+    if not prefix:
+        return {'suggestions': []}
+
+    matches = await suggestions.search(
+        suggest_page.kind, prefix, suggest_page.limit
+    )
+    return {
+        'suggestions': [{'id': id_, 'text': text} for text, id_ in matches]
+    }
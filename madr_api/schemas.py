@@ -1,10 +1,38 @@
-from pydantic import BaseModel, EmailStr
+from datetime import datetime
+from typing import Any, Literal
+
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from sqlalchemy import inspect
+
+from madr_api.database import settings
 
 
 class Message(BaseModel):
     message: str
 
 
+class LoadedAttributesSchema(BaseModel):
+    """Schema that only reads ORM attributes the query already loaded.
+
+    Relationships that were not eagerly loaded are treated as missing
+    instead of being lazy loaded, which is not possible under AsyncSession
+    and would otherwise cost one query per object.
+    """
+
+    @model_validator(mode='before')
+    @classmethod
+    def skip_unloaded_attributes(cls, data):
+        state = inspect(data, raiseerr=False)
+        if state is None or not hasattr(state, 'unloaded'):
+            return data
+
+        return {
+            name: getattr(data, name)
+            for name in cls.model_fields
+            if name not in state.unloaded and hasattr(data, name)
+        }
+
+
 class UserAccountSchema(BaseModel):
     username: str
     email: EmailStr
@@ -19,11 +47,26 @@ class UserAccountPublic(BaseModel):
 
 class UserAccountList(BaseModel):
     accounts: list[UserAccountPublic]
+    next_cursor: str | None = None
+    total: int | None = None
 
 
 class FilterPage(BaseModel):
     offset: int = 0
-    limit: int = 100
+    limit: int = Field(100, ge=1, le=settings.MAX_PAGE_SIZE)
+    cursor: str | None = None
+    sort: Literal['id'] = 'id'
+    count: Literal['exact', 'estimate'] | None = None
+    # Comma separated item fields to return, e.g. `id,title`.
+    fields: str | None = None
+
+
+class AccountsFilterPage(FilterPage):
+    sort: Literal['id', 'username'] = 'id'
+
+
+class ExportParams(BaseModel):
+    format: Literal['ndjson', 'csv'] = 'ndjson'
 
 
 class Token(BaseModel):
@@ -40,12 +83,15 @@ class AuthorPublic(BaseModel):
     name: str
 
 
-class AuthorList(BaseModel):
-    authors: list[AuthorPublic]
+class AuthorExpand(BaseModel):
+    expand: Literal['books'] | None = None
+    books_offset: int = 0
+    books_limit: int = Field(10, ge=1, le=settings.MAX_PAGE_SIZE)
 
 
-class AuthorsFilterPage(FilterPage):
+class AuthorsFilterPage(FilterPage, AuthorExpand):
     name: str = ''
+    sort: Literal['id', 'name'] = 'id'
 
 
 class BookSchema(BaseModel):
@@ -58,6 +104,24 @@ class BookPublic(BookSchema):
     id: int
 
 
+class BookWithAuthor(BookPublic, LoadedAttributesSchema):
+    author: AuthorPublic | None = None
+
+
+class AuthorWithBooks(AuthorPublic, LoadedAttributesSchema):
+    books: list[BookPublic] | None = None
+
+
+class AuthorList(BaseModel):
+    authors: list[AuthorWithBooks]
+    next_cursor: str | None = None
+    total: int | None = None
+
+
+class BookExpand(BaseModel):
+    expand: Literal['author'] | None = None
+
+
 class BookUpdate(BaseModel):
     title: str | None = None
     year: int | None = None
@@ -65,9 +129,135 @@ class BookUpdate(BaseModel):
 
 
 class BookList(BaseModel):
-    books: list[BookPublic]
+    books: list[BookWithAuthor]
+    next_cursor: str | None = None
+    total: int | None = None
 
 
-class BooksFilterPage(FilterPage):
+class BooksFilterPage(FilterPage, BookExpand):
     title: str | None = None
     year: int | None = None
+    sort: Literal['id', 'title', 'year'] = 'id'
+
+
+class PoolStatus(BaseModel):
+    size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    max_overflow: int
+    checkouts: int
+    timeouts: int
+    average_wait: float
+    max_wait: float
+
+
+class SearchPage(BaseModel):
+    q: str
+    limit: int = Field(20, ge=1, le=settings.MAX_PAGE_SIZE)
+
+
+class SearchResult(BaseModel):
+    kind: Literal['book', 'author']
+    id: int
+    text: str
+    rank: float
+
+
+class SearchResults(BaseModel):
+    results: list[SearchResult]
+
+
+class SuggestPage(BaseModel):
+    q: str
+    kind: Literal['books', 'authors'] = 'books'
+    limit: int = Field(10, ge=1, le=settings.MAX_PAGE_SIZE)
+
+
+class Suggestion(BaseModel):
+    id: int
+    text: str
+
+
+class SuggestionList(BaseModel):
+    suggestions: list[Suggestion]
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_ratio: float
+    size: int | None = None
+    maxsize: int | None = None
+
+
+class SlowQuery(BaseModel):
+    sql: str
+    parameters: Any
+    elapsed: float
+    route: str | None
+    at: datetime
+    plan: list[str] | None
+
+
+class SlowQueryList(BaseModel):
+    threshold: float | None
+    queries: list[SlowQuery]
+
+
+class HashingStats(BaseModel):
+    workers: int
+    max_queue: int
+    in_flight: int
+    calls: int
+    rejected: int
+    average_queue_wait: float
+    max_queue_wait: float
+    average_hash_time: float
+    max_hash_time: float
+
+
+class BulkBookResult(BaseModel):
+    index: int
+    status: Literal['created', 'duplicate_title', 'missing_author', 'invalid']
+    id: int | None = None
+    detail: str | None = None
+
+
+class BulkBookReport(BaseModel):
+    created: int
+    results: list[BulkBookResult]
+
+
+class BulkBookUpdate(BookUpdate):
+    id: int
+
+
+class BulkBookChange(BaseModel):
+    id: int
+    status: Literal[
+        'updated',
+        'deleted',
+        'not_found',
+        'duplicate_id',
+        'duplicate_title',
+        'missing_author',
+    ]
+
+
+class BulkBookUpdateReport(BaseModel):
+    updated: int
+    results: list[BulkBookChange]
+
+
+class BulkBookDeleteReport(BaseModel):
+    deleted: int
+    results: list[BulkBookChange]
+
+
+class AuthorPurge(BaseModel):
+    id: str
+    author_id: int
+    status: Literal['running', 'done', 'failed']
+    total_books: int
+    deleted_books: int
@@ -1,22 +1,38 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from http import HTTPStatus
+from time import monotonic
 from zoneinfo import ZoneInfo
 
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jwt import DecodeError, ExpiredSignatureError, decode, encode
 from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
+from madr_api.cache import TTLCache
 from madr_api.database import get_session
+from madr_api.instrumentation import record_hashing
 from madr_api.models import UserAccount
+from madr_api.query_cache import query_cache
 from madr_api.settings import Settings
 
-pwd_context = PasswordHash.recommended()
-
 settings = Settings()
 
+pwd_context = PasswordHash((
+    Argon2Hasher(
+        time_cost=settings.PASSWORD_HASH_TIME_COST,
+        memory_cost=settings.PASSWORD_HASH_MEMORY_COST,
+        parallelism=settings.PASSWORD_HASH_PARALLELISM,
+    ),
+))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 
@@ -32,6 +48,81 @@ def create_access_token(data: dict) -> str:
     return encoded_jwt
 
 
+def _detached_copy(account: UserAccount) -> UserAccount:
+    copy = UserAccount(
+        username=account.username,
+        email=account.email,
+        password=account.password,
+    )
+    copy.id = account.id
+    copy.is_admin = account.is_admin
+    copy.created_at = account.created_at
+    copy.updated_at = account.updated_at
+    make_transient_to_detached(copy)
+    return copy
+
+
+class AccountCache:
+    """Resolved principals keyed by account id.
+
+    Entries are detached copies, so a request can merge one into its own
+    session without touching the database. Each entry also keeps the
+    version of its account, a tag of the query cache backend, and is only
+    served while that version is current. Handlers that change or delete
+    an account must invalidate it. With the Redis backend the versions are
+    shared, so every worker stops serving the old copy at once.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _tags(account_id: int) -> tuple[str]:
+        return (f'account:{account_id}',)
+
+    async def get(self, account_id: int) -> tuple[UserAccount | None, int]:
+        """The cached account if it is current, and the current version
+        to cache a freshly loaded one under."""
+        (version,) = await query_cache.backend.tag_versions(
+            self._tags(account_id)
+        )
+        entry = self._entries.get(account_id)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1], version
+
+        self.misses += 1
+        return None, version
+
+    def set(self, account: UserAccount, version: int):
+        self._entries.set(account.id, (version, _detached_copy(account)))
+
+    async def invalidate(self, account_id: int):
+        self._entries.invalidate(account_id)
+        await query_cache.backend.bump(self._tags(account_id))
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            **self._entries.stats(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+account_cache = AccountCache(
+    maxsize=settings.ACCOUNT_CACHE_SIZE, ttl=settings.ACCOUNT_CACHE_TTL
+)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -40,8 +131,124 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def get_current_user_account(
-    session: Session = Depends(get_session),
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Verify a password; also return a new hash when the stored one was
+    made with other Argon2 costs than the configured ones."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _timed_call(func, *args):
+    started = monotonic()
+    result = func(*args)
+    return result, started, monotonic()
+
+
+class PasswordHasherPool:
+    """Runs Argon2 work on a dedicated process pool.
+
+    At most `workers` calls run at once and at most `max_queue` more may
+    wait; anything beyond that is rejected with 503 instead of piling up.
+    With `workers=0` the calls run on the Starlette threadpool instead.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._in_flight = 0
+        self.calls = 0
+        self.rejected = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_hash_time = 0.0
+        self.max_hash_time = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    async def run(self, func, *args):
+        if self._in_flight >= max(self.workers, 1) + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail='Too many password operations, try again later',
+                headers={'Retry-After': '1'},
+            )
+
+        self._in_flight += 1
+        submitted = monotonic()
+        try:
+            if self.workers:
+                loop = asyncio.get_running_loop()
+                result, started, finished = await loop.run_in_executor(
+                    self._get_executor(), _timed_call, func, *args
+                )
+            else:
+                result, started, finished = await run_in_threadpool(
+                    _timed_call, func, *args
+                )
+        finally:
+            self._in_flight -= 1
+            record_hashing(monotonic() - submitted)
+
+        self.calls += 1
+        self.total_queue_wait += started - submitted
+        self.max_queue_wait = max(self.max_queue_wait, started - submitted)
+        self.total_hash_time += finished - started
+        self.max_hash_time = max(self.max_hash_time, finished - started)
+
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'in_flight': self._in_flight,
+            'calls': self.calls,
+            'rejected': self.rejected,
+            'average_queue_wait': (
+                self.total_queue_wait / self.calls if self.calls else 0.0
+            ),
+            'max_queue_wait': self.max_queue_wait,
+            'average_hash_time': (
+                self.total_hash_time / self.calls if self.calls else 0.0
+            ),
+            'max_hash_time': self.max_hash_time,
+        }
+
+
+password_hasher = PasswordHasherPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await password_hasher.run(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def get_current_user_account(
+    session: AsyncSession = Depends(get_session),
     token: str = Depends(oauth2_scheme),
 ):
     credentials_exception = HTTPException(
@@ -60,10 +267,31 @@ def get_current_user_account(
     except ExpiredSignatureError:
         raise credentials_exception
 
-    account = session.scalar(
+    account_id = payload.get('uid')
+    cached, version = await account_cache.get(account_id)
+    if cached is not None and cached.email == subject_email:
+        return await session.merge(cached, load=False)
+
+    account = await session.scalar(
         select(UserAccount).where(UserAccount.email == subject_email)
     )
     if not account:
         raise credentials_exception
 
+    # The version was read before the account, so a change committed in
+    # between leaves this copy already stale.
+    if account.id == account_id:
+        account_cache.set(account, version)
+
     return account
+
+
+async def get_admin_account(
+    current_account: UserAccount = Depends(get_current_user_account),
+) -> UserAccount:
+    """The authenticated account, if it may use the operator routes."""
+    if not current_account.is_admin:
+        raise HTTPException(
+            status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
+        )
+    return current_account
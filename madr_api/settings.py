@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,3 +13,106 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30.0
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = True
+    THREADPOOL_SIZE: int | None = None
+
+    DATABASE_READ_URLS: list[str] = []
+    DATABASE_REPLICA_RETRY_AFTER: float = 30.0
+    READ_YOUR_WRITES_SECONDS: float = 0.0
+
+    SLOW_QUERY_THRESHOLD: float | None = 0.5
+    SLOW_QUERY_LOG_SIZE: int = 100
+    SLOW_QUERY_EXPLAIN_SAMPLE: float = 0.0
+
+    # Changed or deleted accounts stop authenticating at once on every
+    # worker with QUERY_CACHE_BACKEND=redis. With the memory backend only
+    # the worker that made the change knows, and the others may accept
+    # the old account for up to ACCOUNT_CACHE_TTL seconds. The versions
+    # are forgotten after QUERY_CACHE_TTL, which must not be shorter.
+    ACCOUNT_CACHE_SIZE: int = 1024
+    ACCOUNT_CACHE_TTL: float = 5.0
+
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    # Argon2id costs. Stored hashes made with other costs are upgraded on
+    # the next successful login; `python -m benchmarks.calibrate_hashing`
+    # times candidates on the current hardware.
+    PASSWORD_HASH_TIME_COST: int = 3
+    PASSWORD_HASH_MEMORY_COST: int = 65536  # KiB
+    PASSWORD_HASH_PARALLELISM: int = 4
+
+    QUERY_CACHE_BACKEND: Literal['memory', 'redis'] = 'memory'
+    QUERY_CACHE_URL: str | None = None
+    QUERY_CACHE_SIZE: int = 256
+    QUERY_CACHE_TTL: float = 60.0
+
+    COUNT_CACHE_SIZE: int = 256
+    COUNT_CACHE_TTL: float = 10.0
+    COUNT_ESTIMATE_THRESHOLD: int = 10_000
+
+    # Largest `limit` a list request may ask for.
+    MAX_PAGE_SIZE: int = 500
+
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: Literal['memory', 'redis'] = 'memory'
+    RATE_LIMIT_URL: str | None = None
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    LOGIN_IP_BURST: int = 20
+    LOGIN_IP_PER_MINUTE: int = 20
+    LOGIN_USERNAME_BURST: int = 5
+    LOGIN_USERNAME_PER_MINUTE: int = 5
+    SIGNUP_IP_BURST: int = 5
+    SIGNUP_IP_PER_MINUTE: int = 5
+    WRITE_ACCOUNT_BURST: int = 60
+    WRITE_ACCOUNT_PER_MINUTE: int = 120
+
+    FAST_JSON_RESPONSES: bool = False
+
+    BULK_BATCH_SIZE: int = 1000
+    # Books deleted per transaction by a background author purge.
+    PURGE_BATCH_SIZE: int = 1000
+    # Finished purge jobs kept in the database for their progress to be read.
+    PURGE_JOBS_KEPT: int = 100
+    # A running purge not updated for this long is taken to have died with
+    # its worker, and the author may be purged again.
+    PURGE_STALE_AFTER: float = 600.0
+    EXPORT_CHUNK_SIZE: int = 1000
+    # GET /suggest answers from in-memory indexes, reloaded this often
+    # to pick up writes made by other workers (None loads them once).
+    SUGGEST_INDEX_ENABLED: bool = True
+    SUGGEST_REFRESH_SECONDS: float | None = 300.0
+
+    @model_validator(mode='after')
+    def check_pool_sizes(self):
+        if self.DATABASE_POOL_SIZE < 1:
+            raise ValueError('DATABASE_POOL_SIZE must be at least 1')
+        if self.DATABASE_MAX_OVERFLOW < 0:
+            raise ValueError('DATABASE_MAX_OVERFLOW must not be negative')
+
+        # Database access is async, so the worker threads never hold a
+        # connection: they only run password hashing when
+        # PASSWORD_HASH_WORKERS is 0 and the sync helpers of Starlette.
+        # Their number is not tied to the pool, and None keeps the AnyIO
+        # default.
+        if self.THREADPOOL_SIZE is not None and self.THREADPOOL_SIZE < 1:
+            raise ValueError('THREADPOOL_SIZE must be at least 1')
+
+        return self
+
+    @model_validator(mode='after')
+    def check_shared_backends(self):
+        if self.QUERY_CACHE_BACKEND == 'redis' and not self.QUERY_CACHE_URL:
+            raise ValueError('QUERY_CACHE_BACKEND=redis needs QUERY_CACHE_URL')
+        if self.RATE_LIMIT_BACKEND == 'redis' and not self.RATE_LIMIT_URL:
+            raise ValueError('RATE_LIMIT_BACKEND=redis needs RATE_LIMIT_URL')
+        if self.ACCOUNT_CACHE_TTL > self.QUERY_CACHE_TTL:
+            raise ValueError(
+                'ACCOUNT_CACHE_TTL must not exceed QUERY_CACHE_TTL'
+            )
+
+        return self
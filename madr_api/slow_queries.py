@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger('madr_api.slow_queries')
+
+# Only plain SELECTs: EXPLAIN ANALYZE runs the statement again, and a WITH
+# may hold a data-modifying CTE.
+EXPLAINABLE = 'SELECT'
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Types of the bound parameters, without their values."""
+    if executemany:
+        rows = list(parameters or ())
+        shape = parameter_shape(rows[0]) if rows else None
+        return {'rows': len(rows), 'shape': shape}
+    if isinstance(parameters, dict):
+        return {
+            name: type(value).__name__ for name, value in parameters.items()
+        }
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def _explain_sql(dialect: str, statement: str) -> str:
+    if dialect == 'postgresql':
+        return f'EXPLAIN (ANALYZE, BUFFERS) {statement}'
+    return f'EXPLAIN QUERY PLAN {statement}'
+
+
+def _explain(connection, statement: str, parameters) -> list[str]:
+    # A raw DBAPI cursor, so the explain bypasses the engine events and is
+    # not logged itself.
+    dialect = connection.dialect.name
+    cursor = connection.connection.cursor()
+    try:
+        if dialect == 'postgresql':
+            # ANALYZE executes the statement; whatever functions it calls
+            # must not write.
+            cursor.execute('SET TRANSACTION READ ONLY')
+        cursor.execute(_explain_sql(dialect, statement), parameters)
+        return [str(row[-1]) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    """Ring buffer of the statements slower than `threshold` seconds.
+
+    A `explain_sample` fraction of the slow SELECTs is run again under
+    EXPLAIN ANALYZE (EXPLAIN QUERY PLAN on SQLite) and the plan is kept
+    with the entry. The explains are queued and run in the background, on
+    a connection of their own, so they neither slow down the request nor
+    touch its transaction.
+    """
+
+    def __init__(
+        self, threshold: float | None, size: int, explain_sample: float
+    ):
+        self.threshold = threshold
+        self.explain_sample = explain_sample
+        self.entries: deque[dict] = deque(maxlen=size)
+        self._pending: deque[tuple] = deque(maxlen=size)
+        self._explainer: asyncio.Task | None = None
+
+    def record(  # noqa: PLR0913, PLR0917
+        self,
+        connection,
+        statement: str,
+        parameters,
+        executemany: bool,
+        elapsed: float,
+        route: str | None,
+    ):
+        if self.threshold is None or elapsed < self.threshold:
+            return
+
+        entry = {
+            'sql': statement,
+            'parameters': parameter_shape(parameters, executemany),
+            'elapsed': elapsed,
+            'route': route,
+            'at': datetime.now(tz=timezone.utc),
+            'plan': None,
+        }
+        logger.warning(json.dumps(entry, default=str))
+
+        explainable = (
+            not executemany
+            and statement.lstrip().upper().startswith(EXPLAINABLE)
+        )
+        if explainable and random.random() < self.explain_sample:
+            self._queue_explain(
+                connection.engine, entry, statement, parameters
+            )
+
+        self.entries.append(entry)
+
+    def _queue_explain(self, engine, entry: dict, statement: str, parameters):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # A sync engine used outside the event loop, as in migrations.
+            return
+
+        self._pending.append((engine, entry, statement, parameters))
+        explainer = self._explainer
+        if (
+            explainer is None
+            or explainer.done()
+            or explainer.get_loop() is not loop
+        ):
+            self._explainer = loop.create_task(self._explain_pending())
+
+    async def _explain_pending(self):
+        while self._pending:
+            engine, entry, statement, parameters = self._pending.popleft()
+            try:
+                async with AsyncEngine(engine).connect() as connection:
+                    entry['plan'] = await connection.run_sync(
+                        _explain, statement, parameters
+                    )
+            except Exception:
+                logger.exception('Could not explain slow query')
+
+    async def join(self):
+        """Wait until the queued statements are explained."""
+        if self._explainer is not None:
+            await self._explainer
+
+    async def shutdown(self):
+        self._pending.clear()
+        if self._explainer is not None:
+            self._explainer.cancel()
+            await asyncio.gather(self._explainer, return_exceptions=True)
+            self._explainer = None
+
+    def clear(self):
+        self.entries.clear()
+        self._pending.clear()
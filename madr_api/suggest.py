@@ -0,0 +1,232 @@
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from madr_api.database import settings
+from madr_api.models import Author, Book
+from madr_api.utils import sanitize_string
+
+logger = logging.getLogger('madr_api.suggest')
+
+# Sorts after every character, so `prefix + LAST_CHAR` bounds a prefix.
+LAST_CHAR = '\U0010ffff'
+# Past this many keys a change rebuilds the list in one pass instead of
+# shifting it once per key.
+BATCH_THRESHOLD = 32
+
+
+class PrefixIndex:
+    """Sorted (key, id) pairs; a prefix lookup is a bisect and a short
+    walk, without touching the database."""
+
+    def __init__(self, pairs=()):
+        self._keys: dict[int, str] = {id_: key for key, id_ in pairs}
+        self._entries = sorted((key, id_) for id_, key in self._keys.items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, pairs):
+        """Add or re-key (key, id) pairs."""
+        pairs = [
+            (key, id_) for key, id_ in pairs if self._keys.get(id_) != key
+        ]
+        self.discard(id_ for _, id_ in pairs)
+        self._keys.update((id_, key) for key, id_ in pairs)
+        if len(pairs) > BATCH_THRESHOLD:
+            # Timsort merges the sorted run and the new tail in linear time.
+            self._entries.extend(pairs)
+            self._entries.sort()
+        else:
+            for entry in pairs:
+                insort(self._entries, entry)
+
+    def discard(self, ids):
+        stale = {
+            (self._keys.pop(id_), id_) for id_ in ids if id_ in self._keys
+        }
+        if len(stale) > BATCH_THRESHOLD:
+            self._entries = [
+                entry for entry in self._entries if entry not in stale
+            ]
+        else:
+            for entry in stale:
+                del self._entries[bisect_left(self._entries, entry)]
+
+    def search(self, prefix: str, limit: int) -> list[tuple[str, int]]:
+        matches = []
+        start = bisect_left(self._entries, (prefix,))
+        for key, id_ in self._entries[start : start + limit]:
+            if not key.startswith(prefix):
+                break
+            matches.append((key, id_))
+        return matches
+
+
+def _prefix_filter(column, prefix: str, dialect: str):
+    if dialect == 'postgresql':
+        # Served by the text_pattern_ops indexes declared in models.py.
+        escaped = (
+            prefix
+            .replace('\\', '\\\\')
+            .replace('%', '\\%')
+            .replace('_', '\\_')
+        )
+        return column.like(f'{escaped}%', escape='\\')
+
+    # SQLite compares text bytewise, so the unique index serves a range.
+    return and_(column >= prefix, column < prefix + LAST_CHAR)
+
+
+class Suggestions:
+    """Type-ahead over book titles and author names.
+
+    Keys are normalized with sanitize_string, as the prefixes looked up
+    are. The indexes are read from the database in the background and then
+    kept current by the write handlers of this process. Writes made by
+    other workers show up at the next refresh, every
+    SUGGEST_REFRESH_SECONDS. Until the first load finishes, lookups fall
+    back to prefix queries on the database.
+    """
+
+    SOURCES = {'books': Book.title, 'authors': Author.name}
+
+    def __init__(self, enabled: bool, refresh_seconds: float | None):
+        self.enabled = enabled
+        self.refresh_seconds = refresh_seconds
+        self.bind: AsyncEngine | None = None
+        self._task: asyncio.Task | None = None
+        self.clear()
+
+    def clear(self):
+        self.indexes = {kind: PrefixIndex() for kind in self.SOURCES}
+        self.ready = False
+        self._book_authors: dict[int, int] = {}
+        self._books_by_author: dict[int, set[int]] = defaultdict(set)
+        self._pending: list[tuple] | None = None
+
+    async def load(self, bind: AsyncEngine):
+        """Read every key; writes made meanwhile are replayed on top."""
+        self.bind = bind
+        self._pending = []
+        try:
+            async with AsyncSession(bind) as session:
+                authors = (
+                    await session.execute(select(Author.name, Author.id))
+                ).all()
+                books = (
+                    await session.execute(
+                        select(Book.title, Book.id, Book.author_id)
+                    )
+                ).all()
+
+            self.indexes = {
+                'books': PrefixIndex(
+                    (sanitize_string(title), id_) for title, id_, _ in books
+                ),
+                'authors': PrefixIndex(
+                    (sanitize_string(name), id_) for name, id_ in authors
+                ),
+            }
+            self._book_authors = {}
+            self._books_by_author = defaultdict(set)
+            for _, book_id, author_id in books:
+                self._book_authors[book_id] = author_id
+                self._books_by_author[author_id].add(book_id)
+
+            for method, *args in self._pending:
+                getattr(self, method)(*args)
+            self.ready = True
+        finally:
+            self._pending = None
+
+    def start(self, bind: AsyncEngine):
+        """Answer from `bind`, and load the indexes from it if enabled."""
+        self.bind = bind
+        if self.enabled:
+            self._task = asyncio.create_task(self._keep_loaded(bind))
+
+    async def _keep_loaded(self, bind: AsyncEngine):
+        while True:
+            try:
+                await self.load(bind)
+            except Exception:
+                logger.exception('Could not load the suggestion indexes')
+            if self.refresh_seconds is None:
+                return
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _record(self, method: str, *args) -> bool:
+        """Queue a change while loading; tell whether to apply it now."""
+        if self._pending is not None:
+            self._pending.append((method, *args))
+        return self.ready
+
+    def put_books(self, books: list[tuple[int, str, int]]):
+        """Add or update (id, title, author_id) books."""
+        if self._record('put_books', books):
+            self.indexes['books'].put(
+                (sanitize_string(title), id_) for id_, title, _ in books
+            )
+            for book_id, _, author_id in books:
+                self._forget_author_of(book_id)
+                self._book_authors[book_id] = author_id
+                self._books_by_author[author_id].add(book_id)
+
+    def discard_books(self, book_ids: list[int]):
+        if self._record('discard_books', book_ids):
+            self.indexes['books'].discard(book_ids)
+            for book_id in book_ids:
+                self._forget_author_of(book_id)
+
+    def _forget_author_of(self, book_id: int):
+        author_id = self._book_authors.pop(book_id, None)
+        if author_id is not None:
+            self._books_by_author[author_id].discard(book_id)
+
+    def put_author(self, author_id: int, name: str):
+        if self._record('put_author', author_id, name):
+            self.indexes['authors'].put([(sanitize_string(name), author_id)])
+
+    def discard_author(self, author_id: int):
+        """Forget an author and, as the foreign key cascades, their
+        books."""
+        if self._record('discard_author', author_id):
+            self.indexes['authors'].discard([author_id])
+            book_ids = self._books_by_author.pop(author_id, set())
+            self.indexes['books'].discard(book_ids)
+            for book_id in book_ids:
+                self._book_authors.pop(book_id, None)
+
+    async def search(
+        self, kind: str, prefix: str, limit: int
+    ) -> list[tuple[str, int]]:
+        if self.ready:
+            return self.indexes[kind].search(prefix, limit)
+
+        column = self.SOURCES[kind]
+        id_column = column.class_.id
+        async with AsyncSession(self.bind) as session:
+            query = (
+                select(column, id_column)
+                .where(_prefix_filter(column, prefix, self.bind.dialect.name))
+                .order_by(column, id_column)
+                .limit(limit)
+            )
+            return [tuple(row) for row in await session.execute(query)]
+
+
+suggestions = Suggestions(
+    enabled=settings.SUGGEST_INDEX_ENABLED,
+    refresh_seconds=settings.SUGGEST_REFRESH_SECONDS,
+)
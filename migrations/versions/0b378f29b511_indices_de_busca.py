@@ -0,0 +1,39 @@
+"""Indices de busca
+
+Revision ID: 0b378f29b511
+Revises: 44139771d541
+Create Date: 2026-10-17 10:12:31.482019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b378f29b511'
+down_revision: Union[str, None] = '44139771d541'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_books_title_trgm', 'books', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_authors_name_trgm', 'authors', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_books_title_fts', 'books', [sa.text("to_tsvector('simple', title)")], unique=False, postgresql_using='gin')
+    op.create_index('ix_authors_name_fts', 'authors', [sa.text("to_tsvector('simple', name)")], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_authors_name_fts', table_name='authors')
+    op.drop_index('ix_books_title_fts', table_name='books')
+    op.drop_index('ix_authors_name_trgm', table_name='authors')
+    op.drop_index('ix_books_title_trgm', table_name='books')
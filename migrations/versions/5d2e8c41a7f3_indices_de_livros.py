@@ -0,0 +1,28 @@
+"""Indices de livros
+
+Revision ID: 5d2e8c41a7f3
+Revises: 0b378f29b511
+Create Date: 2026-10-17 14:05:12.318244
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8c41a7f3'
+down_revision: Union[str, None] = '0b378f29b511'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_books_author_id_id', 'books', ['author_id', 'id'], unique=False)
+    op.create_index('ix_books_year_id', 'books', ['year', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_year_id', table_name='books')
+    op.drop_index('ix_books_author_id_id', table_name='books')
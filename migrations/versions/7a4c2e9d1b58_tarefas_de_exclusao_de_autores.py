@@ -0,0 +1,37 @@
+"""Tarefas de exclusao de autores
+
+Revision ID: 7a4c2e9d1b58
+Revises: f2b8d4a61c07
+Create Date: 2026-10-17 18:41:09.115830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4c2e9d1b58'
+down_revision: Union[str, None] = 'f2b8d4a61c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('purge_jobs',
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('total_books', sa.Integer(), nullable=False),
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('deleted_books', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_purge_jobs_running_author', 'purge_jobs', ['author_id'], unique=True, sqlite_where=sa.text("status = 'running'"), postgresql_where=sa.text("status = 'running'"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_purge_jobs_running_author', table_name='purge_jobs', sqlite_where=sa.text("status = 'running'"), postgresql_where=sa.text("status = 'running'"))
+    op.drop_table('purge_jobs')
@@ -0,0 +1,34 @@
+"""Exclusao em cascata de livros
+
+Revision ID: 9c1f4e7b2a6d
+Revises: 5d2e8c41a7f3
+Create Date: 2026-10-17 16:20:43.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1f4e7b2a6d'
+down_revision: Union[str, None] = '5d2e8c41a7f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The initial migration left the foreign key unnamed. This convention
+# gives it PostgreSQL's default name, also when SQLite reflects it.
+naming_convention = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('books', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint('books_author_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('books_author_id_fkey', 'authors', ['author_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('books', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint('books_author_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('books_author_id_fkey', 'authors', ['author_id'], ['id'])
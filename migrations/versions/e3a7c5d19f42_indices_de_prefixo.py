@@ -0,0 +1,34 @@
+"""Indices de prefixo
+
+Revision ID: e3a7c5d19f42
+Revises: 9c1f4e7b2a6d
+Create Date: 2026-10-17 16:40:12.918273
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a7c5d19f42'
+down_revision: Union[str, None] = '9c1f4e7b2a6d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.create_index('ix_books_title_prefix', 'books', ['title'], unique=False, postgresql_ops={'title': 'text_pattern_ops'})
+    op.create_index('ix_authors_name_prefix', 'authors', ['name'], unique=False, postgresql_ops={'name': 'text_pattern_ops'})
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_authors_name_prefix', table_name='authors')
+    op.drop_index('ix_books_title_prefix', table_name='books')
@@ -0,0 +1,26 @@
+"""Contas de administrador
+
+Revision ID: f2b8d4a61c07
+Revises: e3a7c5d19f42
+Create Date: 2026-10-17 18:05:37.402516
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8d4a61c07'
+down_revision: Union[str, None] = 'e3a7c5d19f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_accounts', sa.Column('is_admin', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('user_accounts', 'is_admin')
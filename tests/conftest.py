@@ -1,43 +1,100 @@
+import re
 from contextlib import contextmanager
 from datetime import datetime
 
 import factory
+import fakeredis
 import pytest
+import pytest_asyncio
+import redis.asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import StaticPool, create_engine, event
-from sqlalchemy.orm import Session
+from sqlalchemy import StaticPool, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
 from madr_api.app import app
-from madr_api.database import get_session
+from madr_api.database import get_read_session, get_session
 from madr_api.models import Author, Book, UserAccount, table_registry
-from madr_api.security import get_password_hash
+from madr_api.pagination import count_cache
+from madr_api.query_cache import MemoryBackend, query_cache
+from madr_api.rate_limit import MemoryBucketStore, rate_limiter
+from madr_api.security import (
+    account_cache,
+    get_password_hash,
+    password_hasher,
+)
+from madr_api.suggest import suggestions
+
+
+def query_count(response) -> int:
+    """Statements the request ran, from its Server-Timing header."""
+    match = re.search(
+        r'desc="(\d+) queries"', response.headers['server-timing']
+    )
+    return int(match.group(1))
 
 
 @pytest.fixture
-def client(session):
+def client(session, monkeypatch):
     def get_session_override():
         return session
 
+    account_cache.clear()
+    count_cache.clear()
+    monkeypatch.setattr(
+        query_cache, 'backend', MemoryBackend(maxsize=256, ttl=60)
+    )
+    monkeypatch.setattr(query_cache, 'hits', 0)
+    monkeypatch.setattr(query_cache, 'misses', 0)
+    monkeypatch.setattr(
+        rate_limiter, 'store', MemoryBucketStore(max_keys=1024)
+    )
+    # Spawning hashing processes for every test is slow; the process pool
+    # itself is covered in test_security.py.
+    monkeypatch.setattr(password_hasher, 'workers', 0)
+    # Suggestions come from prefix queries on the test database unless a
+    # test loads the indexes itself.
+    monkeypatch.setattr(suggestions, 'enabled', False)
+    suggestions.clear()
+
     with TestClient(app) as client:
         app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_read_session] = get_session_override
+        monkeypatch.setattr(suggestions, 'bind', session.bind)
         yield client
 
     app.dependency_overrides.clear()
 
 
 @pytest.fixture
-def session():
-    engine = create_engine(
-        'sqlite:///:memory:',
+def redis_server(monkeypatch):
+    """In-memory Redis server shared by every client made from a URL, as
+    the workers of a deployment share theirs."""
+    server = fakeredis.FakeServer()
+
+    def from_url(url, **kwargs):
+        return fakeredis.FakeAsyncRedis(server=server, **kwargs)
+
+    monkeypatch.setattr(redis.asyncio.Redis, 'from_url', from_url)
+    return server
+
+
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine(
+        'sqlite+aiosqlite:///:memory:',
         connect_args={'check_same_thread': False},
         poolclass=StaticPool,
     )
-    table_registry.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
 
-    with Session(engine) as session:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
 
-    table_registry.metadata.drop_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
+
+    await engine.dispose()
 
 
 def bootstrap_attr(target, attr, value):
@@ -72,28 +129,43 @@ class AccountFactory(factory.Factory):
     password = factory.LazyAttribute(lambda obj: f'{obj.username}@example.com')
 
 
-@pytest.fixture
-def account(session):
+@pytest_asyncio.fixture
+async def account(session):
     password = 'testtest'
     account = AccountFactory(password=get_password_hash(password))
 
     session.add(account)
-    session.commit()
-    session.refresh(account)
+    await session.commit()
+    await session.refresh(account)
 
     account.clean_password = password
 
     return account
 
 
-@pytest.fixture
-def another_account(session):
+@pytest_asyncio.fixture
+async def another_account(session):
     password = 'testtest'
     account = AccountFactory(password=get_password_hash(password))
 
     session.add(account)
-    session.commit()
-    session.refresh(account)
+    await session.commit()
+    await session.refresh(account)
+
+    account.clean_password = password
+
+    return account
+
+
+@pytest_asyncio.fixture
+async def admin_account(session):
+    password = 'testtest'
+    account = AccountFactory(password=get_password_hash(password))
+    account.is_admin = True
+
+    session.add(account)
+    await session.commit()
+    await session.refresh(account)
 
     account.clean_password = password
 
@@ -112,6 +184,18 @@ def token(client, account):
     return response.json()['access_token']
 
 
+@pytest.fixture
+def admin_token(client, admin_account):
+    response = client.post(
+        '/auth/token',
+        data={
+            'username': admin_account.username,
+            'password': admin_account.clean_password,
+        },
+    )
+    return response.json()['access_token']
+
+
 class AuthorFactory(factory.Factory):
     class Meta:
         model = Author
@@ -119,35 +203,35 @@ class AuthorFactory(factory.Factory):
     name = factory.Sequence(lambda n: f'author{n}')
 
 
-@pytest.fixture
-def author(session):
+@pytest_asyncio.fixture
+async def author(session):
     author = AuthorFactory()
 
     session.add(author)
-    session.commit()
-    session.refresh(author)
+    await session.commit()
+    await session.refresh(author)
 
     return author
 
 
-@pytest.fixture
-def another_author(session):
+@pytest_asyncio.fixture
+async def another_author(session):
     author = AuthorFactory()
 
     session.add(author)
-    session.commit()
-    session.refresh(author)
+    await session.commit()
+    await session.refresh(author)
 
     return author
 
 
-@pytest.fixture
-def one_more_author(session):
+@pytest_asyncio.fixture
+async def one_more_author(session):
     author = AuthorFactory(name='special')
 
     session.add(author)
-    session.commit()
-    session.refresh(author)
+    await session.commit()
+    await session.refresh(author)
 
     return author
 
@@ -175,21 +259,21 @@ class BookFactory(factory.Factory):
             self.updated_at = datetime.now()
 
 
-@pytest.fixture
-def book(session, author):
+@pytest_asyncio.fixture
+async def book(session, author):
     book = BookFactory(author_id=author.id)
 
     session.add(book)
-    session.commit()
+    await session.commit()
 
     return book
 
 
-@pytest.fixture
-def another_book(session, author):
+@pytest_asyncio.fixture
+async def another_book(session, author):
     book = BookFactory(author_id=author.id)
 
     session.add(book)
-    session.commit()
+    await session.commit()
 
     return book
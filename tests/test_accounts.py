@@ -1,8 +1,12 @@
 from http import HTTPStatus
 
+import pytest
 from sqlalchemy import select
 
 from madr_api.models import UserAccount
+from madr_api.pagination import count_cache
+from madr_api.routers import accounts
+from madr_api.security import password_hasher
 
 
 # Testa se o endopoint the lita de consta retorna OK
@@ -72,6 +76,42 @@ def test_create_account_email_exists_error(client, account):
     assert response.json() == {'detail': 'Username or email already exists'}
 
 
+def test_create_account_exists_skips_hashing(client, account):
+    calls = password_hasher.calls
+
+    response = client.post(
+        '/accounts/',
+        json={
+            'username': account.username,
+            'email': account.email,
+            'password': 'test',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert password_hasher.calls == calls
+
+
+async def _always_available(*args):
+    return None
+
+
+def test_create_account_race_conflict_error(client, account, monkeypatch):
+    monkeypatch.setattr(accounts, '_ensure_available', _always_available)
+
+    response = client.post(
+        '/accounts/',
+        json={
+            'username': account.username,
+            'email': 'test@test.com',
+            'password': 'test',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {'detail': 'Username or email already exists'}
+
+
 # Testa se o endpoint de atualização de conta retorna erro se já houver o
 # usuário não estiver logado.
 def test_update_account_not_logged_error(client, account):
@@ -106,7 +146,8 @@ def test_update_account_wrong_account_error(client, another_account, token):
 
 
 # Testa se o endpoint de atualização de conta retorna OK.
-def test_update_account_ok(client, account, token, session):
+@pytest.mark.asyncio
+async def test_update_account_ok(client, account, token, session):
     response = client.put(
         f'/accounts/{account.id}',
         headers={'Authorization': f'Bearer {token}'},
@@ -124,7 +165,7 @@ def test_update_account_ok(client, account, token, session):
         'email': 'other_mail@fausto.com',
     }
 
-    db_account = session.scalar(
+    db_account = await session.scalar(
         select(UserAccount).where(UserAccount.id == account.id)
     )
 
@@ -156,6 +197,8 @@ def test_update_account_username_already_exists_error(
 def test_update_account_email_already_exists_error(
     client, account, another_account, token
 ):
+    calls = password_hasher.calls
+
     response = client.put(
         f'/accounts/{account.id}',
         headers={'Authorization': f'Bearer {token}'},
@@ -168,6 +211,25 @@ def test_update_account_email_already_exists_error(
 
     assert response.status_code == HTTPStatus.CONFLICT
     assert response.json() == {'detail': 'Username or email already exists'}
+    assert password_hasher.calls == calls
+
+
+def test_update_account_race_conflict_error(
+    client, account, another_account, token, monkeypatch
+):
+    monkeypatch.setattr(accounts, '_ensure_available', _always_available)
+
+    response = client.put(
+        f'/accounts/{account.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'username': another_account.username,
+            'email': 'test@test.com',
+            'password': 'test',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
 
 
 # Testa se o endpoint de deleção de conta retorna OK.
@@ -201,3 +263,63 @@ def test_delete_account_wrong_account_error(client, another_account, token):
 
     assert response.status_code == HTTPStatus.FORBIDDEN
     assert response.json() == {'detail': 'Not enough permissions'}
+
+
+def test_read_users_cursor_ok(client, account, another_account):
+    response = client.get('/accounts/?limit=1&sort=username')
+    cursor = response.json()['next_cursor']
+
+    response = client.get(f'/accounts/?limit=1&sort=username&cursor={cursor}')
+
+    assert response.status_code == HTTPStatus.OK
+    assert [a['id'] for a in response.json()['accounts']] == [
+        another_account.id
+    ]
+
+
+# Testa se o token deixa de valer assim que a conta é removida, mesmo com a
+# conta em cache.
+def test_deleted_account_token_rejected(client, account, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+
+    client.delete(f'/accounts/{account.id}', headers=headers)
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+# Testa se requisições autenticadas repetidas são servidas pelo cache.
+def test_authenticated_account_cache_hit(client, token, admin_token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+    client.post('/auth/refresh_token', headers=headers)
+
+    response = client.get(
+        '/metrics/cache', headers={'Authorization': f'Bearer {admin_token}'}
+    )
+
+    # The admin account is loaded once, to authorize this request.
+    expected_misses = 2
+    assert response.json()['accounts']['hits'] == 1
+    assert response.json()['accounts']['misses'] == expected_misses
+
+
+def test_read_users_exact_count_is_cached(client, account, another_account):
+    expected_total = 2
+
+    first = client.get('/accounts/?limit=1&count=exact')
+    second = client.get('/accounts/?limit=1&offset=1&count=exact')
+
+    assert first.json()['total'] == expected_total
+    assert second.json()['total'] == expected_total
+    assert count_cache.hits == 1
+
+
+def test_read_users_fields(client, account):
+    response = client.get('/accounts/?fields=id,username')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'accounts': [{'id': account.id, 'username': account.username}]
+    }
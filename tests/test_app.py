@@ -1,8 +1,10 @@
 from http import HTTPStatus
+from time import time
 
 from fastapi.testclient import TestClient
 
 from madr_api.app import app
+from madr_api.database import PRIMARY_COOKIE, settings
 
 client = TestClient(app)
 
@@ -12,3 +14,27 @@ def test_root_must_return_ok_and_hello_world(client):
 
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {'message': 'Hello, World!'}
+
+
+def test_write_pins_client_to_primary(client, token, monkeypatch):
+    monkeypatch.setattr(settings, 'READ_YOUR_WRITES_SECONDS', 5.0)
+
+    response = client.post(
+        '/authors',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'name': 'Clarice Lispector'},
+    )
+
+    assert float(response.cookies[PRIMARY_COOKIE]) > time()
+
+
+def test_reads_and_failed_writes_do_not_pin(client, token, monkeypatch):
+    monkeypatch.setattr(settings, 'READ_YOUR_WRITES_SECONDS', 5.0)
+
+    read = client.get('/authors')
+    failed_write = client.delete(
+        '/authors/1', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert PRIMARY_COOKIE not in read.cookies
+    assert PRIMARY_COOKIE not in failed_write.cookies
@@ -1,6 +1,10 @@
 from http import HTTPStatus
 
+import pytest
 from freezegun import freeze_time
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from madr_api.security import pwd_context
 
 
 def test_get_token(client, account):
@@ -86,3 +90,23 @@ def test_refresh_token_expired_error(client, account):
         )
     assert response.status_code == HTTPStatus.UNAUTHORIZED
     assert response.json() == {'detail': 'Could not validade credentials'}
+
+
+@pytest.mark.asyncio
+async def test_get_token_rehashes_outdated_password(client, session, account):
+    outdated = Argon2Hasher(time_cost=1, memory_cost=8192, parallelism=1)
+    account.password = outdated.hash(account.clean_password)
+    await session.commit()
+
+    response = client.post(
+        '/auth/token',
+        data={
+            'username': account.username,
+            'password': account.clean_password,
+        },
+    )
+
+    await session.refresh(account)
+    assert response.status_code == HTTPStatus.OK
+    assert not pwd_context.current_hasher.check_needs_rehash(account.password)
+    assert pwd_context.verify(account.clean_password, account.password)
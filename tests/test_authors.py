@@ -1,5 +1,15 @@
+import asyncio
+import time
+from datetime import datetime
 from http import HTTPStatus
 
+import pytest
+from sqlalchemy import select
+
+from madr_api.models import PurgeJob
+from madr_api.purge import AuthorPurges, author_purges
+from tests.conftest import AuthorFactory, BookFactory, query_count
+
 
 def test_crate_author_ok(client, token):
     response = client.post(
@@ -42,6 +52,28 @@ def test_delete_author_ok(client, token, author):
     assert response.json() == {'message': 'Author deleted'}
 
 
+def test_delete_author_deletes_books(client, token, author, book):
+    response = client.delete(
+        f'/authors/{author.id}', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert client.get(f'/books/{book.id}').status_code == HTTPStatus.NOT_FOUND
+
+
+def test_delete_author_single_statement(client, token, author, book):
+    # One lookup of the account behind the token and the DELETE, whose
+    # foreign key takes the books along.
+    expected_max_queries = 2
+
+    response = client.delete(
+        f'/authors/{author.id}', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert query_count(response) <= expected_max_queries
+
+
 def test_delete_author_not_logged_error(client, author):
     response = client.delete(f'/authors/{author.id}')
 
@@ -162,3 +194,322 @@ def test_read_authors_without_authors_ok(client):
 
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {'authors': []}
+
+
+def test_read_authors_cursor_by_name_ok(
+    client, author, another_author, one_more_author
+):
+    response = client.get('/authors?limit=2&sort=name')
+    first_page = response.json()
+
+    response = client.get(
+        f'/authors?limit=2&sort=name&cursor={first_page["next_cursor"]}'
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [a['name'] for a in first_page['authors']] == [
+        author.name,
+        another_author.name,
+    ]
+    assert response.json() == {
+        'authors': [{'id': one_more_author.id, 'name': one_more_author.name}]
+    }
+
+
+def test_export_authors_ndjson_ok(client, author, another_author):
+    response = client.get('/authors/export')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.text.splitlines() == [
+        f'{{"id": {a.id}, "name": "{a.name}"}}'
+        for a in (author, another_author)
+    ]
+
+
+def test_export_authors_empty_csv_ok(client):
+    response = client.get('/authors/export?format=csv')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.text.splitlines() == ['id,name']
+
+
+@pytest.mark.asyncio
+async def test_read_author_detail_expand_books_ok(client, session, author):
+    books = BookFactory.create_batch(3, author_id=author.id)
+    session.add_all(books)
+    await session.commit()
+
+    response = client.get(
+        f'/authors/{author.id}?expand=books&books_offset=1&books_limit=1'
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'id': author.id,
+        'name': author.name,
+        'books': [
+            {
+                'id': books[1].id,
+                'title': books[1].title,
+                'year': books[1].year,
+                'author_id': author.id,
+            }
+        ],
+    }
+
+
+@pytest.mark.asyncio
+async def test_read_authors_expand_books_ok(
+    client, session, author, another_author
+):
+    session.add_all(
+        BookFactory.create_batch(3, author_id=author.id)
+        + BookFactory.create_batch(1, author_id=another_author.id)
+    )
+    await session.commit()
+
+    response = client.get('/authors?expand=books&books_limit=2')
+
+    assert response.status_code == HTTPStatus.OK
+    assert [len(a['books']) for a in response.json()['authors']] == [2, 1]
+
+
+def test_read_author_detail_not_modified(client, author):
+    response = client.get(f'/authors/{author.id}')
+    etag = response.headers['etag']
+
+    response = client.get(
+        f'/authors/{author.id}', headers={'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert not response.content
+
+
+@pytest.mark.asyncio
+async def test_read_author_detail_expand_books_etag_changes(
+    client, session, author, book
+):
+    url = f'/authors/{author.id}?expand=books'
+    response = client.get(url)
+    etag = response.headers['etag']
+    assert 'last-modified' not in response.headers
+
+    await session.delete(book)
+    await session.commit()
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['books'] == []
+
+
+def test_read_authors_not_modified(client, author, token):
+    etag = client.get('/authors?expand=books').headers['etag']
+
+    response = client.get(
+        '/authors?expand=books', headers={'If-None-Match': etag}
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    client.post(
+        '/books',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'new book', 'year': 2000, 'author_id': author.id},
+    )
+
+    response = client.get(
+        '/authors?expand=books', headers={'If-None-Match': etag}
+    )
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_read_authors_exact_count(client, author, another_author):
+    expected_total = 2
+
+    response = client.get('/authors?limit=1&count=exact')
+
+    assert response.json()['total'] == expected_total
+    assert response.headers['x-total-count'] == str(expected_total)
+
+
+@pytest.mark.asyncio
+async def test_read_authors_expand_books_query_count(client, session):
+    expected_max_queries = 3
+    authors = AuthorFactory.create_batch(5)
+    session.add_all(authors)
+    await session.flush()
+    session.add_all(
+        BookFactory(author_id=author.id)
+        for author in authors
+        for _ in range(2)
+    )
+    await session.commit()
+
+    response = client.get('/authors/?expand=books')
+
+    assert len(response.json()['authors']) == len(authors)
+    assert query_count(response) <= expected_max_queries
+
+
+def test_read_authors_fields(client, author, another_author):
+    response = client.get('/authors/?fields=name')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'authors': [{'name': author.name}, {'name': another_author.name}]
+    }
+
+
+def _wait_for_purge(client, token, location):
+    for _ in range(100):
+        job = client.get(
+            location, headers={'Authorization': f'Bearer {token}'}
+        ).json()
+        if job['status'] != 'running':
+            return job
+        time.sleep(0.01)
+    raise AssertionError('purge did not finish')
+
+
+@pytest.mark.asyncio
+async def test_purge_author_ok(client, session, token, author, monkeypatch):
+    expected_books = 5
+    monkeypatch.setattr(author_purges, 'batch_size', 2)
+    session.add_all(
+        BookFactory(author_id=author.id) for _ in range(expected_books)
+    )
+    await session.commit()
+
+    response = client.post(
+        f'/authors/{author.id}/purge',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.ACCEPTED
+    assert response.json()['total_books'] == expected_books
+    job = _wait_for_purge(client, token, response.headers['location'])
+    assert job['status'] == 'done'
+    assert job['deleted_books'] == expected_books
+    response = client.get(f'/authors/{author.id}')
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert client.get('/books/').json()['books'] == []
+
+
+@pytest.mark.asyncio
+async def test_purge_author_already_running_error(
+    client, session, token, author
+):
+    session.add(PurgeJob(author_id=author.id, total_books=0))
+    await session.commit()
+
+    response = client.post(
+        f'/authors/{author.id}/purge',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {'detail': 'Author purge already running'}
+
+
+@pytest.mark.asyncio
+async def test_purge_started_by_another_worker(
+    client, session, token, author, monkeypatch
+):
+    other_worker = AuthorPurges(batch_size=2, keep=10, stale_after=600)
+
+    async def never_finishes(bind, job):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(other_worker, '_purge', never_finishes)
+    job = await other_worker.start(session, author.id, total_books=0)
+
+    response = client.get(
+        f'/authors/purges/{job.id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['status'] == 'running'
+    assert await author_purges.start(session, author.id, 0) is None
+
+    await other_worker.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_purge_cancelled_on_shutdown_fails(session, author, monkeypatch):
+    purges = AuthorPurges(batch_size=2, keep=10, stale_after=600)
+
+    async def never_finishes(bind, job):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(purges, '_purge', never_finishes)
+    job = await purges.start(session, author.id, total_books=3)
+    await asyncio.sleep(0)
+
+    await purges.shutdown()
+
+    await session.refresh(job)
+    assert job.status == 'failed'
+    assert await purges.start(session, author.id, total_books=3)
+    await purges.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_stale_purge_does_not_block(session, author, monkeypatch):
+    stale = PurgeJob(author_id=author.id, total_books=0)
+    session.add(stale)
+    await session.commit()
+    stale.updated_at = datetime(2024, 1, 1)
+    await session.commit()
+    purges = AuthorPurges(batch_size=2, keep=10, stale_after=600)
+
+    async def never_finishes(bind, job):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(purges, '_purge', never_finishes)
+    job = await purges.start(session, author.id, total_books=0)
+
+    assert job is not None
+    await session.refresh(stale)
+    assert stale.status == 'failed'
+    await purges.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_purge_keeps_recent_finished_jobs(session, author, monkeypatch):
+    expected_jobs = 2
+    purges = AuthorPurges(batch_size=2, keep=1, stale_after=600)
+    session.add_all(
+        PurgeJob(author_id=author.id, total_books=0, status='done')
+        for _ in range(3)
+    )
+    await session.commit()
+
+    async def never_finishes(bind, job):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(purges, '_purge', never_finishes)
+    await purges.start(session, author.id, total_books=0)
+
+    jobs = (await session.scalars(select(PurgeJob.status))).all()
+    assert sorted(jobs) == ['done', 'running']
+    assert len(jobs) == expected_jobs
+    await purges.shutdown()
+
+
+def test_purge_author_not_found_error(client, token):
+    response = client.post(
+        '/authors/1/purge', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Author not found'}
+
+
+def test_read_author_purge_not_found_error(client, token):
+    response = client.get(
+        '/authors/purges/unknown', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Purge not found'}
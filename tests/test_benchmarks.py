@@ -0,0 +1,58 @@
+import json
+
+from benchmarks import calibrate_hashing
+from benchmarks.__main__ import main
+from madr_api.security import password_hasher
+
+
+def test_benchmark_suite_smoke(tmp_path, monkeypatch):
+    monkeypatch.setattr(password_hasher, 'workers', 0)
+    output = tmp_path / 'results.json'
+    baseline = tmp_path / 'baseline.json'
+    args = [
+        '--authors=2',
+        '--books=10',
+        '--accounts=2',
+        '--iterations=2',
+        '--micro-iterations=2',
+        '--hash-iterations=2',
+        f'--output={output}',
+        f'--baseline={baseline}',
+    ]
+
+    assert main([*args, '--save-baseline']) == 0
+
+    results = json.loads(output.read_text(encoding='utf-8'))
+    assert set(results['endpoints']['GET /books/']) == {
+        'count',
+        'mean',
+        'p50',
+        'p95',
+        'p99',
+        'throughput',
+    }
+    assert 'argon2 hash' in results['micro']
+
+    stored = json.loads(baseline.read_text(encoding='utf-8'))
+    for stats in stored['micro'].values():
+        stats['p50'] /= 10
+    baseline.write_text(json.dumps(stored), encoding='utf-8')
+
+    assert main([*args, '--skip-endpoints']) == 1
+
+
+def test_calibrate_hashing_smoke(capsys):
+    results = calibrate_hashing.main([
+        '--time-cost=1',
+        '--memory-cost=8192',
+        '--parallelism',
+        '1',
+        '2',
+        '--rounds=1',
+    ])
+
+    expected_candidates = 2
+
+    assert len(results) == expected_candidates
+    assert all(result['median_ms'] > 0 for result in results)
+    assert 'within the 250 ms budget' in capsys.readouterr().out
@@ -1,6 +1,16 @@
+import json
 from http import HTTPStatus
+from unittest.mock import ANY
 
-from tests.conftest import BookFactory
+import pytest
+from fastapi import routing
+from sqlalchemy import delete, event
+
+from madr_api.database import settings
+from madr_api.models import Author
+from madr_api.pagination import encode_cursor
+from madr_api.query_cache import query_cache
+from tests.conftest import AuthorFactory, BookFactory, query_count
 
 
 def test_create_book_ok(client, token, author):
@@ -23,6 +33,20 @@ def test_create_book_ok(client, token, author):
     }
 
 
+def test_create_book_single_statement(client, token, author):
+    # One lookup of the account behind the token and the INSERT itself.
+    expected_max_queries = 2
+
+    response = client.post(
+        '/books',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'one trip', 'year': 2000, 'author_id': author.id},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert query_count(response) <= expected_max_queries
+
+
 def test_create_book_not_logged_error(client, author):
     response = client.post(
         '/books',
@@ -39,11 +63,14 @@ def test_create_book_not_logged_error(client, author):
     }
 
 
-def test_create_book_title_already_exists(session, client, token, author):
+@pytest.mark.asyncio
+async def test_create_book_title_already_exists(
+    session, client, token, author
+):
     test_book = BookFactory(title='test title', author_id=author.id)
 
     session.add(test_book)
-    session.commit()
+    await session.commit()
 
     response = client.post(
         '/books',
@@ -59,12 +86,9 @@ def test_create_book_title_already_exists(session, client, token, author):
     assert response.json() == {'detail': 'Book title already exists'}
 
 
-def test_create_book_author_not_found_error(session, client, token):
+def test_create_book_author_not_found_error(client, token):
     test_book = BookFactory(title='test title', author_id=1)
 
-    session.add(test_book)
-    session.commit()
-
     response = client.post(
         '/books',
         headers={'Authorization': f'Bearer {token}'},
@@ -105,17 +129,16 @@ def test_delete_book_not_found_error(client, token):
 
 
 def test_update_book_update_title_ok(client, token, book):
-    new_title = 'Modified title'
     response = client.patch(
         f'/books/{book.id}',
         headers={'Authorization': f'Bearer {token}'},
-        json={'title': new_title},
+        json={'title': '  Modified   Title '},
     )
 
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {
         'id': book.id,
-        'title': new_title,
+        'title': 'modified title',
         'year': book.year,
         'author_id': book.author_id,
     }
@@ -181,6 +204,17 @@ def test_update_book_update_author_not_found_error(client, token, book):
     assert response.json() == {'detail': 'Author not found'}
 
 
+def test_update_book_empty_update_ok(client, token, book):
+    response = client.patch(
+        f'/books/{book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['title'] == book.title
+
+
 def test_update_book_update_not_logged_error(client, book):
     new_author = 42
     response = client.patch(
@@ -223,7 +257,10 @@ def test_read_book_details_not_found_error(client):
     assert response.json() == {'detail': 'Book not found'}
 
 
-def test_fetch_books_by_title_ok(client, session, author, another_author):
+@pytest.mark.asyncio
+async def test_fetch_books_by_title_ok(
+    client, session, author, another_author
+):
     books_1 = BookFactory.create_batch(2, author_id=author.id)
     books_2 = BookFactory.create_batch(2, author_id=another_author.id)
     special_book_1 = BookFactory(title='Special 1', author_id=author.id)
@@ -233,8 +270,8 @@ def test_fetch_books_by_title_ok(client, session, author, another_author):
 
     books = books_1 + books_2 + [special_book_1, special_book_2]
 
-    session.bulk_save_objects(books)
-    session.commit()
+    session.add_all(books)
+    await session.commit()
 
     expected_books = len(books_1) + len(books_2)
 
@@ -244,7 +281,8 @@ def test_fetch_books_by_title_ok(client, session, author, another_author):
     assert len(response.json()['books']) == expected_books
 
 
-def test_fetch_books_by_year_ok(client, session, author, another_author):
+@pytest.mark.asyncio
+async def test_fetch_books_by_year_ok(client, session, author, another_author):
     books_1 = BookFactory.create_batch(2, author_id=author.id, year=2010)
     books_2 = BookFactory.create_batch(
         2, author_id=another_author.id, year=2013
@@ -256,8 +294,8 @@ def test_fetch_books_by_year_ok(client, session, author, another_author):
 
     books = books_1 + books_2 + books_3 + books_4
 
-    session.bulk_save_objects(books)
-    session.commit()
+    session.add_all(books)
+    await session.commit()
 
     expected_books = len(books_2) + len(books_3)
 
@@ -267,7 +305,8 @@ def test_fetch_books_by_year_ok(client, session, author, another_author):
     assert len(response.json()['books']) == expected_books
 
 
-def test_fetch_books_by_title_and_year_ok(
+@pytest.mark.asyncio
+async def test_fetch_books_by_title_and_year_ok(
     client, session, author, another_author
 ):
     book_1 = BookFactory(author_id=author.id, year=2010)
@@ -294,8 +333,8 @@ def test_fetch_books_by_title_and_year_ok(
         book_4,
     ]
 
-    session.bulk_save_objects(books)
-    session.commit()
+    session.add_all(books)
+    await session.commit()
 
     expected_books = 3
 
@@ -305,15 +344,512 @@ def test_fetch_books_by_title_and_year_ok(
     assert len(response.json()['books']) == expected_books
 
 
-def test_fetch_books_empty_ok(client, session, author, another_author):
+@pytest.mark.asyncio
+async def test_fetch_books_empty_ok(client, session, author, another_author):
     books = BookFactory.create_batch(
         2, author_id=author.id, year=2010
     ) + BookFactory.create_batch(2, author_id=another_author.id, year=2010)
 
-    session.bulk_save_objects(books)
-    session.commit()
+    session.add_all(books)
+    await session.commit()
 
     response = client.get('/books/?title=special&year=2013')
 
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {'books': []}
+
+
+@pytest.mark.asyncio
+async def test_fetch_books_cursor_walks_all_pages(client, session, author):
+    books = [
+        BookFactory(author_id=author.id, year=year)
+        for year in (2001, 1999, 2001, 1999, 2000)
+    ]
+    session.add_all(books)
+    await session.commit()
+
+    seen = []
+    params = {'limit': 2, 'sort': 'year'}
+    while True:
+        response = client.get('/books/', params=params)
+        assert response.status_code == HTTPStatus.OK
+        page = response.json()
+        seen.extend((b['year'], b['id']) for b in page['books'])
+        if 'next_cursor' not in page:
+            break
+        params['cursor'] = page['next_cursor']
+
+    assert seen == sorted((b.year, b.id) for b in books)
+
+
+def test_fetch_books_invalid_cursor_error(client):
+    response = client.get('/books/?cursor=not-a-cursor')
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
+@pytest.mark.parametrize(
+    ('sort', 'values'),
+    [
+        ('id', [{'a': 1}]),
+        ('id', [[1, 2]]),
+        ('id', ['x']),
+        ('id', [True]),
+        ('title', [1]),
+        ('year', [1999, 'x']),
+    ],
+)
+def test_fetch_books_cursor_value_type_error(client, sort, values):
+    cursor = encode_cursor(sort, values)
+
+    response = client.get(f'/books/?sort={sort}&cursor={cursor}')
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
+def test_fetch_books_cursor_sort_mismatch_error(client, book, another_book):
+    response = client.get('/books/?limit=1&sort=title')
+    cursor = response.json()['next_cursor']
+
+    response = client.get(f'/books/?limit=1&sort=year&cursor={cursor}')
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
+def test_create_books_bulk_json_ok(client, token, author, book):
+    response = client.post(
+        '/books/bulk',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[
+            {'title': 'Novo  Livro', 'year': 2001, 'author_id': author.id},
+            {'title': book.title, 'year': 2001, 'author_id': author.id},
+            {'title': 'outro livro', 'year': 2002, 'author_id': 42},
+            {'title': 'NOVO LIVRO', 'year': 2003, 'author_id': author.id},
+            {'title': 'sem ano', 'author_id': author.id},
+        ],
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'created': 1,
+        'results': [
+            {'index': 0, 'status': 'created', 'id': book.id + 1},
+            {'index': 1, 'status': 'duplicate_title'},
+            {'index': 2, 'status': 'missing_author'},
+            {'index': 3, 'status': 'duplicate_title'},
+            {'index': 4, 'status': 'invalid', 'detail': 'Field required'},
+        ],
+    }
+
+    response = client.get(f'/books/{book.id + 1}')
+    assert response.json()['title'] == 'novo livro'
+
+
+def test_create_books_bulk_ndjson_ok(client, token, author):
+    lines = [
+        f'{{"title": "livro {n}", "year": 2000, "author_id": {author.id}}}'
+        for n in range(3)
+    ]
+    response = client.post(
+        '/books/bulk',
+        headers={
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/x-ndjson',
+        },
+        content='\n'.join([*lines, 'not json']) + '\n',
+    )
+
+    expected_created = 3
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['created'] == expected_created
+    assert response.json()['results'][-1]['status'] == 'invalid'
+
+
+def test_create_books_bulk_author_deleted_meanwhile(
+    client, session, token, author, monkeypatch
+):
+    monkeypatch.setattr(settings, 'BULK_BATCH_SIZE', 1)
+    invalidate = query_cache.invalidate
+
+    # The author is known from the first batch, then deleted before the
+    # second one is inserted.
+    async def invalidate_and_delete_author(*tags):
+        await invalidate(*tags)
+        await session.execute(delete(Author).where(Author.id == author.id))
+        await session.commit()
+
+    monkeypatch.setattr(
+        query_cache, 'invalidate', invalidate_and_delete_author
+    )
+    response = client.post(
+        '/books/bulk',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[
+            {'title': 'primeiro', 'year': 2000, 'author_id': author.id},
+            {'title': 'segundo', 'year': 2000, 'author_id': author.id},
+        ],
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'created': 1,
+        'results': [
+            {'index': 0, 'status': 'created', 'id': ANY},
+            {'index': 1, 'status': 'missing_author'},
+        ],
+    }
+
+
+def test_create_books_bulk_not_a_list_error(client, token):
+    response = client.post(
+        '/books/bulk',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'livro', 'year': 2000, 'author_id': 1},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {
+        'detail': 'Expected a JSON array or an NDJSON stream of books'
+    }
+
+
+def test_create_books_bulk_not_logged_error(client):
+    response = client.post('/books/bulk', json=[])
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_update_books_bulk_ok(
+    client, token, another_author, book, another_book
+):
+    response = client.patch(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[
+            {'id': book.id, 'year': 2010, 'author_id': another_author.id},
+            {'id': another_book.id, 'title': book.title},
+            {'id': 42, 'year': 2010},
+            {'id': book.id, 'year': 2011},
+            {'id': another_book.id, 'author_id': 42},
+        ],
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'updated': 1,
+        'results': [
+            {'id': book.id, 'status': 'updated'},
+            {'id': another_book.id, 'status': 'duplicate_title'},
+            {'id': 42, 'status': 'not_found'},
+            {'id': book.id, 'status': 'duplicate_id'},
+            {'id': another_book.id, 'status': 'duplicate_id'},
+        ],
+    }
+
+    response = client.get(f'/books/{book.id}')
+    assert response.json() == {
+        'id': book.id,
+        'title': book.title,
+        'year': 2010,
+        'author_id': another_author.id,
+    }
+
+
+def test_update_books_bulk_missing_author(client, token, book):
+    response = client.patch(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[{'id': book.id, 'author_id': 42}],
+    )
+
+    assert response.json() == {
+        'updated': 0,
+        'results': [{'id': book.id, 'status': 'missing_author'}],
+    }
+
+
+def test_update_books_bulk_too_many_error(client, token):
+    response = client.patch(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[{'id': n} for n in range(settings.BULK_BATCH_SIZE + 1)],
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_update_books_bulk_not_logged_error(client):
+    response = client.patch('/books/', json=[])
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_delete_books_bulk_ok(client, token, book, another_book):
+    response = client.delete(
+        f'/books/?ids={book.id}&ids=42&ids={another_book.id}&ids={book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'deleted': 2,
+        'results': [
+            {'id': book.id, 'status': 'deleted'},
+            {'id': 42, 'status': 'not_found'},
+            {'id': another_book.id, 'status': 'deleted'},
+        ],
+    }
+    assert client.get('/books/').json()['books'] == []
+
+
+def test_delete_books_bulk_not_logged_error(client, book):
+    response = client.delete(f'/books/?ids={book.id}')
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_export_books_ndjson_ok(client, book, another_book):
+    response = client.get('/books/export')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {
+            'title': b.title,
+            'year': b.year,
+            'author_id': b.author_id,
+            'id': b.id,
+        }
+        for b in (book, another_book)
+    ]
+
+
+def test_export_books_csv_ok(client, book):
+    response = client.get('/books/export?format=csv')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/csv')
+    assert response.text.splitlines() == [
+        'title,year,author_id,id',
+        f'{book.title},{book.year},{book.author_id},{book.id}',
+    ]
+
+
+def test_read_book_details_expand_author_ok(client, book, author):
+    response = client.get(f'/books/{book.id}?expand=author')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['author'] == {'id': author.id, 'name': author.name}
+
+
+@pytest.mark.asyncio
+async def test_fetch_books_expand_author_ok(
+    client, session, author, another_author
+):
+    session.add_all([
+        BookFactory(author_id=author.id),
+        BookFactory(author_id=another_author.id),
+    ])
+    await session.commit()
+
+    response = client.get('/books/?expand=author')
+
+    assert response.status_code == HTTPStatus.OK
+    assert [b['author']['name'] for b in response.json()['books']] == [
+        author.name,
+        another_author.name,
+    ]
+
+
+def test_read_book_details_not_modified(client, book):
+    response = client.get(f'/books/{book.id}')
+    etag = response.headers['etag']
+
+    response = client.get(f'/books/{book.id}', headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['etag'] == etag
+    assert not response.content
+
+
+def test_read_book_details_not_modified_since(client, book):
+    response = client.get(f'/books/{book.id}')
+    last_modified = response.headers['last-modified']
+
+    response = client.get(
+        f'/books/{book.id}', headers={'If-Modified-Since': last_modified}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_read_book_details_etag_changes_on_update(client, book, token):
+    expected_year = 2001
+    etag = client.get(f'/books/{book.id}').headers['etag']
+    client.patch(
+        f'/books/{book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'year': expected_year},
+    )
+
+    response = client.get(f'/books/{book.id}', headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['etag'] != etag
+    assert response.json()['year'] == expected_year
+
+
+def test_read_book_details_etag_depends_on_expand(client, book):
+    etag = client.get(f'/books/{book.id}').headers['etag']
+
+    response = client.get(
+        f'/books/{book.id}?expand=author', headers={'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert 'author' in response.json()
+
+
+def test_fetch_books_etag_changes_with_page(client, book, token):
+    expected_books = 2
+    etag = client.get('/books/').headers['etag']
+
+    response = client.get('/books/', headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    client.post(
+        '/books',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'new book', 'year': 2000, 'author_id': book.author_id},
+    )
+
+    response = client.get('/books/', headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()['books']) == expected_books
+
+
+def test_fetch_books_fast_json_same_body(client, book, monkeypatch):
+    standard = client.get('/books/?expand=author')
+    monkeypatch.setattr(settings, 'FAST_JSON_RESPONSES', True)
+    fast = client.get('/books/?expand=author')
+
+    assert fast.status_code == HTTPStatus.OK
+    assert fast.content == standard.content
+    assert fast.headers['content-type'] == standard.headers['content-type']
+    assert fast.headers['etag'] == standard.headers['etag']
+
+
+def test_fetch_books_not_validated_twice(client, book, monkeypatch):
+    async def serialize_response(**kwargs):
+        raise AssertionError('page went through response_model again')
+
+    monkeypatch.setattr(routing, 'serialize_response', serialize_response)
+    response = client.get('/books/?expand=author')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['books'][0]['id'] == book.id
+
+
+def test_fetch_books_fields(client, session, book, monkeypatch):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(session.bind.sync_engine, 'before_cursor_execute', record)
+    response = client.get('/books/?fields=id,title')
+    event.remove(session.bind.sync_engine, 'before_cursor_execute', record)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'books': [{'id': book.id, 'title': book.title}]}
+    page_query = statements[-1]
+    assert 'books.title' in page_query
+    assert 'books.year' not in page_query
+
+    monkeypatch.setattr(settings, 'FAST_JSON_RESPONSES', True)
+    fast = client.get('/books/?fields=id,title')
+    assert fast.content == response.content
+
+
+def test_fetch_books_fields_expand_author(client, book, author):
+    response = client.get('/books/?fields=title&expand=author')
+
+    assert response.json() == {
+        'books': [
+            {
+                'title': book.title,
+                'author': {'id': author.id, 'name': author.name},
+            }
+        ]
+    }
+
+
+def test_fetch_books_fields_cursor(client, book, another_book):
+    response = client.get('/books/?fields=title&sort=year&limit=1')
+    cursor = response.json()['next_cursor']
+
+    response = client.get(f'/books/?fields=title&sort=year&cursor={cursor}')
+
+    assert response.json() == {'books': [{'title': another_book.title}]}
+
+
+def test_fetch_books_invalid_fields_error(client):
+    response = client.get('/books/?fields=id,created_at')
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid fields'}
+
+
+def test_fetch_books_limit_above_max_page_size_error(client):
+    response = client.get(f'/books/?limit={settings.MAX_PAGE_SIZE + 1}')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_fetch_books_exact_count(client, session, author):
+    expected_total = 3
+    session.add_all(
+        BookFactory.create_batch(3, author_id=author.id, year=1990)
+    )
+    session.add(BookFactory(author_id=author.id, year=2000))
+    await session.commit()
+
+    response = client.get('/books/?year=1990&limit=1&count=exact')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['total'] == expected_total
+    assert response.headers['x-total-count'] == str(expected_total)
+    assert len(response.json()['books']) == 1
+
+
+def test_fetch_books_without_count(client, book):
+    response = client.get('/books/')
+
+    assert 'total' not in response.json()
+    assert 'x-total-count' not in response.headers
+
+
+def test_fetch_books_estimated_count_falls_back_to_exact(client, book):
+    response = client.get('/books/?count=estimate')
+
+    assert response.json()['total'] == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_books_expand_author_query_count(client, session):
+    expected_max_queries = 3
+    authors = AuthorFactory.create_batch(5)
+    session.add_all(authors)
+    await session.flush()
+    session.add_all(BookFactory(author_id=author.id) for author in authors)
+    await session.commit()
+
+    response = client.get('/books/?expand=author')
+
+    assert len(response.json()['books']) == len(authors)
+    assert query_count(response) <= expected_max_queries
@@ -0,0 +1,41 @@
+from freezegun import freeze_time
+
+from madr_api.cache import TTLCache
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 'first')
+    cache.set('b', 'second')
+    cache.get('a')
+    cache.set('c', 'third')
+
+    assert cache.get('a') == 'first'
+    assert cache.get('b') is None
+    assert cache.get('c') == 'third'
+
+
+def test_cache_entries_expire():
+    cache = TTLCache(maxsize=2, ttl=60)
+
+    with freeze_time('2024-01-01 12:00:00') as frozen:
+        cache.set('a', 1)
+        frozen.tick(59)
+        assert cache.get('a') == 1
+        frozen.tick(2)
+        assert cache.get('a') is None
+
+
+def test_cache_stats():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('b')
+
+    assert cache.stats() == {
+        'hits': 1,
+        'misses': 1,
+        'hit_ratio': 0.5,
+        'size': 1,
+        'maxsize': 2,
+    }
@@ -0,0 +1,83 @@
+from datetime import datetime
+from http import HTTPStatus
+
+from fastapi import Response
+from starlette.requests import Request
+
+from madr_api.conditional import conditional_response, http_date, make_etag
+
+
+def _request(**headers):
+    return Request({
+        'type': 'http',
+        'headers': [
+            (name.replace('_', '-').encode(), value.encode())
+            for name, value in headers.items()
+        ],
+    })
+
+
+def test_conditional_response_sets_validators():
+    response = Response()
+    last_modified = datetime(2024, 1, 1, 12, 0, 0)
+
+    assert (
+        conditional_response(_request(), response, '"v1"', last_modified)
+        is None
+    )
+    assert response.headers['etag'] == '"v1"'
+    assert response.headers['last-modified'] == (
+        'Mon, 01 Jan 2024 12:00:00 GMT'
+    )
+
+
+def test_conditional_response_matches_any_listed_etag():
+    request = _request(if_none_match='"v0", W/"v1"')
+
+    response = conditional_response(request, Response(), '"v1"')
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_conditional_response_if_none_match_takes_precedence():
+    last_modified = datetime(2024, 1, 1, 12, 0, 0)
+    request = _request(
+        if_none_match='"v0"', if_modified_since=http_date(last_modified)
+    )
+
+    assert (
+        conditional_response(request, Response(), '"v1"', last_modified)
+        is None
+    )
+
+
+def test_conditional_response_modified_since():
+    request = _request(if_modified_since='Mon, 01 Jan 2024 12:00:00 GMT')
+
+    assert (
+        conditional_response(
+            request, Response(), '"v1"', datetime(2024, 1, 1, 12, 0, 1)
+        )
+        is None
+    )
+    response = conditional_response(
+        request, Response(), '"v1"', datetime(2024, 1, 1, 12, 0, 0, 500)
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_conditional_response_ignores_invalid_dates():
+    request = _request(if_modified_since='yesterday')
+
+    assert (
+        conditional_response(
+            request, Response(), '"v1"', datetime(2024, 1, 1, 12, 0, 0)
+        )
+        is None
+    )
+
+
+def test_make_etag_is_strong_and_stable():
+    assert make_etag(1, 'a') == make_etag(1, 'a')
+    assert make_etag(1, 'a') != make_etag(1, 'b')
+    assert make_etag(1).startswith('"')
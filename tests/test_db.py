@@ -1,22 +1,35 @@
 from dataclasses import asdict
+from time import time
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.requests import Request
 
-from madr_api.database import engine, get_session
+from madr_api import database
+from madr_api.database import (
+    PRIMARY_COOKIE,
+    ReplicaSet,
+    TimedQueuePool,
+    engine,
+    get_pool_status,
+    get_read_session,
+    get_session,
+)
 from madr_api.models import UserAccount
 
 
-def test_create_user_account(session, mock_db_time):
+@pytest.mark.asyncio
+async def test_create_user_account(session, mock_db_time):
     with mock_db_time(model=UserAccount) as time:
         new_account = UserAccount(
             username='fausto', email='fausto@fausto.com', password='secret'
         )
 
         session.add(new_account)
-        session.commit()
+        await session.commit()
 
-    account = session.scalar(
+    account = await session.scalar(
         select(UserAccount).where(UserAccount.username == 'fausto')
     )
 
@@ -25,13 +38,95 @@ def test_create_user_account(session, mock_db_time):
         'username': 'fausto',
         'email': 'fausto@fausto.com',
         'password': 'secret',
+        'is_admin': False,
         'created_at': time,
         'updated_at': time,
     }
 
 
-def test_get_session():
-    session = next(get_session())
+@pytest.mark.asyncio
+async def test_get_session():
+    async for session in get_session():
+        assert isinstance(session, AsyncSession)
+        assert session.bind == engine
 
-    assert isinstance(session, Session)
-    assert session.bind == engine
+
+@pytest.mark.asyncio
+async def test_timed_pool_records_checkouts(tmp_path):
+    pool_engine = create_async_engine(
+        f'sqlite+aiosqlite:///{tmp_path / "pool.db"}',
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+    )
+
+    async with pool_engine.connect() as conn:
+        await conn.execute(text('select 1'))
+        status = get_pool_status(pool_engine.pool)
+
+    await pool_engine.dispose()
+
+    assert status['checked_out'] == 1
+    assert status['checkouts'] == 1
+    assert status['timeouts'] == 0
+
+
+def _request(cookie: str = ''):
+    return Request({
+        'type': 'http',
+        'headers': [(b'cookie', cookie.encode())] if cookie else [],
+    })
+
+
+def test_replica_set_round_robin_skips_down_replicas():
+    first, second = object(), object()
+    replicas = ReplicaSet([first, second], retry_after=30)
+
+    assert replicas.candidates() == [first, second]
+    assert replicas.candidates() == [second, first]
+
+    replicas.mark_down(first)
+
+    assert replicas.candidates() == [second]
+    assert replicas.candidates() == [second]
+
+
+@pytest.mark.asyncio
+async def test_get_read_session_skips_unreachable_replica(
+    tmp_path, monkeypatch
+):
+    unreachable = create_async_engine(
+        f'sqlite+aiosqlite:///{tmp_path / "missing" / "replica.db"}'
+    )
+    healthy = create_async_engine(
+        f'sqlite+aiosqlite:///{tmp_path / "replica.db"}'
+    )
+    replicas = ReplicaSet([unreachable, healthy], retry_after=30)
+    monkeypatch.setattr(database, 'read_replicas', replicas)
+
+    async for session in get_read_session(_request()):
+        assert session.bind == healthy
+
+    assert replicas.candidates() == [healthy]
+    await replicas.dispose()
+
+
+@pytest.mark.asyncio
+async def test_get_read_session_pinned_to_primary(tmp_path, monkeypatch):
+    primary = create_async_engine(
+        f'sqlite+aiosqlite:///{tmp_path / "primary.db"}'
+    )
+    replica = create_async_engine(
+        f'sqlite+aiosqlite:///{tmp_path / "replica.db"}'
+    )
+    monkeypatch.setattr(database, 'engine', primary)
+    monkeypatch.setattr(
+        database, 'read_replicas', ReplicaSet([replica], retry_after=30)
+    )
+    request = _request(f'{PRIMARY_COOKIE}={time() + 5}')
+
+    async for session in get_read_session(request):
+        assert session.bind == primary
+
+    await primary.dispose()
+    await replica.dispose()
@@ -0,0 +1,54 @@
+import json
+import logging
+
+import pytest
+from sqlalchemy import select, text
+
+from madr_api.instrumentation import track_timings
+from madr_api.models import UserAccount
+from madr_api.security import get_password_hash_async, password_hasher
+
+
+@pytest.mark.asyncio
+async def test_track_timings_counts_queries(session):
+    expected_queries = 2
+
+    with track_timings() as timings:
+        await session.execute(text('select 1'))
+        await session.scalar(select(UserAccount))
+
+    await session.execute(text('select 1'))
+
+    assert timings.queries == expected_queries
+    assert timings.db > 0
+
+
+@pytest.mark.asyncio
+async def test_track_timings_records_hashing(monkeypatch):
+    monkeypatch.setattr(password_hasher, 'workers', 0)
+
+    with track_timings() as timings:
+        await get_password_hash_async('secret')
+
+    assert timings.hashing > 0
+    assert timings.queries == 0
+
+
+def test_server_timing_header_and_log(client, token, caplog):
+    with caplog.at_level(logging.INFO, logger='madr_api.timing'):
+        response = client.post(
+            '/authors',
+            headers={'Authorization': f'Bearer {token}'},
+            json={'name': 'Clarice Lispector'},
+        )
+
+    metrics = {
+        metric.split(';')[0]
+        for metric in response.headers['server-timing'].split(', ')
+    }
+    assert metrics == {'db', 'hash', 'serialize', 'total'}
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line['path'] == '/authors/'
+    assert line['status'] == response.status_code
+    assert line['queries'] >= 1
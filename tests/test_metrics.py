@@ -0,0 +1,42 @@
+from http import HTTPStatus
+
+import pytest
+
+
+def test_read_pool_status_ok(client, admin_token):
+    response = client.get(
+        '/metrics/pool', headers={'Authorization': f'Bearer {admin_token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert set(response.json()) == {
+        'size',
+        'checked_out',
+        'idle',
+        'overflow',
+        'max_overflow',
+        'checkouts',
+        'timeouts',
+        'average_wait',
+        'max_wait',
+    }
+
+
+def test_read_hashing_stats_ok(client, admin_token):
+    response = client.get(
+        '/metrics/hashing', headers={'Authorization': f'Bearer {admin_token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['calls'] >= 1
+    assert response.json()['rejected'] == 0
+
+
+@pytest.mark.parametrize('path', ['/pool', '/cache', '/hashing'])
+def test_metrics_require_admin(client, token, path):
+    response = client.get(
+        f'/metrics{path}', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    assert response.json() == {'detail': 'Not enough permissions'}
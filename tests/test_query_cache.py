@@ -0,0 +1,237 @@
+from http import HTTPStatus
+
+import fakeredis
+import pytest
+from fastapi import Request
+from freezegun import freeze_time
+from sqlalchemy import StaticPool
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from madr_api.app import app
+from madr_api.database import get_read_session, pinned_to_primary, settings
+from madr_api.models import Author, Book, table_registry
+from madr_api.query_cache import (
+    MemoryBackend,
+    QueryCache,
+    RedisBackend,
+    query_cache,
+)
+
+
+@pytest.mark.asyncio
+async def test_query_cache_invalidate_by_tag():
+    expected_hit_ratio = 0.5
+    cache = QueryCache(MemoryBackend(maxsize=8, ttl=60))
+    books_key = await cache.key('books', {'offset': 0}, ('books',))
+    authors_key = await cache.key('authors', {'offset': 0}, ('authors',))
+    await cache.set(books_key, 'books page')
+    await cache.set(authors_key, 'authors page')
+
+    await cache.invalidate('books')
+
+    books_key = await cache.key('books', {'offset': 0}, ('books',))
+    assert await cache.get(books_key) is None
+    assert await cache.get(authors_key) == 'authors page'
+    assert cache.stats()['hit_ratio'] == expected_hit_ratio
+
+
+@pytest.mark.asyncio
+async def test_query_cache_key_ignores_param_order():
+    cache = QueryCache(MemoryBackend(maxsize=8, ttl=60))
+
+    assert await cache.key('books', {'a': 1, 'b': 2}, ()) == await cache.key(
+        'books', {'b': 2, 'a': 1}, ()
+    )
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_forgets_expired_tags():
+    backend = MemoryBackend(maxsize=8, ttl=60)
+
+    with freeze_time('2024-01-01 12:00:00') as frozen:
+        await backend.bump(('account:1',))
+        versions = await backend.tag_versions(('account:1',))
+        frozen.tick(61)
+        await backend.bump(('account:2',))
+
+        assert list(backend._tags) == ['account:2']
+        assert await backend.tag_versions(('account:1',)) == [0]
+        assert await backend.bumped_at(('account:1',)) == 0
+
+        await backend.bump(('account:1',))
+
+        assert await backend.tag_versions(('account:1',)) not in (
+            [0],
+            versions,
+        )
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_shared_by_workers(redis_server):
+    expected_ttl = 60
+    worker = QueryCache(RedisBackend('redis://cache', ttl=expected_ttl))
+    other_worker = QueryCache(RedisBackend('redis://cache', ttl=expected_ttl))
+    key = await worker.key('books', {'offset': 0}, ('books',))
+    await worker.set(key, {'books': []}, ('books',))
+
+    assert await other_worker.get(key) == {'books': []}
+    assert await other_worker.key('books', {'offset': 0}, ('books',)) == key
+
+    await other_worker.invalidate('books')
+
+    assert await worker.key('books', {'offset': 0}, ('books',)) != key
+    assert await worker.backend.bumped_at(('books', 'authors')) > 0
+    assert await worker.backend.bumped_at(('authors',)) == 0
+    server = fakeredis.FakeAsyncRedis(server=redis_server)
+    assert 0 < await server.ttl(f'madr:query:{key}') <= expected_ttl
+    assert 0 < await server.ttl('madr:query:tag:books') <= expected_ttl
+
+
+def test_redis_backend_invalidates_cached_page(
+    client, book, token, redis_server, monkeypatch
+):
+    monkeypatch.setattr(
+        query_cache, 'backend', RedisBackend('redis://cache', ttl=60)
+    )
+    title = book.title
+    client.get('/books/')
+    cached = client.get('/books/')
+
+    client.patch(
+        f'/books/{book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'renamed'},
+    )
+    response = client.get('/books/')
+
+    assert cached.json()['books'][0]['title'] == title
+    assert response.json()['books'][0]['title'] == 'renamed'
+    assert query_cache.hits == 1
+
+
+def test_fetch_books_served_from_cache(client, book):
+    first = client.get('/books/?limit=10')
+    second = client.get('/books/?limit=10')
+
+    assert second.status_code == HTTPStatus.OK
+    assert second.json() == first.json()
+    assert second.headers['etag'] == first.headers['etag']
+    assert query_cache.hits == 1
+    assert query_cache.misses == 1
+
+
+def test_update_book_invalidates_cached_pages(client, book, token):
+    client.get('/books/')
+    client.get('/authors?expand=books')
+    client.patch(
+        f'/books/{book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'renamed'},
+    )
+
+    books = client.get('/books/').json()['books']
+    authors = client.get('/authors?expand=books').json()['authors']
+
+    assert books[0]['title'] == 'renamed'
+    assert authors[0]['books'][0]['title'] == 'renamed'
+    assert query_cache.hits == 0
+
+
+def test_delete_author_invalidates_cached_books(client, book, token):
+    client.get('/books/')
+    client.delete(
+        f'/authors/{book.author_id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert client.get('/books/').json()['books'] == []
+
+
+def test_read_cache_stats_includes_queries(client, book, admin_token):
+    client.get('/books/')
+    client.get('/books/')
+
+    response = client.get(
+        '/metrics/cache', headers={'Authorization': f'Bearer {admin_token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['queries'] == {
+        'hits': 1,
+        'misses': 1,
+        'hit_ratio': 0.5,
+        'size': 1,
+        'maxsize': 256,
+    }
+
+
+@pytest.mark.asyncio
+async def test_lagging_replica_keeps_read_your_writes(
+    client, session, token, book, monkeypatch
+):
+    monkeypatch.setattr(settings, 'READ_YOUR_WRITES_SECONDS', 5.0)
+    old_title = book.title
+    # A replica that never catches up with the primary.
+    replica = create_async_engine(
+        'sqlite+aiosqlite:///:memory:',
+        connect_args={'check_same_thread': False},
+        poolclass=StaticPool,
+    )
+    async with replica.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+    async with AsyncSession(replica) as replica_session:
+        author = Author(name='replicated author')
+        replica_session.add(author)
+        await replica_session.flush()
+        replica_session.add(
+            Book(title=old_title, year=book.year, author_id=author.id)
+        )
+        await replica_session.commit()
+
+    async def read_session_override(request: Request):
+        if pinned_to_primary(request):
+            yield session
+            return
+        async with AsyncSession(
+            replica, info={'replica': True}
+        ) as replica_session:
+            yield replica_session
+
+    app.dependency_overrides[get_read_session] = read_session_override
+
+    client.patch(
+        f'/books/{book.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'renamed'},
+    )
+    writer_cookies = dict(client.cookies)
+    client.cookies.clear()
+    other_client_read = client.get('/books/')
+    client.cookies.update(writer_cookies)
+    writer_read = client.get('/books/')
+    client.cookies.clear()
+    later_read = client.get('/books/')
+
+    await replica.dispose()
+
+    assert other_client_read.json()['books'][0]['title'] == old_title
+    assert writer_read.json()['books'][0]['title'] == 'renamed'
+    # Only the page read from the primary was stored.
+    assert later_read.json()['books'][0]['title'] == 'renamed'
+    assert query_cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_query_cache_skips_replica_results_after_invalidation(
+    monkeypatch,
+):
+    monkeypatch.setattr(settings, 'READ_YOUR_WRITES_SECONDS', 5.0)
+    cache = QueryCache(MemoryBackend(maxsize=8, ttl=60))
+    await cache.invalidate('books')
+    key = await cache.key('books', {}, ('books',))
+
+    await cache.set(key, 'replica page', ('books',), from_replica=True)
+    assert await cache.get(key) is None
+
+    await cache.set(key, 'primary page', ('books',))
+    assert await cache.get(key) == 'primary page'
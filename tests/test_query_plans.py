@@ -0,0 +1,243 @@
+import itertools
+import json
+import re
+from typing import Literal, get_args, get_origin
+
+import pytest
+import pytest_asyncio
+from fastapi.routing import APIRoute
+from sqlalchemy import event, func, select
+
+from madr_api.app import app
+from madr_api.models import Author, Book, UserAccount
+from madr_api.schemas import AuthorExpand, BookExpand, FilterPage
+from tests.conftest import AccountFactory, AuthorFactory, BookFactory
+
+# Tables holding more rows than this must be read through an index.
+SEQ_SCAN_THRESHOLD = 100
+
+SEEDED_AUTHORS = 150
+BOOKS_PER_AUTHOR = 2
+SEEDED_ACCOUNTS = 120
+PAGE_SIZE = 5
+
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+# A bare SCAN reads the table itself; SCAN ... USING INDEX walks an index.
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+
+# A value for every filter of the list routes. A new filter must be given
+# one here before the guard passes.
+FILTER_VALUES = {'title': 'title1', 'year': 1999, 'name': 'author1'}
+
+# Sequential scans of large tables that are accepted, and why. A scan of
+# `table` is accepted when the statement, with its whitespace collapsed,
+# matches a pattern with {table} replaced by the table name.
+ACCEPTED_SEQ_SCANS = {
+    r'^SELECT count\(\*\) AS count_1 FROM \(SELECT [\w., ]+ FROM {table}\) ': (
+        'an unfiltered count=exact reads every row; count=estimate asks '
+        'the PostgreSQL planner instead'
+    ),
+    r"\b{table}\.(title|name) LIKE '%' \|\| \? \|\| '%'": (
+        "SQLite has no index for LIKE '%...%'; PostgreSQL reads the "
+        'trigram indexes'
+    ),
+    r'\bFROM {table} ORDER BY {table}\.id LIMIT \? OFFSET \?': (
+        'unfiltered offset pages in id order walk the primary key and stop '
+        'after offset + limit rows; deep pages are meant to use the cursor'
+    ),
+}
+
+
+@pytest_asyncio.fixture
+async def catalog(session):
+    authors = AuthorFactory.create_batch(SEEDED_AUTHORS)
+    session.add_all(authors)
+    session.add_all(AccountFactory.create_batch(SEEDED_ACCOUNTS))
+    await session.flush()
+    session.add_all(
+        BookFactory(author_id=author.id)
+        for author in authors
+        for _ in range(BOOKS_PER_AUTHOR)
+    )
+    await session.commit()
+
+    return authors
+
+
+@pytest.fixture
+def recorded_statements(session):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith(EXPLAINABLE):
+            statements.append((statement, parameters))
+
+    sync_engine = session.bind.sync_engine
+    event.listen(sync_engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(sync_engine, 'before_cursor_execute', record)
+
+
+def _postgres_seq_scans(plan: dict):
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name']
+    for child in plan.get('Plans', ()):
+        yield from _postgres_seq_scans(child)
+
+
+async def sequential_scans(session, statement: str, parameters) -> set[str]:
+    """Tables that the database plans to read without an index."""
+    connection = await session.connection()
+    if connection.dialect.name == 'postgresql':
+        # The seeded tables are small enough for the planner to prefer a
+        # Seq Scan anyway; with it disabled one only shows up when no index
+        # can serve the statement.
+        await connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        result = await connection.exec_driver_sql(
+            f'EXPLAIN (FORMAT JSON) {statement}', parameters
+        )
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return set(_postgres_seq_scans(plan[0]['Plan']))
+
+    result = await connection.exec_driver_sql(
+        f'EXPLAIN QUERY PLAN {statement}', parameters
+    )
+    return {
+        match.group(1)
+        for *_, detail in result
+        if (match := SQLITE_SCAN.match(detail))
+    }
+
+
+async def large_tables(session) -> set[str]:
+    tables = set()
+    for model in (Author, Book, UserAccount):
+        rows = await session.scalar(select(func.count()).select_from(model))
+        if rows > SEQ_SCAN_THRESHOLD:
+            tables.add(model.__tablename__)
+    return tables
+
+
+def _accepted(statement: str, table: str) -> bool:
+    statement = ' '.join(statement.split())
+    return any(
+        re.search(pattern.replace('{table}', table), statement)
+        for pattern in ACCEPTED_SEQ_SCANS
+    )
+
+
+def _choices(filter_page, name: str) -> list:
+    """Every value of a Literal (or optional Literal) query parameter."""
+    annotation = filter_page.model_fields[name].annotation
+    choices = []
+    for arg in (annotation, *get_args(annotation)):
+        if get_origin(arg) is Literal:
+            choices.extend(get_args(arg))
+        elif arg is type(None):
+            choices.append(None)
+    return choices
+
+
+def list_routes():
+    """The GET routes paged by a FilterPage, with its class."""
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or 'GET' not in route.methods:
+            continue
+        for dependency in route.dependant.dependencies:
+            if isinstance(dependency.call, type) and issubclass(
+                dependency.call, FilterPage
+            ):
+                yield route.path, dependency.call
+
+
+def list_variants(filter_page) -> list[dict]:
+    """Query parameters for every combination of the sort, count and expand
+    options, each filter alone and sparse fields."""
+    options = [
+        name
+        for name in filter_page.model_fields
+        if name != 'fields' and _choices(filter_page, name)
+    ]
+    filters = (
+        filter_page.model_fields.keys()
+        - FilterPage.model_fields.keys()
+        - AuthorExpand.model_fields.keys()
+        - BookExpand.model_fields.keys()
+    )
+    assert filters <= FILTER_VALUES.keys()
+
+    variants = []
+    for values in itertools.product(
+        *(_choices(filter_page, name) for name in options),
+        [None, *sorted(filters)],
+        [None, 'id'],
+    ):
+        *option_values, filter_name, fields = values
+        params = dict(zip(options, option_values)) | {'limit': PAGE_SIZE}
+        if filter_name:
+            params[filter_name] = FILTER_VALUES[filter_name]
+        params['fields'] = fields
+        variants.append({
+            name: value for name, value in params.items() if value is not None
+        })
+
+    return variants
+
+
+@pytest.mark.asyncio
+async def test_catalog_queries_use_indexes(
+    client, session, catalog, token, recorded_statements
+):
+    author = catalog[SEEDED_AUTHORS // 2]
+    book = await session.scalar(
+        select(Book).where(Book.author_id == author.id).limit(1)
+    )
+    auth = {'Authorization': f'Bearer {token}'}
+
+    tables = await large_tables(session)
+    assert tables == {'authors', 'books', 'user_accounts'}
+
+    routes = dict(list_routes())
+    assert routes.keys() == {'/accounts/', '/authors/', '/books/'}
+
+    recorded_statements.clear()
+    for path, filter_page in routes.items():
+        for params in list_variants(filter_page):
+            response = client.get(path, params=params, headers=auth)
+            assert response.is_success, (path, params)
+
+            # The next page, through the cursor.
+            if cursor := response.json().get('next_cursor'):
+                response = client.get(
+                    path, params=params | {'cursor': cursor}, headers=auth
+                )
+                assert response.is_success, (path, params)
+
+    requests = [
+        ('GET', f'/books/{book.id}?expand=author'),
+        ('GET', f'/authors/{author.id}?expand=books&books_limit=2'),
+        ('DELETE', f'/authors/{author.id}'),
+    ]
+    for method, url in requests:
+        response = client.request(method, url, headers=auth)
+        assert response.is_success, url
+
+    # Distinct statements only; the plans do not depend on the values.
+    statements = dict(reversed(recorded_statements))
+    recorded_statements.clear()
+    assert statements
+
+    offenders = []
+    for statement, parameters in statements.items():
+        scans = await sequential_scans(session, statement, parameters)
+        rejected = sorted(
+            table
+            for table in scans & tables
+            if not _accepted(statement, table)
+        )
+        if rejected:
+            offenders.append((statement, rejected))
+
+    assert not offenders
@@ -0,0 +1,154 @@
+from http import HTTPStatus
+
+import fakeredis
+import pytest
+from freezegun import freeze_time
+
+from madr_api.database import settings
+from madr_api.rate_limit import (
+    MemoryBucketStore,
+    RedisBucketStore,
+    rate_limiter,
+)
+from madr_api.security import password_hasher
+
+
+@pytest.mark.asyncio
+async def test_memory_bucket_refills_over_time():
+    store = MemoryBucketStore(max_keys=8)
+
+    with freeze_time('2024-01-01 12:00:00') as frozen:
+        assert await store.take('key', capacity=2, rate=1) == 0
+        assert await store.take('key', capacity=2, rate=1) == 0
+        assert await store.take('key', capacity=2, rate=1) == 1
+        frozen.tick(1)
+        assert await store.take('key', capacity=2, rate=1) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_bucket_store_is_bounded():
+    store = MemoryBucketStore(max_keys=2)
+
+    for key in ('a', 'b', 'c'):
+        await store.take(key, capacity=1, rate=1)
+
+    assert list(store._buckets) == ['b', 'c']
+
+
+@pytest.mark.asyncio
+async def test_redis_bucket_refills_over_time(redis_server):
+    expected_ttl = 3
+    half_a_token = 0.5
+    store = RedisBucketStore('redis://rate')
+    other_worker = RedisBucketStore('redis://rate')
+    server = fakeredis.FakeAsyncRedis(server=redis_server)
+
+    with freeze_time('2024-01-01 12:00:00') as frozen:
+        assert await store.take('key', capacity=2, rate=1) == 0
+        assert await other_worker.take('key', capacity=2, rate=1) == 0
+        assert await store.take('key', capacity=2, rate=1) == 1
+        frozen.tick(half_a_token)
+        assert (
+            await other_worker.take('key', capacity=2, rate=1) == half_a_token
+        )
+        frozen.tick(1)
+        assert await store.take('key', capacity=2, rate=1) == 0
+        # Gone once it would be full again, so idle keys cost nothing.
+        assert await server.ttl('madr:rate:key') == expected_ttl
+
+
+def test_redis_login_throttle_retry_after(
+    client, account, redis_server, monkeypatch
+):
+    per_minute = 5
+    monkeypatch.setattr(
+        rate_limiter, 'store', RedisBucketStore('redis://rate')
+    )
+    monkeypatch.setattr(settings, 'LOGIN_USERNAME_BURST', 2)
+    monkeypatch.setattr(settings, 'LOGIN_USERNAME_PER_MINUTE', per_minute)
+    form = {'username': account.username, 'password': 'wrong'}
+
+    statuses = [
+        client.post('/auth/token', data=form).status_code for _ in range(2)
+    ]
+    response = client.post('/auth/token', data=form)
+
+    assert statuses == [HTTPStatus.BAD_REQUEST] * 2
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert response.headers['retry-after'] == str(60 // per_minute)
+
+
+def test_login_throttled_per_username_before_hashing(
+    client, account, monkeypatch
+):
+    monkeypatch.setattr(settings, 'LOGIN_USERNAME_BURST', 2)
+    form = {'username': account.username, 'password': 'wrong'}
+    for _ in range(2):
+        client.post('/auth/token', data=form)
+    calls = password_hasher.calls
+
+    response = client.post('/auth/token', data=form)
+
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(response.headers['retry-after']) >= 1
+    assert password_hasher.calls == calls
+
+
+def test_login_throttled_per_ip(client, account, monkeypatch):
+    monkeypatch.setattr(settings, 'LOGIN_IP_BURST', 2)
+    for username in ('first', 'second'):
+        client.post(
+            '/auth/token', data={'username': username, 'password': 'x'}
+        )
+
+    response = client.post(
+        '/auth/token',
+        data={
+            'username': account.username,
+            'password': account.clean_password,
+        },
+    )
+
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+
+
+def test_signup_throttled_per_ip(client, monkeypatch):
+    monkeypatch.setattr(settings, 'SIGNUP_IP_BURST', 1)
+    statuses = [
+        client.post(
+            '/accounts/',
+            json={
+                'username': f'user{n}',
+                'email': f'user{n}@example.com',
+                'password': 'secret',
+            },
+        ).status_code
+        for n in range(2)
+    ]
+
+    assert statuses == [HTTPStatus.CREATED, HTTPStatus.TOO_MANY_REQUESTS]
+
+
+def test_writes_throttled_per_account(client, token, monkeypatch):
+    monkeypatch.setattr(settings, 'WRITE_ACCOUNT_BURST', 1)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    created = client.post('/authors', headers=headers, json={'name': 'a'})
+    throttled = client.post('/authors', headers=headers, json={'name': 'b'})
+    read = client.get('/authors')
+
+    assert created.status_code == HTTPStatus.CREATED
+    assert throttled.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert read.status_code == HTTPStatus.OK
+
+
+def test_rate_limit_disabled(client, account, monkeypatch):
+    monkeypatch.setattr(settings, 'RATE_LIMIT_ENABLED', False)
+    monkeypatch.setattr(settings, 'LOGIN_USERNAME_BURST', 1)
+    form = {'username': account.username, 'password': 'wrong'}
+
+    statuses = {
+        client.post('/auth/token', data=form).status_code for _ in range(2)
+    }
+
+    assert statuses == {HTTPStatus.BAD_REQUEST}
@@ -0,0 +1,57 @@
+from http import HTTPStatus
+
+import pytest
+
+from tests.conftest import AuthorFactory, BookFactory
+
+
+@pytest.mark.asyncio
+async def test_search_books_and_authors_ok(client, session, author):
+    poe = AuthorFactory(name='edgar allan poe')
+    session.add(poe)
+    await session.commit()
+
+    session.add_all([
+        BookFactory(title='o corvo', author_id=poe.id),
+        BookFactory(title='o corvo e outros contos', author_id=poe.id),
+        BookFactory(title='dom casmurro', author_id=author.id),
+    ])
+    await session.commit()
+
+    response = client.get('/search/?q=Corvo')
+
+    assert response.status_code == HTTPStatus.OK
+    results = response.json()['results']
+    assert [(r['kind'], r['text']) for r in results] == [
+        ('book', 'o corvo'),
+        ('book', 'o corvo e outros contos'),
+    ]
+    assert results[0]['rank'] >= results[1]['rank']
+
+    response = client.get('/search/?q=poe')
+
+    assert [
+        (r['kind'], r['id'], r['text']) for r in response.json()['results']
+    ] == [('author', poe.id, poe.name)]
+
+
+@pytest.mark.asyncio
+async def test_search_follows_updates_and_deletes(client, session, book):
+    book.title = 'renamed title'
+    await session.commit()
+
+    response = client.get('/search/?q=renamed')
+    assert [r['id'] for r in response.json()['results']] == [book.id]
+
+    await session.delete(book)
+    await session.commit()
+
+    response = client.get('/search/?q=renamed')
+    assert response.json() == {'results': []}
+
+
+def test_search_special_characters_ok(client, book):
+    response = client.get('/search/', params={'q': 'title" OR *'})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'results': []}
@@ -1,6 +1,21 @@
+import asyncio
+import time
+from http import HTTPStatus
+
+import pytest
+from fastapi import HTTPException
 from jwt import decode
 
-from madr_api.security import create_access_token, settings
+from madr_api.query_cache import MemoryBackend, query_cache
+from madr_api.security import (
+    AccountCache,
+    PasswordHasherPool,
+    create_access_token,
+    get_password_hash,
+    settings,
+    verify_and_update_password,
+    verify_password,
+)
 
 
 def test_jwt():
@@ -12,3 +27,67 @@ def test_jwt():
 
     assert decoded['test'] == data['test']
     assert 'exp' in decoded
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_process_pool():
+    hasher = PasswordHasherPool(workers=1, max_queue=1)
+    try:
+        hashed = await hasher.run(get_password_hash, 'secret')
+        valid = await hasher.run(verify_password, 'secret', hashed)
+    finally:
+        hasher.shutdown()
+
+    expected_calls = 2
+
+    assert valid
+    assert hasher.stats()['calls'] == expected_calls
+    assert hasher.stats()['max_hash_time'] > 0
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasherPool(workers=0, max_queue=0)
+    slow_hash = hasher.run(time.sleep, 0.1)
+    task = asyncio.ensure_future(slow_hash)
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as error:
+        await hasher.run(get_password_hash, 'secret')
+
+    await task
+
+    assert error.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert hasher.stats()['rejected'] == 1
+
+
+def test_verify_and_update_password_current_hash():
+    password_hash = get_password_hash('secret')
+
+    assert verify_and_update_password('secret', password_hash) == (True, None)
+
+
+def test_verify_and_update_password_wrong_password():
+    password_hash = get_password_hash('secret')
+
+    assert verify_and_update_password('wrong', password_hash) == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_account_cache_invalidation_reaches_other_workers(
+    account, monkeypatch
+):
+    # Two workers whose caches share one backend, as with Redis.
+    monkeypatch.setattr(
+        query_cache, 'backend', MemoryBackend(maxsize=8, ttl=60)
+    )
+    worker, other_worker = (AccountCache(maxsize=8, ttl=60) for _ in range(2))
+    _, version = await other_worker.get(account.id)
+    other_worker.set(account, version)
+    cached, _ = await other_worker.get(account.id)
+    assert cached.email == account.email
+
+    await worker.invalidate(account.id)
+
+    cached, _ = await other_worker.get(account.id)
+    assert cached is None
@@ -0,0 +1,35 @@
+import pytest
+from pydantic import ValidationError
+
+from madr_api.settings import Settings
+
+
+def test_threadpool_size_independent_of_pool_size():
+    settings = Settings(
+        DATABASE_POOL_SIZE=3, DATABASE_MAX_OVERFLOW=2, THREADPOOL_SIZE=40
+    )
+
+    expected_threadpool_size = 40
+
+    assert settings.THREADPOOL_SIZE == expected_threadpool_size
+    assert Settings().THREADPOOL_SIZE is None
+
+
+def test_threadpool_size_zero_error():
+    with pytest.raises(ValidationError):
+        Settings(THREADPOOL_SIZE=0)
+
+
+def test_redis_query_cache_without_url_error():
+    with pytest.raises(ValidationError):
+        Settings(QUERY_CACHE_BACKEND='redis')
+
+
+def test_redis_rate_limit_without_url_error():
+    with pytest.raises(ValidationError):
+        Settings(RATE_LIMIT_BACKEND='redis')
+
+
+def test_account_cache_outliving_query_cache_error():
+    with pytest.raises(ValidationError):
+        Settings(ACCOUNT_CACHE_TTL=120, QUERY_CACHE_TTL=60)
@@ -0,0 +1,163 @@
+from http import HTTPStatus
+from unittest.mock import Mock
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from madr_api import slow_queries
+from madr_api.database import slow_query_log
+from madr_api.models import table_registry
+from madr_api.slow_queries import SlowQueryLog, parameter_shape
+
+
+@pytest_asyncio.fixture
+async def session(tmp_path):
+    # A file database behind a real pool, so the plans are taken on a
+    # connection other than the request's, as in production.
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path}/db.sqlite3')
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+
+    await engine.dispose()
+
+
+@pytest.fixture
+def log_every_query(monkeypatch):
+    monkeypatch.setattr(slow_query_log, 'threshold', 0.0)
+    monkeypatch.setattr(slow_query_log, 'explain_sample', 1.0)
+    slow_query_log.clear()
+    yield slow_query_log
+    slow_query_log.clear()
+
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape(('dune', 1965)) == ['str', 'int']
+    assert parameter_shape({'title': 'dune'}) == {'title': 'str'}
+    assert parameter_shape([('a', 1), ('b', 2)], executemany=True) == {
+        'rows': 2,
+        'shape': ['str', 'int'],
+    }
+
+
+def test_slow_queries_attributed_to_route(
+    client, book, admin_token, log_every_query
+):
+    client.get('/books/?title=tit')
+    client.portal.call(log_every_query.join)
+
+    response = client.get(
+        '/metrics/slow_queries',
+        headers={'Authorization': f'Bearer {admin_token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    queries = response.json()['queries']
+    books_query = next(
+        query
+        for query in queries
+        if query['route'] == 'fetch_books' and 'LIKE' in query['sql']
+    )
+    assert 'tit' not in str(books_query['parameters'])
+    assert books_query['plan']
+
+
+def test_slow_queries_disabled(client, book, monkeypatch):
+    monkeypatch.setattr(slow_query_log, 'threshold', None)
+    slow_query_log.clear()
+
+    client.get('/books/')
+
+    assert not slow_query_log.entries
+
+
+def test_slow_queries_require_authentication(client):
+    response = client.get('/metrics/slow_queries')
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.parametrize('method', ['GET', 'DELETE'])
+def test_slow_queries_require_admin(client, token, log_every_query, method):
+    client.get('/books/')
+
+    response = client.request(
+        method,
+        '/metrics/slow_queries',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    assert response.json() == {'detail': 'Not enough permissions'}
+    assert log_every_query.entries
+
+
+def test_clear_slow_queries(client, admin_token, log_every_query):
+    response = client.delete(
+        '/metrics/slow_queries',
+        headers={'Authorization': f'Bearer {admin_token}'},
+    )
+
+    assert response.json() == {'message': 'Slow query log cleared'}
+    assert all(
+        entry['route'] == 'clear_slow_queries'
+        for entry in log_every_query.entries
+    )
+
+
+def test_failed_explain_leaves_request_to_commit(
+    client, token, author, log_every_query, monkeypatch
+):
+    # The PostgreSQL form, which SQLite rejects.
+    explain_sql = slow_queries._explain_sql
+    monkeypatch.setattr(
+        slow_queries,
+        '_explain_sql',
+        lambda dialect, statement: explain_sql('postgresql', statement),
+    )
+
+    response = client.post(
+        '/books/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Dune', 'year': 1965, 'author_id': author.id},
+    )
+    client.portal.call(log_every_query.join)
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert log_every_query.entries
+    assert all(entry['plan'] is None for entry in log_every_query.entries)
+    assert client.get(f'/books/{response.json()["id"]}').is_success
+
+
+@pytest.mark.asyncio
+async def test_explain_runs_off_the_request_connection(caplog):
+    engine = create_async_engine('postgresql+psycopg://madr@localhost:1/madr')
+    connection = Mock(engine=engine.sync_engine)
+    log = SlowQueryLog(threshold=0.0, size=10, explain_sample=1.0)
+
+    log.record(
+        connection,
+        'SELECT * FROM books WHERE title = %(title)s',
+        {'title': 'dune'},
+        executemany=False,
+        elapsed=1.0,
+        route='fetch_books',
+    )
+    log.record(
+        connection,
+        'WITH gone AS (DELETE FROM books RETURNING id) SELECT * FROM gone',
+        {},
+        executemany=False,
+        elapsed=1.0,
+        route='fetch_books',
+    )
+    await log.join()
+
+    # Only the plain SELECT is explained, and its own connection fails.
+    connection.connection.cursor.assert_not_called()
+    assert caplog.messages.count('Could not explain slow query') == 1
+    assert [entry['plan'] for entry in log.entries] == [None, None]
+    await engine.dispose()
@@ -0,0 +1,196 @@
+from http import HTTPStatus
+
+import pytest
+
+from madr_api.database import settings
+from madr_api.suggest import PrefixIndex, Suggestions, suggestions
+from tests.conftest import AuthorFactory, BookFactory, query_count
+
+
+def _texts(response) -> list[str]:
+    return [item['text'] for item in response.json()['suggestions']]
+
+
+def test_prefix_index_search():
+    index = PrefixIndex([('dom casmurro', 1), ('o corvo', 2)])
+    index.put([('o cortico', 3), ('dom quixote', 4)])
+    index.put([('memorias postumas', 1)])
+    index.discard([2])
+
+    assert index.search('dom', 10) == [('dom quixote', 4)]
+    assert index.search('o co', 10) == [('o cortico', 3)]
+    assert index.search('m', 1) == [('memorias postumas', 1)]
+    assert index.search('x', 10) == []
+
+
+def test_prefix_index_batch_changes():
+    expected_size = 50
+    index = PrefixIndex()
+    index.put([(f'title{n:03}', n) for n in range(100)])
+    index.discard(range(0, 100, 2))
+
+    assert len(index) == expected_size
+    assert index.search('title00', 3) == [
+        ('title001', 1),
+        ('title003', 3),
+        ('title005', 5),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_suggest_from_index(client, session, author):
+    session.add_all([
+        BookFactory(title='o corvo', author_id=author.id),
+        BookFactory(title='o cortico', author_id=author.id),
+        BookFactory(title='dom casmurro', author_id=author.id),
+    ])
+    await session.commit()
+    await suggestions.load(session.bind)
+
+    response = client.get('/suggest/?q=O%20Cor')
+
+    assert response.status_code == HTTPStatus.OK
+    assert _texts(response) == ['o cortico', 'o corvo']
+    assert query_count(response) == 0
+
+    response = client.get(f'/suggest/?q={author.name[:3]}&kind=authors')
+
+    assert response.json() == {
+        'suggestions': [{'id': author.id, 'text': author.name}]
+    }
+
+
+@pytest.mark.asyncio
+async def test_suggest_follows_writes(client, session, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    await suggestions.load(session.bind)
+
+    response = client.post(
+        '/books/',
+        headers=headers,
+        json={'title': 'Novo Livro', 'year': 2000, 'author_id': 1},
+    )
+    new_id = response.json()['id']
+    client.patch(
+        f'/books/{book.id}', headers=headers, json={'title': 'novo titulo'}
+    )
+
+    assert _texts(client.get('/suggest/?q=novo')) == [
+        'novo livro',
+        'novo titulo',
+    ]
+    assert _texts(client.get('/suggest/?q=title')) == []
+
+    client.delete(f'/books/{new_id}', headers=headers)
+
+    assert _texts(client.get('/suggest/?q=novo')) == ['novo titulo']
+
+
+@pytest.mark.asyncio
+async def test_suggest_follows_bulk_writes(client, session, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    await suggestions.load(session.bind)
+
+    client.post(
+        '/books/bulk',
+        headers=headers,
+        json=[
+            {'title': 'lote um', 'year': 2000, 'author_id': 1},
+            {'title': 'lote dois', 'year': 2000, 'author_id': 1},
+        ],
+    )
+    client.patch(
+        '/books/', headers=headers, json=[{'id': book.id, 'title': 'lote'}]
+    )
+
+    assert _texts(client.get('/suggest/?q=lote')) == [
+        'lote',
+        'lote dois',
+        'lote um',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_suggest_finds_patched_titles(client, session, token, book):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.patch(
+        f'/books/{book.id}', headers=headers, json={'title': 'Dom  Casmurro'}
+    )
+
+    assert _texts(client.get('/suggest/?q=Dom')) == ['dom casmurro']
+
+    await suggestions.load(session.bind)
+    client.patch(
+        '/books/',
+        headers=headers,
+        json=[{'id': book.id, 'title': 'O  Ateneu'}],
+    )
+
+    assert _texts(client.get('/suggest/?q=o%20at')) == ['o ateneu']
+
+
+def test_suggest_index_normalizes_keys():
+    index = Suggestions(enabled=False, refresh_seconds=None)
+    index.ready = True
+    index.put_books([(1, 'Dom  Casmurro', 1)])
+    index.put_author(1, ' Machado De Assis')
+
+    assert index.indexes['books'].search('dom c', 10) == [('dom casmurro', 1)]
+    assert index.indexes['authors'].search('machado', 10) == [
+        ('machado de assis', 1)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_suggest_drops_books_of_deleted_author(
+    client, session, token, author, book
+):
+    await suggestions.load(session.bind)
+
+    client.patch(
+        f'/authors/{author.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'name': 'Renamed'},
+    )
+
+    assert _texts(client.get('/suggest/?q=ren&kind=authors')) == ['renamed']
+
+    client.delete(
+        f'/authors/{author.id}', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert _texts(client.get('/suggest/?q=ren&kind=authors')) == []
+    assert _texts(client.get(f'/suggest/?q={book.title}')) == []
+
+
+@pytest.mark.asyncio
+async def test_suggest_falls_back_to_database(client, session):
+    session.add_all([
+        AuthorFactory(name='machado de assis'),
+        AuthorFactory(name='machado_2'),
+        AuthorFactory(name='manuel bandeira'),
+    ])
+    await session.commit()
+
+    response = client.get('/suggest/?q=machado&kind=authors')
+
+    assert response.status_code == HTTPStatus.OK
+    assert _texts(response) == ['machado de assis', 'machado_2']
+    assert query_count(response) == 1
+    assert _texts(client.get('/suggest/?q=machado_&kind=authors')) == [
+        'machado_2'
+    ]
+
+
+def test_suggest_empty_query(client):
+    response = client.get('/suggest/?q=%20%20')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'suggestions': []}
+
+
+def test_suggest_limit_too_large_error(client):
+    response = client.get(f'/suggest/?q=a&limit={settings.MAX_PAGE_SIZE + 1}')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY